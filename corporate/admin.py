@@ -1,7 +1,9 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
 from django.urls import path, reverse
 from django.http import HttpResponseRedirect
+from . import ownership_chains
 from .models import Entity, Structure, EntityOwnership, StructureNode, NodeOwnership
 from parties.models import Party
 
@@ -92,7 +94,7 @@ class CompanyInstanceAdmin(admin.ModelAdmin):
     list_display = ['custom_name', 'entity_template', 'structure', 'level', 'total_shares', 'get_ownership_percentage']
     list_filter = ['structure', 'level', 'entity_template__entity_type', 'entity_template__jurisdiction']
     search_fields = ['custom_name', 'corporate_name', 'entity_template__name', 'structure__name']
-    readonly_fields = ['created_at', 'updated_at', 'get_ownership_percentage']
+    readonly_fields = ['level', 'path', 'created_at', 'updated_at', 'get_ownership_percentage', 'get_ownership_chain']
     
     fieldsets = (
         ('🏛️ Informações da Empresa', {
@@ -102,14 +104,27 @@ class CompanyInstanceAdmin(admin.ModelAdmin):
             'fields': ('total_shares', 'corporate_name', 'hash_number')
         }),
         ('🏗️ Hierarquia', {
-            'fields': ('level', 'parent_node')
+            'fields': ('parent_node', 'level', 'path')
         }),
         ('📊 Status', {
-            'fields': ('get_ownership_percentage', 'created_at', 'updated_at'),
+            'fields': ('get_ownership_percentage', 'get_ownership_chain', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
+    def get_ownership_chain(self, obj):
+        """Direct and indirect owners with their look-through percentage (single recursive query)"""
+        if not obj.pk:
+            return '-'
+        links = ownership_chains.node_ancestors(obj)
+        if not links:
+            return '-'
+        return format_html_join(
+            mark_safe('<br>'), '{}{} — {}%',
+            (('↳ ' * (link.depth - 1), link.name, link.percentage) for link in links)
+        )
+    get_ownership_chain.short_description = 'Cadeia de Propriedade'
+    
     def get_ownership_percentage(self, obj):
         """Show total ownership percentage"""
         percentage = obj.get_ownership_percentage()
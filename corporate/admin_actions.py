@@ -17,6 +17,7 @@ from io import StringIO
 from datetime import datetime
 
 from .models import Structure, Entity, EntityOwnership
+from . import structure_cloning
 from parties.models import Party
 
 
@@ -185,25 +186,20 @@ class StructureAdminActions:
     
     @admin.action(description="📋 Clone selected structures")
     def clone_structures(self, request, queryset):
-        """Clone selected structures with all their ownerships"""
-        cloned_count = 0
-        
-        with transaction.atomic():
-            for structure in queryset:
-                cloned_structure = self._clone_structure(structure)
-                if cloned_structure:
-                    cloned_count += 1
-        
-        if cloned_count > 0:
-            messages.success(
-                request,
-                f"Successfully cloned {cloned_count} structure(s)."
-            )
-        else:
+        """Clone selected structures with all their ownerships and nodes"""
+        try:
+            cloned = structure_cloning.clone_structures(queryset)
+        except Exception as e:
             messages.error(
                 request,
-                "Failed to clone structures."
+                f"Failed to clone structures: {e}"
             )
+            return
+        
+        messages.success(
+            request,
+            f"Successfully cloned {len(cloned)} structure(s)."
+        )
     
     @admin.action(description="🗑️ Archive old structures")
     def archive_structures(self, request, queryset):
@@ -328,37 +324,6 @@ class StructureAdminActions:
                 balanced = True
         
         return balanced
-    
-    def _clone_structure(self, structure):
-        """Clone a structure with all its ownerships"""
-        try:
-            # Create new structure
-            cloned_structure = Structure.objects.create(
-                name=f"{structure.name} (Copy)",
-                description=f"Copy of {structure.name}",
-                status='drafting'
-            )
-            
-            # Clone all ownerships
-            ownerships = EntityOwnership.objects.filter(structure=structure)
-            for ownership in ownerships:
-                EntityOwnership.objects.create(
-                    structure=cloned_structure,
-                    owned_entity=ownership.owned_entity,
-                    owner_ubo=ownership.owner_ubo,
-                    owner_entity=ownership.owner_entity,
-                    percentage=ownership.percentage,
-                    shares=ownership.shares,
-                    corporate_name=ownership.corporate_name,
-                    hash_number=ownership.hash_number,
-                    share_value_usd=ownership.share_value_usd,
-                    share_value_eur=ownership.share_value_eur
-                )
-            
-            return cloned_structure
-            
-        except Exception as e:
-            return None
 
 
 class EntityAdminActions:
@@ -9,6 +9,7 @@ from django.forms import TextInput, Textarea
 
 from .models import Entity, Structure, EntityOwnership, MasterEntity, ValidationRule
 from .admin_actions import get_structure_admin_actions, get_entity_admin_actions, get_ownership_admin_actions
+from .structure_metrics import with_metrics
 from .views import structure_wizard_view
 
 
@@ -76,7 +77,7 @@ class StructureAdmin(admin.ModelAdmin):
         'name_with_icon', 'status_badge', 'entities_count', 
         'completion_percentage', 'created_at', 'action_buttons'
     ]
-    list_filter = ['status', 'created_at', 'updated_at']
+    list_filter = ['status', 'metrics__validation_status', 'created_at', 'updated_at']
     search_fields = ['name', 'description']
     ordering = ['-created_at']
     
@@ -145,33 +146,22 @@ class StructureAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
     status_badge.admin_order_field = 'status'
     
+    def get_queryset(self, request):
+        """Listing figures come annotated in the changelist query"""
+        return with_metrics(super().get_queryset(request))
+    
     def entities_count(self, obj):
         """Count of entities in this structure"""
-        count = EntityOwnership.objects.filter(structure=obj).values('owned_entity').distinct().count()
-        return format_html('🏢 {}', count)
+        return format_html('🏢 {}', obj.entities_total)
     entities_count.short_description = 'Entities'
+    entities_count.admin_order_field = 'entities_total'
     
     def completion_percentage(self, obj):
         """Show completion percentage with progress bar"""
-        ownerships = EntityOwnership.objects.filter(structure=obj)
-        if not ownerships.exists():
+        if not obj.entities_total:
             return format_html('<span style="color: #dc3545;">0%</span>')
         
-        # Calculate completion
-        entity_totals = {}
-        for ownership in ownerships:
-            entity_id = ownership.owned_entity_id
-            if entity_id not in entity_totals:
-                entity_totals[entity_id] = 0
-            entity_totals[entity_id] += ownership.percentage or 0
-        
-        complete_entities = sum(1 for total in entity_totals.values() if total == 100)
-        total_entities = len(entity_totals)
-        
-        if total_entities == 0:
-            percentage = 0
-        else:
-            percentage = (complete_entities / total_entities) * 100
+        percentage = float(obj.completion)
         
         color = '#28a745' if percentage == 100 else '#ffc107' if percentage > 0 else '#dc3545'
         
@@ -185,6 +175,7 @@ class StructureAdmin(admin.ModelAdmin):
             percentage, color, color, percentage
         )
     completion_percentage.short_description = 'Completion'
+    completion_percentage.admin_order_field = 'completion'
     
     def action_buttons(self, obj):
         """Action buttons for quick operations"""
@@ -12,6 +12,8 @@ from django.utils.decorators import method_decorator
 import json
 
 from .models import Entity, Structure, EntityOwnership
+from .ownership_graph import ENTITY, OwnershipGraph
+from .structure_metrics import with_metrics
 from parties.models import Party
 from .views_entity_library_enhanced import entity_library_enhanced_view
 
@@ -116,26 +118,15 @@ class OrganogramBuilderInline(admin.StackedInline):
     
     def calculate_node_levels(self, nodes, edges):
         """Calculate hierarchical levels for nodes"""
-        # Find root nodes (parties that don't have incoming edges)
-        incoming_targets = {edge['target'] for edge in edges}
-        root_nodes = [node_id for node_id in nodes.keys() if node_id not in incoming_targets]
-        
-        # BFS to assign levels
-        queue = [(node_id, 0) for node_id in root_nodes]
-        visited = set()
-        
-        while queue:
-            node_id, level = queue.pop(0)
-            if node_id in visited:
-                continue
-            
-            visited.add(node_id)
-            nodes[node_id]['level'] = level
-            
-            # Add children to queue
-            for edge in edges:
-                if edge['source'] == node_id and edge['target'] not in visited:
-                    queue.append((edge['target'], level + 1))
+        graph = OwnershipGraph()
+        for node_id in nodes:
+            graph.add_node(node_id)
+        for edge in edges:
+            graph.add_edge(edge['source'], edge['target'], edge['percentage'])
+        
+        # Roots (nodes without incoming edges) are level 0
+        for idx, level in enumerate(graph.levels()):
+            nodes[graph.keys[idx]]['level'] = level
     
     def get_available_entities(self):
         """Get all available entities for the library"""
@@ -193,10 +184,10 @@ class StructureOrganogramAdmin(admin.ModelAdmin):
     """Enhanced Structure admin with Organogram Builder"""
     
     list_display = [
-        'name_with_icon', 'status_badge', 'entities_count', 
-        'completion_percentage', 'hierarchy_depth', 'created_at', 'action_buttons'
+        'name_with_icon', 'status_badge', 'entities_count', 'parties_count',
+        'completion_percentage', 'hierarchy_depth', 'total_value', 'created_at', 'action_buttons'
     ]
-    list_filter = ['status', 'created_at', 'updated_at']
+    list_filter = ['status', 'metrics__validation_status', 'metrics__max_depth', 'created_at', 'updated_at']
     search_fields = ['name', 'description']
     ordering = ['-created_at']
     
@@ -423,56 +414,22 @@ class StructureOrganogramAdmin(admin.ModelAdmin):
     
     def analyze_hierarchy(self, ownerships):
         """Analyze the hierarchy structure"""
-        analysis = {
-            'max_depth': 0,
-            'root_entities': [],
-            'leaf_entities': [],
-            'circular_references': []
-        }
-        
-        # Build graph
-        graph = {}
-        all_entities = set()
-        
-        for ownership in ownerships:
-            source = ownership.owner_entity.id if ownership.owner_entity else f"party_{ownership.owner_ubo.id}"
-            target = ownership.owned_entity.id
-            
-            all_entities.add(target)
-            if ownership.owner_entity:
-                all_entities.add(source)
-            
-            if source not in graph:
-                graph[source] = []
-            graph[source].append(target)
-        
-        # Find roots (entities not owned by other entities)
-        owned_entities = {ownership.owned_entity.id for ownership in ownerships}
-        owning_entities = {ownership.owner_entity.id for ownership in ownerships if ownership.owner_entity}
-        
-        analysis['root_entities'] = list(owning_entities - owned_entities)
-        analysis['leaf_entities'] = list(owned_entities - owning_entities)
+        graph = OwnershipGraph.from_entity_ownerships(ownerships)
+        entities = graph.nodes_of_kind(ENTITY)
         
-        # Calculate max depth using DFS
-        def dfs_depth(node, visited, depth):
-            if node in visited:
-                return depth  # Circular reference
-            
-            visited.add(node)
-            max_child_depth = depth
-            
-            if node in graph:
-                for child in graph[node]:
-                    child_depth = dfs_depth(child, visited.copy(), depth + 1)
-                    max_child_depth = max(max_child_depth, child_depth)
-            
-            return max_child_depth
-        
-        for root in analysis['root_entities']:
-            depth = dfs_depth(root, set(), 0)
-            analysis['max_depth'] = max(analysis['max_depth'], depth)
+        # Roots are entities not owned by other entities
+        root_entities = [
+            idx for idx in entities
+            if all(graph.keys[parent][0] != ENTITY for parent in graph.parents(idx))
+        ]
+        leaf_entities = [idx for idx in entities if not graph.out_edges[idx]]
         
-        return analysis
+        return {
+            'max_depth': graph.max_depth(),
+            'root_entities': graph.ids_of(root_entities),
+            'leaf_entities': graph.ids_of(leaf_entities),
+            'circular_references': [graph.ids_of(cycle) for cycle in graph.cycles()]
+        }
     
     def name_with_icon(self, obj):
         """Display name with appropriate icon"""
@@ -502,45 +459,49 @@ class StructureOrganogramAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
     status_badge.admin_order_field = 'status'
     
+    def get_queryset(self, request):
+        """Listing figures come annotated in the changelist query"""
+        return with_metrics(super().get_queryset(request))
+    
     def entities_count(self, obj):
         """Count of entities in this structure"""
-        count = EntityOwnership.objects.filter(structure=obj).values('owned_entity').distinct().count()
-        return format_html('🏢 {}', count)
+        return format_html('🏢 {}', obj.entities_total)
     entities_count.short_description = 'Entities'
+    entities_count.admin_order_field = 'entities_total'
     
     def hierarchy_depth(self, obj):
-        """Calculate and display hierarchy depth"""
-        ownerships = EntityOwnership.objects.filter(structure=obj)
-        if not ownerships.exists():
+        """Display the cached hierarchy depth"""
+        if not obj.depth:
             return format_html('<span style="color: #6c757d;">➖</span>')
         
-        analysis = self.analyze_hierarchy(ownerships)
-        depth = analysis['max_depth']
-        
-        return format_html('🌳 {} levels', depth)
+        return format_html('🌳 {} levels', obj.depth)
     hierarchy_depth.short_description = 'Depth'
+    hierarchy_depth.admin_order_field = 'depth'
+    
+    def parties_count(self, obj):
+        """Count of parties owning entities or nodes of this structure"""
+        return format_html('👤 {}', obj.parties_total)
+    parties_count.short_description = 'Parties'
+    parties_count.admin_order_field = 'parties_total'
+    
+    def total_value(self, obj):
+        """Total ownership value in USD and EUR"""
+        if not obj.value_usd and not obj.value_eur:
+            return format_html('<span style="color: #6c757d;">➖</span>')
+        
+        return format_html(
+            '<span title="EUR {}">USD {}</span>',
+            f'{obj.value_eur:,.2f}', f'{obj.value_usd:,.2f}'
+        )
+    total_value.short_description = 'Value'
+    total_value.admin_order_field = 'value_usd'
     
     def completion_percentage(self, obj):
         """Show completion percentage with progress bar"""
-        ownerships = EntityOwnership.objects.filter(structure=obj)
-        if not ownerships.exists():
+        if not obj.entities_total:
             return format_html('<span style="color: #dc3545;">0%</span>')
         
-        # Calculate completion
-        entity_totals = {}
-        for ownership in ownerships:
-            entity_id = ownership.owned_entity_id
-            if entity_id not in entity_totals:
-                entity_totals[entity_id] = 0
-            entity_totals[entity_id] += ownership.ownership_percentage or 0
-        
-        complete_entities = sum(1 for total in entity_totals.values() if total == 100)
-        total_entities = len(entity_totals)
-        
-        if total_entities == 0:
-            percentage = 0
-        else:
-            percentage = (complete_entities / total_entities) * 100
+        percentage = float(obj.completion)
         
         color = '#28a745' if percentage == 100 else '#ffc107' if percentage > 0 else '#dc3545'
         
@@ -554,6 +515,7 @@ class StructureOrganogramAdmin(admin.ModelAdmin):
             percentage, color, color, int(percentage)
         )
     completion_percentage.short_description = 'Completion'
+    completion_percentage.admin_order_field = 'completion'
     
     def action_buttons(self, obj):
         """Action buttons for quick operations"""
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CorporateConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'corporate'
+
+    def ready(self):
+        import corporate.signals  # noqa
+        from corporate.deferred_checks import register_checks
+        register_checks()
@@ -0,0 +1,197 @@
+"""
+Batch Reports
+Structure organogram PDFs for many structures at once: all ownerships are
+preloaded in one query, statistics are computed in memory and the PDFs are
+rendered in parallel, then bundled as a zip archive or one merged PDF
+"""
+
+import hashlib
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+
+from . import report_cache
+from .models import EntityOwnership, Structure
+from .report_jobs import init_worker
+
+
+BATCH_OUTPUTS = ('zip', 'merged')
+BATCH_REPORT_TYPE = 'batch'
+
+
+def preload(structure_ids):
+    """
+    [(structure, ownerships)] in the requested order, from one structure query
+    and one ownership query for the whole batch
+    """
+    structures = Structure.objects.in_bulk(structure_ids)
+    ownerships = defaultdict(list)
+    queryset = EntityOwnership.objects.filter(structure_id__in=structures).select_related(
+        'owner_entity', 'owner_ubo', 'owned_entity', 'structure'
+    ).order_by('id')
+    for ownership in queryset:
+        ownerships[ownership.structure_id].append(ownership)
+
+    seen = set()
+    batch = []
+    for structure_id in structure_ids:
+        if structure_id in structures and structure_id not in seen:
+            seen.add(structure_id)
+            batch.append((structures[structure_id], ownerships[structure_id]))
+    return batch
+
+
+def member_filename(structure, ownerships, template, options):
+    """Report cache name of one structure's PDF (same key as a single structure report)"""
+    return report_cache.report_filename(
+        structure=structure,
+        format_type='pdf',
+        template=template,
+        options=options,
+        version=report_cache.structure_version(structure, ownerships),
+    )
+
+
+def batch_filename(member_filenames, output):
+    """Cache name of the bundle, derived from the (content-addressed) member names"""
+    digest = hashlib.sha256('\n'.join([output] + member_filenames).encode('utf-8')).hexdigest()[:32]
+    extension = '.zip' if output == 'zip' else '.pdf'
+    return f"organogram_batch_{len(member_filenames)}_{digest}{extension}"
+
+
+def expected_filename(structure_ids, template='professional', options=None, output='zip'):
+    """Bundle name for a batch request, to check the report cache before queueing it"""
+    return batch_filename(
+        [member_filename(structure, ownerships, template, options) for structure, ownerships in preload(structure_ids)],
+        output,
+    )
+
+
+def render_member(report_data, template, filename, options, keep=()):
+    """
+    Process pool task: render one structure PDF into the report cache.
+    ``keep``: paths of the batch's other members, which eviction must not delete
+    """
+    from .views_organogram_printing import generate_pdf_report
+
+    cached_path = report_cache.lookup(filename)
+    if cached_path:
+        return cached_path
+    rendered_path = generate_pdf_report(report_data, template, report_cache.partial_name(filename), options)
+    return report_cache.store(rendered_path, filename, keep=keep)
+
+
+def write_zip(member_paths, target):
+    # PDFs are already compressed; storing them keeps zipping I/O bound
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for path in member_paths:
+            archive.write(path, arcname=os.path.basename(path))
+
+
+def write_merged_pdf(members, template, target):
+    """One PDF with every structure's report, each starting on a new page"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import PageBreak, SimpleDocTemplate
+
+    from .views_organogram_printing import build_pdf_story
+
+    styles = getSampleStyleSheet()
+    story = []
+    for report_data in members:
+        if story:
+            story.append(PageBreak())
+        story.extend(build_pdf_story(report_data, template, styles))
+
+    doc = SimpleDocTemplate(target, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    doc.build(story)
+
+
+def render_batch(structure_ids, template='professional', options=None, output='zip', workers=None, progress=None):
+    """
+    Render the structure reports of ``structure_ids`` and bundle them.
+    Returns the path of the zip archive or merged PDF in the reports directory.
+    """
+    from .views_organogram_printing import build_structure_report_data
+
+    if output not in BATCH_OUTPUTS:
+        raise ValueError('Unsupported batch output')
+    options = options or {}
+    workers = workers or settings.REPORT_JOB_WORKERS
+    progress = progress or (lambda percent, message='': None)
+
+    progress(5, 'Loading structures')
+    batch = preload(structure_ids)
+    if not batch:
+        raise ValueError('No structures found')
+
+    members = [
+        (member_filename(structure, ownerships, template, options), structure, ownerships)
+        for structure, ownerships in batch
+    ]
+    filename = batch_filename([name for name, _, _ in members], output)
+    cached_path = report_cache.lookup(filename)
+    if cached_path:
+        progress(95, 'Reusing cached batch report')
+        return cached_path
+
+    progress(15, f'Computing statistics for {len(members)} structures')
+    report_data = {
+        name: build_structure_report_data(structure, ownerships, options)
+        for name, structure, ownerships in members
+    }
+
+    os.makedirs(report_cache.reports_dir(), exist_ok=True)
+    partial_path = os.path.join(report_cache.reports_dir(), report_cache.partial_name(filename))
+    try:
+        if output == 'merged':
+            # A merged document is a single ReportLab build over all the stories
+            progress(30, 'Rendering merged PDF')
+            write_merged_pdf([report_data[name] for name, _, _ in members], template, partial_path)
+        else:
+            paths = render_members(report_data, template, options, workers, progress)
+            progress(90, 'Bundling reports')
+            write_zip([paths[name] for name, _, _ in members], partial_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    progress(95, 'Saving report')
+    return report_cache.store(partial_path, filename)
+
+
+def render_members(report_data, template, options, workers, progress):
+    """{member filename: path}, rendering the PDFs not already cached in a process pool"""
+    # Members are read again by write_zip(), so storing one member must not evict another
+    keep = frozenset(os.path.join(report_cache.reports_dir(), name) for name in report_data)
+    paths = {}
+    pending = []
+    for name in report_data:
+        cached_path = report_cache.lookup(name)
+        if cached_path:
+            paths[name] = cached_path
+        else:
+            pending.append(name)
+
+    if workers <= 1 or len(pending) <= 1:
+        for name in pending:
+            paths[name] = render_member(report_data[name], template, name, options, keep)
+            progress(30 + 60 * len(paths) // len(report_data), f'Rendered {len(paths)} of {len(report_data)}')
+        return paths
+
+    # Children must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=init_worker) as pool:
+        futures = {
+            pool.submit(render_member, report_data[name], template, name, options, keep): name
+            for name in pending
+        }
+        for future in as_completed(futures):
+            paths[futures[future]] = future.result()
+            progress(30 + 60 * len(paths) // len(report_data), f'Rendered {len(paths)} of {len(report_data)}')
+    return paths
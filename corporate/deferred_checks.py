@@ -0,0 +1,85 @@
+"""
+Deferred Checks
+Grouped total checks of EntityOwnership (shares per owned entity) and
+NodeOwnership (shares per node) rows queued inside deferred_validation(),
+registered by CorporateConfig.ready()
+"""
+
+from django.db.models import Sum
+
+from sirius_project.deferred_validation import RowError, pending_pks, register
+
+from .models import Entity, EntityOwnership, StructureNode
+
+
+def _total_shares(rows, field_name, model):
+    """
+    total_shares of each row's related object: taken from the loaded instance
+    when the row holds one (e.g. not yet saved), otherwise from one query
+    """
+    field = rows[0][1]._meta.get_field(field_name)
+    shares = {}
+    missing = set()
+    for _index, row in rows:
+        if field.is_cached(row):
+            related = getattr(row, field_name)
+            shares[id(row)] = related.total_shares if related is not None else None
+        else:
+            missing.add(getattr(row, field.attname))
+    loaded = dict(
+        model.objects.filter(id__in=missing).order_by().values_list('id', 'total_shares')
+    ) if missing else {}
+    for _index, row in rows:
+        if id(row) not in shares:
+            shares[id(row)] = loaded.get(getattr(row, field.attname))
+    return shares
+
+
+def check_entity_ownerships(rows):
+    """Owned shares per (structure, owned entity) must not exceed the entity's total_shares"""
+    if not rows:
+        return []
+    entity_ids = {row.owned_entity_id for _index, row in rows}
+    total_shares = _total_shares(rows, 'owned_entity', Entity)
+    owned = {
+        (total['structure_id'], total['owned_entity_id']): total['total'] or 0
+        for total in EntityOwnership.objects.filter(
+            structure_id__in={row.structure_id for _index, row in rows},
+            owned_entity_id__in=entity_ids,
+        ).exclude(pk__in=pending_pks(rows)).order_by().values(
+            'structure_id', 'owned_entity_id'
+        ).annotate(total=Sum('owned_shares'))
+    }
+
+    errors = []
+    for index, row in rows:
+        limit = total_shares[id(row)]
+        if not limit:
+            continue
+        key = (row.structure_id, row.owned_entity_id)
+        total = owned.get(key, 0) + (row.owned_shares or 0)
+        if total > limit:
+            errors.append(RowError(
+                index, row,
+                f"Total owned shares ({total}) cannot exceed entity total shares ({limit})"
+            ))
+        else:
+            owned[key] = total
+    return errors
+
+
+def check_node_ownerships(rows):
+    """Owned shares of each row must not exceed its node's total_shares"""
+    if not rows:
+        return []
+    total_shares = _total_shares(rows, 'owned_node', StructureNode)
+    return [
+        RowError(index, row, "Owned shares cannot exceed total shares")
+        for index, row in rows
+        if total_shares[id(row)] is not None and row.owned_shares > total_shares[id(row)]
+    ]
+
+
+def register_checks():
+    register('corporate.EntityOwnership', check_entity_ownerships)
+    register('corporate.NodeOwnership', check_node_ownerships)
@@ -0,0 +1,212 @@
+"""
+Effective Ownership
+Look-through ownership of each Party (UBO) in every entity and node of a
+structure, propagated through multi-level EntityOwnership / NodeOwnership chains
+"""
+
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from .ownership_graph import ENTITY, NODE, PARTY, OwnershipGraph
+
+
+# The key embeds a version of the structure's ownership rows, so processes that
+# do not share a cache backend never serve a table older than the data
+CACHE_KEY = 'corporate:effective-ownership:v2:{structure_id}:{version}'
+CACHE_TIMEOUT = 60 * 60
+
+TOLERANCE = 1e-9
+MAX_ITERATIONS = 200
+
+
+def propagate(graph, source_kind=PARTY, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS, diverging=None):
+    """
+    Effective ownership fractions of every source node in every graph node.
+
+    Each node carries a sparse vector {source index: fraction}. Sources start
+    with {self: 1.0}; every edge passes its owner's whole vector, scaled by the
+    edge percentage, down to the owned node. On an acyclic graph a single pass
+    in topological order is exact. When ownership cycles exist the vectors are
+    relaxed repeatedly until no fraction moves more than ``tolerance``.
+
+    A cycle passing on 100% or more of itself (e.g. 100% cross-holdings) never
+    converges: the fractions still moving after ``max_iterations`` are capped
+    at 1.0 and their (node index, source index) pairs added to ``diverging``.
+    """
+    size = len(graph)
+    weights = [float(percentage) / 100 for percentage in graph.edge_percentage]
+    vectors = [{} for _ in range(size)]
+    for idx in graph.nodes_of_kind(source_kind):
+        vectors[idx] = {idx: 1.0}
+
+    order = graph.topological_order()
+    if len(order) == size:
+        for idx in order:
+            vector = vectors[idx]
+            if not vector:
+                continue
+            for edge in graph.out_edges[idx]:
+                weight = weights[edge]
+                target = vectors[graph.edge_target[edge]]
+                for source, fraction in vector.items():
+                    target[source] = target.get(source, 0.0) + fraction * weight
+        return vectors
+
+    ordered = set(order)
+    sweep = [idx for idx in order if graph.in_edges[idx]]
+    sweep += [idx for idx in range(size) if idx not in ordered]
+    moving = []
+    for _ in range(max_iterations):
+        moving = []
+        for idx in sweep:
+            vector = {}
+            for edge in graph.in_edges[idx]:
+                weight = weights[edge]
+                for source, fraction in vectors[graph.edge_source[edge]].items():
+                    vector[source] = vector.get(source, 0.0) + fraction * weight
+            previous = vectors[idx]
+            for source in vector.keys() | previous.keys():
+                if abs(vector.get(source, 0.0) - previous.get(source, 0.0)) >= tolerance:
+                    moving.append((idx, source))
+            vectors[idx] = vector
+        if not moving:
+            return vectors
+
+    for idx, source in moving:
+        if source in vectors[idx]:
+            vectors[idx][source] = min(vectors[idx][source], 1.0)
+    if diverging is not None:
+        diverging.update(moving)
+    return vectors
+
+
+def effective_percentages(graph, target_kind, capped=None):
+    """
+    {party_id: {target_id: percentage}} for one graph, dropping zero paths.
+    (party_id, target_id) pairs whose percentage did not converge (capped at
+    100%) are added to ``capped`` when given.
+    """
+    diverging = set()
+    vectors = propagate(graph, diverging=diverging)
+    table = {}
+    for idx in graph.nodes_of_kind(target_kind):
+        target_id = graph.keys[idx][1]
+        for source, fraction in vectors[idx].items():
+            if fraction <= 0:
+                continue
+            party_id = graph.keys[source][1]
+            table.setdefault(party_id, {})[target_id] = round(fraction * 100, 4)
+            if capped is not None and (idx, source) in diverging:
+                capped.add((party_id, target_id))
+    return table
+
+
+class EffectiveOwnershipTable:
+    """
+    UBO × entity (and UBO × node) effective ownership of one structure.
+    Percentages are floats between 0 and 100 (rounded to 4 decimals);
+    ``capped`` holds the {kind: {(party_id, target_id)}} entries of ownership
+    cycles that do not converge, reported as 100%.
+    """
+
+    def __init__(self, structure_id, entities=None, nodes=None, capped=None):
+        self.structure_id = structure_id
+        self.entities = entities or {}
+        self.nodes = nodes or {}
+        self.capped = capped or {ENTITY: set(), NODE: set()}
+
+    @classmethod
+    def compute(cls, structure):
+        capped = {ENTITY: set(), NODE: set()}
+        return cls(
+            structure.pk,
+            entities=effective_percentages(OwnershipGraph.for_structure(structure), ENTITY, capped[ENTITY]),
+            nodes=effective_percentages(OwnershipGraph.for_structure_nodes(structure), NODE, capped[NODE]),
+            capped=capped,
+        )
+
+    @property
+    def party_ids(self):
+        return sorted(self.entities.keys() | self.nodes.keys())
+
+    def for_party(self, party_id):
+        return self.entities.get(party_id, {})
+
+    def owners_of(self, entity_id):
+        return {
+            party_id: percentages[entity_id]
+            for party_id, percentages in self.entities.items()
+            if entity_id in percentages
+        }
+
+    def percentage(self, party_id, entity_id):
+        return self.entities.get(party_id, {}).get(entity_id, 0.0)
+
+    def rows(self):
+        """Flat (party, kind, target, percentage) rows, suitable for JSON"""
+        rows = []
+        for kind, table in ((ENTITY, self.entities), (NODE, self.nodes)):
+            for party_id in sorted(table):
+                for target_id, percentage in sorted(table[party_id].items()):
+                    rows.append({
+                        'party_id': party_id,
+                        'target_type': kind,
+                        'target_id': target_id,
+                        'effective_percentage': percentage,
+                        'capped': (party_id, target_id) in self.capped[kind],
+                    })
+        return rows
+
+    def to_dict(self):
+        return {
+            'structure_id': self.structure_id,
+            'entities': self.entities,
+            'nodes': self.nodes,
+            'capped': {kind: sorted(pairs) for kind, pairs in self.capped.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['structure_id'], entities=data['entities'], nodes=data['nodes'],
+            capped={kind: set(map(tuple, pairs)) for kind, pairs in data['capped'].items()},
+        )
+
+
+def ownership_version(structure):
+    """
+    Fingerprint of the EntityOwnership / NodeOwnership rows of a structure
+    (row count, id sum, latest update and percentage sum of each table)
+    """
+    from .models import EntityOwnership, NodeOwnership
+
+    fingerprint = {'structure_id': structure.pk}
+    for name, queryset in (
+        ('entities', EntityOwnership.objects.filter(structure_id=structure.pk)),
+        ('nodes', NodeOwnership.objects.filter(owned_node__structure_id=structure.pk)),
+    ):
+        fingerprint[name] = queryset.aggregate(
+            count=Count('id'),
+            ids=Sum('id'),
+            updated=Max('updated_at'),
+            percentages=Sum('ownership_percentage'),
+        )
+    encoded = json.dumps(fingerprint, sort_keys=True, default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def effective_ownership(structure):
+    """
+    Effective ownership table of a structure, cached per version of its
+    EntityOwnership / NodeOwnership rows (two aggregate queries on a hit)
+    """
+    key = CACHE_KEY.format(structure_id=structure.pk, version=ownership_version(structure))
+    data = cache.get(key)
+    if data is not None:
+        return EffectiveOwnershipTable.from_dict(data)
+    table = EffectiveOwnershipTable.compute(structure)
+    cache.set(key, table.to_dict(), CACHE_TIMEOUT)
+    return table
@@ -0,0 +1,123 @@
+"""
+Party Exposure Index
+Maintains PartyExposure rows (direct and look-through ownership of every
+party in every entity of every structure) one structure at a time, after the
+transaction that changed its ownerships commits
+"""
+
+import threading
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+
+from .effective_ownership import effective_percentages
+from .models import EntityOwnership, PartyExposure, Structure
+from .ownership_graph import ENTITY, ENTITY_OWNERSHIP_FIELDS, PARTY, OwnershipGraph
+
+
+PERCENTAGE_QUANTUM = Decimal('0.0001')
+
+_pending = threading.local()
+
+
+def _pending_ids():
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    return _pending.ids
+
+
+def exposure_values(rows):
+    """
+    (party_id, entity_id, direct, effective) exposures of one structure from
+    its EntityOwnership value rows (ENTITY_OWNERSHIP_FIELDS); no queries
+    """
+    graph = OwnershipGraph.from_rows(rows)
+
+    direct = defaultdict(Decimal)
+    for edge, source in enumerate(graph.edge_source):
+        kind, party_id = graph.keys[source]
+        if kind == PARTY:
+            entity_id = graph.keys[graph.edge_target[edge]][1]
+            direct[party_id, entity_id] += graph.edge_percentage[edge]
+
+    return [
+        (
+            party_id, entity_id,
+            direct.get((party_id, entity_id), Decimal(0)),
+            Decimal(str(percentage)).quantize(PERCENTAGE_QUANTUM),
+        )
+        for party_id, percentages in effective_percentages(graph, ENTITY).items()
+        for entity_id, percentage in percentages.items()
+    ]
+
+
+def exposure_rows(structure_id):
+    """Unsaved PartyExposure rows of one structure, computed from a single ownership query"""
+    rows = EntityOwnership.objects.filter(structure_id=structure_id).order_by().values(*ENTITY_OWNERSHIP_FIELDS)
+    return [
+        PartyExposure(
+            party_id=party_id,
+            structure_id=structure_id,
+            entity_id=entity_id,
+            direct_percentage=direct,
+            effective_percentage=effective,
+        )
+        for party_id, entity_id, direct, effective in exposure_values(rows)
+    ]
+
+
+def refresh_structure(structure_id):
+    """Replace the exposure rows of one structure; returns the number of rows written"""
+    with transaction.atomic():
+        PartyExposure.objects.filter(structure_id=structure_id).delete()
+        if not Structure.objects.filter(pk=structure_id).exists():
+            return 0
+        return len(PartyExposure.objects.bulk_create(exposure_rows(structure_id)))
+
+
+def schedule_refresh(structure_id):
+    """
+    Refresh a structure's exposure once the current transaction commits.
+    Any number of ownership changes inside one transaction lead to a single
+    refresh, but every autocommit save is its own transaction and rebuilds
+    the structure's rows: bulk writers (imports, scripts, loops of save())
+    must wrap their writes in transaction.atomic().
+    """
+    _pending_ids().add(structure_id)
+    transaction.on_commit(partial(_run_pending, structure_id))
+
+
+def _run_pending(structure_id):
+    pending = _pending_ids()
+    if structure_id in pending:
+        pending.discard(structure_id)
+        refresh_structure(structure_id)
+
+
+def rebuild(structure_ids=None):
+    """Rebuild the index for the given structures (all structures by default)"""
+    if structure_ids is None:
+        structure_ids = list(Structure.objects.values_list('id', flat=True))
+    return sum(refresh_structure(structure_id) for structure_id in structure_ids)
+
+
+def party_exposure(party):
+    """Every (structure, entity) exposure of a party, from a single indexed query"""
+    return [
+        {
+            'structure_id': row['structure_id'],
+            'structure_name': row['structure__name'],
+            'entity_id': row['entity_id'],
+            'entity_name': row['entity__name'],
+            'jurisdiction': row['entity__jurisdiction'],
+            'direct_percentage': float(row['direct_percentage']),
+            'effective_percentage': float(row['effective_percentage']),
+            'indirect': row['direct_percentage'] == 0,
+        }
+        for row in PartyExposure.objects.filter(party=party).values(
+            'structure_id', 'structure__name', 'entity_id', 'entity__name',
+            'entity__jurisdiction', 'direct_percentage', 'effective_percentage',
+        ).order_by('structure__name', '-effective_percentage')
+    ]
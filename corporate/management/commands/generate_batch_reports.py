@@ -0,0 +1,75 @@
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from corporate import batch_reports
+from corporate.models import Structure
+
+
+class Command(BaseCommand):
+    help = 'Render structure organogram PDFs for many structures in parallel, as a zip or one merged PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--structure',
+            type=int,
+            action='append',
+            dest='structure_ids',
+            help='Structure id to include (can be repeated)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Include every structure'
+        )
+        parser.add_argument(
+            '--output',
+            choices=batch_reports.BATCH_OUTPUTS,
+            default='zip',
+            help='Zip archive of one PDF per structure, or a single merged PDF'
+        )
+        parser.add_argument(
+            '--template',
+            default='professional',
+            help='Report template (professional, executive, detailed)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.REPORT_JOB_WORKERS,
+            help='Number of rendering processes (default: REPORT_JOB_WORKERS)'
+        )
+        parser.add_argument(
+            '--destination',
+            help='Also copy the result to this path'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            structure_ids = list(Structure.objects.order_by('name').values_list('id', flat=True))
+        else:
+            structure_ids = options.get('structure_ids') or []
+        if not structure_ids:
+            raise CommandError('Pass --structure (repeatable) or --all')
+
+        def progress(percent, message=''):
+            self.stdout.write(f'[{percent:3d}%] {message}')
+
+        try:
+            file_path = batch_reports.render_batch(
+                structure_ids,
+                template=options['template'],
+                output=options['output'],
+                workers=max(1, options['workers']),
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options.get('destination'):
+            file_path = shutil.copyfile(file_path, options['destination'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Batch report for {len(structure_ids)} structure(s): {file_path}')
+        )
@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from corporate import report_jobs
+
+
+class Command(BaseCommand):
+    help = 'Render queued organogram reports (ReportJob) with a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.REPORT_JOB_WORKERS,
+            help='Number of worker processes (default: REPORT_JOB_WORKERS)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between queue polls'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+
+        self.stdout.write(self.style.SUCCESS(f'🚀 Report worker started ({workers} process(es))'))
+
+        while True:
+            # Every poll, so jobs abandoned by a dead worker are recovered without a restart
+            requeued = report_jobs.requeue_stale()
+            if requeued:
+                self.stdout.write(self.style.WARNING(f'⚠️ Requeued {requeued} stale job(s)'))
+
+            processed = report_jobs.drain(workers=workers)
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'✅ Processed {processed} report job(s)'))
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from corporate import exposure_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the party exposure index (direct and look-through ownership per structure)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--structure',
+            type=int,
+            action='append',
+            dest='structure_ids',
+            help='Only rebuild the given structure id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        structure_ids = options.get('structure_ids')
+        rows = exposure_index.rebuild(structure_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Party exposure index rebuilt ({rows} rows)')
+        )
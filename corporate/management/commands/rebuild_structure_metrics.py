@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from corporate import structure_metrics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized per-structure metrics (counts, completion, depth, values, validation status)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--structure',
+            type=int,
+            action='append',
+            dest='structure_ids',
+            help='Only rebuild the given structure id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        structure_ids = options.get('structure_ids')
+        count = structure_metrics.rebuild(structure_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Structure metrics rebuilt ({count} structures)')
+        )
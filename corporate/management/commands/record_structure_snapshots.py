@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from corporate import structure_snapshots
+from corporate.models import Structure
+
+
+class Command(BaseCommand):
+    help = 'Record a version of each structure whose ownership graph changed since its last snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--structure',
+            type=int,
+            action='append',
+            dest='structure_ids',
+            help='Only record the given structure id (can be repeated)'
+        )
+        parser.add_argument(
+            '--reason',
+            default='manual snapshot',
+            help='Reason stored with every recorded version'
+        )
+
+    def handle(self, *args, **options):
+        structure_ids = options.get('structure_ids')
+        if structure_ids is None:
+            structure_ids = list(Structure.objects.values_list('id', flat=True))
+
+        recorded = [
+            snapshot for snapshot in (
+                structure_snapshots.record(structure_id, options['reason']) for structure_id in structure_ids
+            )
+            if snapshot is not None
+        ]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Recorded {len(recorded)} new version(s) across {len(structure_ids)} structure(s)'
+            )
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corporate', '0004_structurenode_nodeownership'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='structure',
+            name='validation_state',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Ownership rows and rule contributions behind the aggregated fields'),
+        ),
+    ]
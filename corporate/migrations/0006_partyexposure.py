@@ -0,0 +1,115 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:05
+
+from collections import defaultdict
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PERCENTAGE_QUANTUM = Decimal('0.0001')
+TOLERANCE = 1e-9
+MAX_ITERATIONS = 200
+
+
+def look_through(incoming):
+    """
+    {entity_id: {party_id: fraction}} from {entity_id: [((kind, owner_id), weight)]}:
+    every entity takes its party owners' weights plus its entity owners'
+    fractions scaled by the weight, relaxed until no fraction moves.
+    Fractions of cycles that never settle are capped at 1.0.
+    """
+    fractions = {entity_id: {} for entity_id in incoming}
+    # An acyclic chain settles after one sweep per level
+    for _ in range(len(incoming) + MAX_ITERATIONS):
+        moved = False
+        for entity_id, owners in incoming.items():
+            vector = defaultdict(float)
+            for (kind, owner_id), weight in owners:
+                if kind == 'party':
+                    vector[owner_id] += weight
+                else:
+                    for party_id, fraction in fractions.get(owner_id, {}).items():
+                        vector[party_id] += fraction * weight
+            previous = fractions[entity_id]
+            moved = moved or any(
+                abs(vector.get(party_id, 0.0) - previous.get(party_id, 0.0)) >= TOLERANCE
+                for party_id in vector.keys() | previous.keys()
+            )
+            fractions[entity_id] = vector
+        if not moved:
+            return fractions
+    return {
+        entity_id: {party_id: min(fraction, 1.0) for party_id, fraction in vector.items()}
+        for entity_id, vector in fractions.items()
+    }
+
+
+def build_exposures(apps, schema_editor):
+    """Backfill the index of existing structures: direct and look-through ownership of each party"""
+    EntityOwnership = apps.get_model('corporate', 'EntityOwnership')
+    PartyExposure = apps.get_model('corporate', 'PartyExposure')
+    rows = EntityOwnership.objects.order_by('structure_id', 'id').values_list(
+        'structure_id', 'owner_ubo_id', 'owner_entity_id', 'owned_entity_id', 'ownership_percentage'
+    )
+
+    exposures = []
+    for structure_id, structure_rows in groupby(rows.iterator(), key=itemgetter(0)):
+        direct = defaultdict(Decimal)
+        incoming = defaultdict(list)
+        for _structure_id, party_id, owner_entity_id, owned_entity_id, percentage in structure_rows:
+            if party_id:
+                owner = ('party', party_id)
+                direct[party_id, owned_entity_id] += Decimal(percentage or 0)
+            elif owner_entity_id:
+                owner = ('entity', owner_entity_id)
+            else:
+                continue
+            incoming[owned_entity_id].append((owner, float(percentage or 0) / 100))
+
+        for entity_id, fractions in look_through(incoming).items():
+            for party_id, fraction in fractions.items():
+                if fraction <= 0:
+                    continue
+                exposures.append(PartyExposure(
+                    party_id=party_id, structure_id=structure_id, entity_id=entity_id,
+                    direct_percentage=direct.get((party_id, entity_id), Decimal(0)),
+                    effective_percentage=Decimal(str(round(fraction * 100, 4))).quantize(PERCENTAGE_QUANTUM),
+                ))
+    PartyExposure.objects.bulk_create(exposures, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parties', '0001_initial'),
+        ('corporate', '0005_structure_validation_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartyExposure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direct_percentage', models.DecimalField(decimal_places=4, default=0, help_text='Ownership held directly by the party', max_digits=9)),
+                ('effective_percentage', models.DecimalField(decimal_places=4, default=0, help_text='Look-through ownership, direct and through intermediate entities', max_digits=9)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='party_exposures', to='corporate.entity')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exposures', to='parties.party')),
+                ('structure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='party_exposures', to='corporate.structure')),
+            ],
+            options={
+                'verbose_name': 'Party Exposure',
+                'verbose_name_plural': 'Party Exposures',
+                'ordering': ['party', '-effective_percentage'],
+                'indexes': [
+                    models.Index(fields=['structure'], name='corporate_p_structu_2a8587_idx'),
+                    models.Index(fields=['entity'], name='corporate_p_entity__d42518_idx'),
+                ],
+                'unique_together': {('party', 'structure', 'entity')},
+            },
+        ),
+        migrations.RunPython(build_exposures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    """Backfill path and level of existing nodes from parent_node"""
+    StructureNode = apps.get_model('corporate', 'StructureNode')
+    rows = {row[0]: row for row in StructureNode.objects.values_list('id', 'parent_node_id')}
+
+    children = {}
+    for node_id, parent_id in rows.values():
+        children.setdefault(parent_id if parent_id in rows else None, []).append(node_id)
+
+    changed = []
+    stack = [(node_id, '') for node_id in children.get(None, [])]
+    while stack:
+        node_id, parent_path = stack.pop()
+        path = f"{parent_path}{node_id}/"
+        changed.append(StructureNode(id=node_id, path=path, level=path.count('/')))
+        stack.extend((child_id, path) for child_id in children.get(node_id, []))
+    StructureNode.objects.bulk_update(changed, ['path', 'level'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corporate', '0007_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='structurenode',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Materialized hierarchy path (maintained automatically)', max_length=1000),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
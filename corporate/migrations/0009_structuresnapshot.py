@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corporate', '0008_structurenode_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StructureSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('is_checkpoint', models.BooleanField(default=False)),
+                ('payload', models.BinaryField(help_text='zlib-compressed JSON: full edge set or delta')),
+                ('digest', models.CharField(help_text='SHA-256 of the full edge set at this version', max_length=64)),
+                ('edge_count', models.PositiveIntegerField(default=0)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('structure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='corporate.structure')),
+            ],
+            options={
+                'verbose_name': 'Structure Snapshot',
+                'verbose_name_plural': 'Structure Snapshots',
+                'ordering': ['structure', 'version'],
+                'unique_together': {('structure', 'version')},
+                'indexes': [
+                    models.Index(fields=['structure', 'created_at'], name='corporate_s_structu_83e6df_idx'),
+                    models.Index(fields=['structure', 'is_checkpoint', 'version'], name='corporate_s_structu_0fb617_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:20
+
+from collections import defaultdict, deque
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+TWO_PLACES = Decimal('0.01')
+
+
+def ownership_metrics(edges):
+    """
+    Metric values of one structure from its (owner, owned, percentage) edges:
+    owned entities, those adding up to exactly 100% and the longest chain
+    """
+    totals = defaultdict(Decimal)
+    out_edges = defaultdict(list)
+    in_degree = defaultdict(int)
+    for owner, owned, percentage in edges:
+        totals[owned] += Decimal(percentage or 0)
+        out_edges[owner].append(owned)
+        in_degree[owned] += 1
+
+    # Longest chain through the acyclic part, owners before owned (Kahn's algorithm)
+    depths = defaultdict(int)
+    queue = deque(owner for owner in out_edges if not in_degree[owner])
+    while queue:
+        node = queue.popleft()
+        for owned in out_edges[node]:
+            depths[owned] = max(depths[owned], depths[node] + 1)
+            in_degree[owned] -= 1
+            if not in_degree[owned]:
+                queue.append(owned)
+
+    complete = sum(1 for total in totals.values() if total == 100)
+    completion = Decimal(complete * 100) / len(totals) if totals else Decimal(0)
+    return {
+        'entities_count': len(totals),
+        'complete_entities_count': complete,
+        'completion_percentage': completion.quantize(TWO_PLACES),
+        'max_depth': max(depths.values(), default=0),
+    }
+
+
+def build_metrics(apps, schema_editor):
+    """Backfill the metrics of existing structures"""
+    Structure = apps.get_model('corporate', 'Structure')
+    EntityOwnership = apps.get_model('corporate', 'EntityOwnership')
+    StructureMetrics = apps.get_model('corporate', 'StructureMetrics')
+
+    edges = defaultdict(list)
+    for structure_id, party_id, owner_entity_id, owned_entity_id, percentage in EntityOwnership.objects.values_list(
+        'structure_id', 'owner_ubo_id', 'owner_entity_id', 'owned_entity_id', 'ownership_percentage'
+    ).iterator():
+        if party_id:
+            owner = ('party', party_id)
+        elif owner_entity_id:
+            owner = ('entity', owner_entity_id)
+        else:
+            continue
+        edges[structure_id].append((owner, ('entity', owned_entity_id), percentage))
+
+    StructureMetrics.objects.bulk_create([
+        StructureMetrics(structure_id=structure_id, **ownership_metrics(edges[structure_id]))
+        for structure_id in Structure.objects.values_list('id', flat=True).iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corporate', '0009_structuresnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StructureMetrics',
+            fields=[
+                ('structure', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metrics', serialize=False, to='corporate.structure')),
+                ('entities_count', models.PositiveIntegerField(default=0, help_text='Distinct entities owned in the structure')),
+                ('complete_entities_count', models.PositiveIntegerField(default=0, help_text='Entities whose ownership adds up to exactly 100%')),
+                ('completion_percentage', models.DecimalField(decimal_places=2, default=0, help_text='Share of entities whose ownership is complete', max_digits=5)),
+                ('max_depth', models.PositiveIntegerField(default=0, help_text='Longest ownership chain, in levels')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Structure Metrics',
+                'verbose_name_plural': 'Structure Metrics',
+            },
+        ),
+        migrations.RunPython(build_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:10
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+TWO_PLACES = Decimal('0.01')
+
+
+def build_metrics(apps, schema_editor):
+    """Backfill the new columns, otherwise every existing structure reads as invalid"""
+    EntityOwnership = apps.get_model('corporate', 'EntityOwnership')
+    NodeOwnership = apps.get_model('corporate', 'NodeOwnership')
+    StructureMetrics = apps.get_model('corporate', 'StructureMetrics')
+
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    parties = defaultdict(set)
+    value_usd = defaultdict(Decimal)
+    value_eur = defaultdict(Decimal)
+    for structure_id, party_id, owner_entity_id, owned_entity_id, percentage, usd, eur in (
+        EntityOwnership.objects.values_list(
+            'structure_id', 'owner_ubo_id', 'owner_entity_id', 'owned_entity_id',
+            'ownership_percentage', 'total_value_usd', 'total_value_eur',
+        ).iterator()
+    ):
+        value_usd[structure_id] += usd or 0
+        value_eur[structure_id] += eur or 0
+        if not party_id and not owner_entity_id:
+            continue
+        if party_id:
+            parties[structure_id].add(party_id)
+        totals[structure_id][owned_entity_id] += Decimal(percentage or 0)
+
+    for structure_id, party_id, owned_shares, share_value_usd in NodeOwnership.objects.values_list(
+        'owned_node__structure_id', 'owner_party_id', 'owned_shares', 'share_value_usd'
+    ).iterator():
+        if party_id:
+            parties[structure_id].add(party_id)
+        value_usd[structure_id] += owned_shares * (share_value_usd or 0)
+
+    metrics = list(StructureMetrics.objects.all())
+    for row in metrics:
+        entity_totals = totals[row.structure_id].values()
+        over_allocated = sum(1 for total in entity_totals if total > 100)
+        complete = sum(1 for total in entity_totals if total == 100)
+        if not entity_totals or over_allocated:
+            row.validation_status = 'invalid'
+        elif complete < len(entity_totals):
+            row.validation_status = 'warning'
+        else:
+            row.validation_status = 'valid'
+        row.over_allocated_count = over_allocated
+        row.party_count = len(parties[row.structure_id])
+        row.total_value_usd = Decimal(value_usd[row.structure_id]).quantize(TWO_PLACES)
+        row.total_value_eur = Decimal(value_eur[row.structure_id]).quantize(TWO_PLACES)
+    StructureMetrics.objects.bulk_update(metrics, [
+        'over_allocated_count', 'party_count', 'total_value_usd', 'total_value_eur', 'validation_status',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corporate', '0010_structuremetrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='structuremetrics',
+            name='over_allocated_count',
+            field=models.PositiveIntegerField(default=0, help_text='Entities whose ownership adds up to more than 100%'),
+        ),
+        migrations.AddField(
+            model_name='structuremetrics',
+            name='party_count',
+            field=models.PositiveIntegerField(default=0, help_text='Distinct parties owning entities or nodes of the structure'),
+        ),
+        migrations.AddField(
+            model_name='structuremetrics',
+            name='total_value_eur',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Value of all entity ownerships in EUR', max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='structuremetrics',
+            name='total_value_usd',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Value of all ownerships in USD (entity and node ownerships)', max_digits=20),
+        ),
+        migrations.AddField(
+            model_name='structuremetrics',
+            name='validation_status',
+            field=models.CharField(choices=[('valid', 'Valid'), ('warning', 'Warning'), ('invalid', 'Invalid')], default='invalid', help_text='invalid: no ownerships or an entity above 100%; warning: an entity below 100%', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='structuremetrics',
+            index=models.Index(fields=['completion_percentage'], name='corporate_s_complet_a87cda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='structuremetrics',
+            index=models.Index(fields=['max_depth'], name='corporate_s_max_dep_f21fe7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='structuremetrics',
+            index=models.Index(fields=['entities_count'], name='corporate_s_entitie_f993bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='structuremetrics',
+            index=models.Index(fields=['party_count'], name='corporate_s_party_c_d868f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='structuremetrics',
+            index=models.Index(fields=['total_value_usd'], name='corporate_s_total_v_6d62f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='structuremetrics',
+            index=models.Index(fields=['validation_status'], name='corporate_s_validat_22e37c_idx'),
+        ),
+        migrations.RunPython(build_metrics, migrations.RunPython.noop),
+    ]
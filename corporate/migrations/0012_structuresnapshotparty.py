@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:40
+
+import json
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def collect_parties(apps, schema_editor):
+    """Backfill from the recorded versions: every party owner of a checkpoint or of a delta's new edges"""
+    StructureSnapshot = apps.get_model('corporate', 'StructureSnapshot')
+    StructureSnapshotParty = apps.get_model('corporate', 'StructureSnapshotParty')
+    Party = apps.get_model('parties', 'Party')
+
+    first_versions = {}
+    snapshots = StructureSnapshot.objects.order_by('structure_id', 'version').values_list(
+        'structure_id', 'version', 'is_checkpoint', 'payload'
+    )
+    for structure_id, version, is_checkpoint, payload in snapshots.iterator():
+        # Payloads are zlib-compressed JSON edge maps {"p12>e5": "40"} (or deltas of them)
+        data = json.loads(zlib.decompress(bytes(payload)))
+        keys = data if is_checkpoint else [*data['added'], *data['changed']]
+        for key in keys:
+            owner, _owned = key.split('>')
+            if owner.startswith('p'):
+                first_versions.setdefault((structure_id, int(owner[1:])), version)
+
+    existing = set(Party.objects.values_list('id', flat=True))
+    StructureSnapshotParty.objects.bulk_create([
+        StructureSnapshotParty(structure_id=structure_id, party_id=party_id, first_version=version)
+        for (structure_id, party_id), version in first_versions.items()
+        if party_id in existing
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parties', '0001_initial'),
+        ('corporate', '0011_structuremetrics_totals_and_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StructureSnapshotParty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_version', models.PositiveIntegerField(help_text='First recorded version the party appears in')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='structure_snapshots', to='parties.party')),
+                ('structure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_parties', to='corporate.structure')),
+            ],
+            options={
+                'verbose_name': 'Structure Snapshot Party',
+                'verbose_name_plural': 'Structure Snapshot Parties',
+                'unique_together': {('party', 'structure')},
+            },
+        ),
+        migrations.RunPython(collect_parties, migrations.RunPython.noop),
+    ]
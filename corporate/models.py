@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Concat, Substr
 from django.utils import timezone
 from datetime import timedelta
 
+from sirius_project import deferred_validation
+from .rule_matching import RuleMatcher, format_tax_impacts
+
 
 class Entity(models.Model):
     """
@@ -415,6 +420,12 @@ class Structure(models.Model):
         blank=True,
         help_text="Aggregated severity levels from validation rules"
     )
+    validation_state = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Ownership rows and rule contributions behind the aggregated fields"
+    )
 
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -438,10 +449,9 @@ class Structure(models.Model):
         
         # Update calculated fields after saving (when pk exists)
         if self.pk:
-            self.update_calculated_fields()
-            # Save again only if calculated fields changed
-            if self.tax_impacts or self.severity_levels:
-                super().save(update_fields=['tax_impacts', 'severity_levels'])
+            # Save again only if ownerships or validation rules changed
+            if self.refresh_validation_fields():
+                super().save(update_fields=['tax_impacts', 'severity_levels', 'validation_state'])
         
         if self.status == 'SENT_FOR_APPROVAL':
             # Trigger notification to approvers
@@ -454,47 +464,107 @@ class Structure(models.Model):
 
     def update_calculated_fields(self):
         """Update tax_impacts and severity_levels from validation rules (FASE 5)"""
-        self.tax_impacts = self.combined_tax_impacts
-        self.severity_levels = ", ".join(self.combined_severities)
+        self.refresh_validation_fields(full=True)
+
+    def refresh_validation_fields(self, full=False):
+        """
+        Incrementally update tax_impacts and severity_levels.
+        Only the rule contributions of entities that entered or left the structure
+        since the last computation are updated; everything is re-derived when the
+        ValidationRule table changed or full=True. Returns True if anything changed.
+        """
+        ownerships = {
+            str(ownership_id): [owner_entity_id, owned_entity_id]
+            for ownership_id, owner_entity_id, owned_entity_id in self.entity_ownerships.values_list(
+                'id', 'owner_entity_id', 'owned_entity_id'
+            )
+        }
+        rules_version = ValidationRule.table_version()
+        state = self.validation_state or {}
+        entity_ids = self._entity_ids_from_rows(ownerships.values())
+
+        if full or state.get('rules_version') != rules_version or 'ownerships' not in state:
+            matched = RuleMatcher.for_entities(entity_ids).match(entity_ids).rules
+            contributions = {}
+        else:
+            if state['ownerships'] == ownerships:
+                return False
+
+            previous_entity_ids = self._entity_ids_from_rows(state['ownerships'].values())
+            removed = previous_entity_ids - entity_ids
+            added = entity_ids - previous_entity_ids
+
+            contributions = {
+                rule_id: contribution
+                for rule_id, contribution in state.get('rules', {}).items()
+                if contribution[0] not in removed and contribution[1] not in removed
+            }
+            matched = RuleMatcher.for_entities(entity_ids, touching=added).match(entity_ids).rules
+
+        self.apply_validation_rules(ownerships, rules_version, matched, contributions)
+        return True
+
+    def apply_validation_rules(self, ownerships, rules_version, matched, contributions=None):
+        """
+        Store matched rule contributions and the tax_impacts / severity_levels
+        derived from them. ``ownerships`` maps ownership id (str) to
+        [owner_entity_id, owned_entity_id].
+        """
+        contributions = dict(contributions or {})
+        for rule in matched:
+            contributions[str(rule.id)] = [
+                rule.parent_entity_id,
+                rule.related_entity_id,
+                rule.tax_impacts,
+                rule.severity,
+            ]
+
+        self.validation_state = {
+            'rules_version': rules_version,
+            'ownerships': ownerships,
+            'rules': contributions,
+        }
+        self.tax_impacts = format_tax_impacts(
+            contribution[2] for contribution in contributions.values()
+        )
+        self.severity_levels = ", ".join(sorted({
+            contribution[3] for contribution in contributions.values() if contribution[3]
+        }))
+
+    @staticmethod
+    def _entity_ids_from_rows(rows):
+        entity_ids = set()
+        for owner_entity_id, owned_entity_id in rows:
+            entity_ids.add(owned_entity_id)
+            if owner_entity_id:
+                entity_ids.add(owner_entity_id)
+        return entity_ids
+
+    def match_validation_rules(self):
+        """Match all validation rules touching this structure's entities in one query"""
+        entity_ids = self.get_entity_ids_in_structure()
+        return RuleMatcher.for_entities(entity_ids).match(entity_ids)
 
     @property
     def combined_tax_impacts(self):
         """Return all tax impacts from validation rules based on entities in structure"""
-        impacts = []
-        entities = self.get_all_entities_in_structure()
-        
-        for i, entity1 in enumerate(entities):
-            for entity2 in entities[i+1:]:
-                rules = ValidationRule.objects.filter(
-                    models.Q(parent_entity=entity1, related_entity=entity2) |
-                    models.Q(parent_entity=entity2, related_entity=entity1)
-                )
-                for rule in rules:
-                    if rule.tax_impacts:
-                        impacts.append(rule.tax_impacts)
-        
-        return "; ".join(set(impacts)) if impacts else "No tax impacts identified"
+        return self.match_validation_rules().combined_tax_impacts
 
     @property
     def combined_severities(self):
         """Return all severities from validation rules"""
-        severities = []
-        entities = self.get_all_entities_in_structure()
-        
-        for i, entity1 in enumerate(entities):
-            for entity2 in entities[i+1:]:
-                rules = ValidationRule.objects.filter(
-                    models.Q(parent_entity=entity1, related_entity=entity2) |
-                    models.Q(parent_entity=entity2, related_entity=entity1)
-                )
-                severities.extend([rule.severity for rule in rules if rule.severity])
-        
-        return list(set(severities))
+        return self.match_validation_rules().severities
+
+    def get_entity_ids_in_structure(self):
+        """Get ids of all entities involved in this structure"""
+        return self._entity_ids_from_rows(
+            self.entity_ownerships.values_list('owner_entity_id', 'owned_entity_id')
+        )
 
     def get_all_entities_in_structure(self):
         """Get all entities involved in this structure"""
         entities = []
-        for ownership in self.entity_ownerships.all():
+        for ownership in self.entity_ownerships.select_related('owned_entity', 'owner_entity'):
             if ownership.owned_entity not in entities:
                 entities.append(ownership.owned_entity)
             if ownership.owner_entity and ownership.owner_entity not in entities:
@@ -503,22 +573,20 @@ class Structure(models.Model):
 
     def validate_entity_combinations(self):
         """Validate that no prohibited combinations exist in structure (FASE 6)"""
-        entities = self.get_all_entities_in_structure()
-        
-        for i, entity1 in enumerate(entities):
-            for entity2 in entities[i+1:]:
-                prohibited_rules = ValidationRule.objects.filter(
-                    models.Q(parent_entity=entity1, related_entity=entity2) |
-                    models.Q(parent_entity=entity2, related_entity=entity1),
-                    relationship_type='PROHIBITED'
-                )
-                
-                if prohibited_rules.exists():
-                    rule = prohibited_rules.first()
-                    raise ValidationError(
-                        f"Prohibited combination: {entity1.name} and {entity2.name}. "
-                        f"Reason: {rule.description}"
-                    )
+        prohibited_rules = self.match_validation_rules().prohibited
+
+        if prohibited_rules:
+            rule = prohibited_rules[0]
+            names = dict(
+                Entity.objects.filter(
+                    id__in=[rule.parent_entity_id, rule.related_entity_id]
+                ).values_list('id', 'name')
+            )
+            raise ValidationError(
+                f"Prohibited combination: {names.get(rule.parent_entity_id)} and "
+                f"{names.get(rule.related_entity_id)}. "
+                f"Reason: {rule.description}"
+            )
 
     def clean(self):
         super().clean()
@@ -647,7 +715,7 @@ class EntityOwnership(models.Model):
     def clean(self):
         super().clean()
         # Validate that exactly one owner type is specified
-        owner_count = sum([bool(self.owner_ubo), bool(self.owner_entity)])
+        owner_count = sum([self.owner_ubo_id is not None, self.owner_entity_id is not None])
         if owner_count != 1:
             raise ValidationError("Must specify exactly one owner (UBO or Entity)")
 
@@ -657,28 +725,36 @@ class EntityOwnership(models.Model):
                 "Entity in structure must have Corporate Name, Hash Number, or both"
             )
 
-        # Validate share distribution
-        if self.owned_entity.total_shares:
+        # Validate share distribution (batched inside deferred_validation())
+        if not deferred_validation.defer(self) and self.owned_entity.total_shares:
             self.validate_shares_distribution()
 
     def save(self, *args, **kwargs):
+        self.apply_derived_fields()
+        super().save(*args, **kwargs)
+
+    def apply_derived_fields(self):
+        """
+        Fill in percentage/shares from each other and the total values.
+        Runs without queries once owned_entity is set to a loaded instance.
+        """
+        total_shares = self.owned_entity.total_shares
+
         # Auto-calculate percentage from shares (FASE 4)
-        if self.owned_shares and self.owned_entity.total_shares:
-            calculated_percentage = (self.owned_shares / self.owned_entity.total_shares) * 100
+        if self.owned_shares and total_shares:
+            calculated_percentage = (self.owned_shares / total_shares) * 100
             if not self.ownership_percentage:
                 self.ownership_percentage = calculated_percentage
 
         # Auto-calculate shares from percentage (FASE 4)
-        elif self.ownership_percentage and self.owned_entity.total_shares:
-            calculated_shares = int((self.ownership_percentage / 100) * self.owned_entity.total_shares)
+        elif self.ownership_percentage and total_shares:
+            calculated_shares = int((self.ownership_percentage / 100) * total_shares)
             if not self.owned_shares:
                 self.owned_shares = calculated_shares
 
         # Calculate total values (FASE 3)
         self.calculate_total_values()
 
-        super().save(*args, **kwargs)
-
     def calculate_total_values(self):
         """Calculate total values based on shares and share values"""
         if self.share_value_usd and self.owned_shares:
@@ -788,6 +864,16 @@ class ValidationRule(models.Model):
     def __str__(self):
         return f"{self.parent_entity.name} -> {self.related_entity.name} ({self.get_relationship_type_display()})"
 
+    @classmethod
+    def table_version(cls):
+        """Cheap fingerprint of the rule table, changes whenever a rule is added, edited or removed"""
+        version = cls.objects.aggregate(
+            count=models.Count('id'),
+            latest=models.Max('updated_at')
+        )
+        latest = version['latest'].isoformat() if version['latest'] else ''
+        return f"{version['count']}:{latest}"
+
 
 # Keep existing models that don't need changes for now
 # We'll update references in later phases
@@ -1379,7 +1465,8 @@ class StructureNode(models.Model):
         help_text="Registration or hash number"
     )
     
-    # Hierarchy information
+    # Hierarchy information. Derived from parent_node by save(): a level passed
+    # in by the caller is overwritten with the depth of the node's path.
     level = models.PositiveIntegerField(
         help_text="Level in the structure hierarchy (1 = top level)"
     )
@@ -1393,10 +1480,23 @@ class StructureNode(models.Model):
         help_text="Parent node in the hierarchy"
     )
     
+    # Materialized path: ids from the root down to this node, e.g. "12/40/57/".
+    # Maintained by save(); subtree and ancestor lookups are single indexed queries.
+    path = models.CharField(
+        max_length=1000,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False,
+        help_text="Materialized hierarchy path (maintained automatically)"
+    )
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    PATH_SEPARATOR = '/'
+    
     class Meta:
         verbose_name = "Instância de Empresa"
         verbose_name_plural = "Instâncias de Empresas"
@@ -1424,6 +1524,116 @@ class StructureNode(models.Model):
             total=models.Sum('ownership_percentage')
         )['total'] or 0
         return total
+    
+    def clean(self):
+        super().clean()
+        if self.pk and self.path and self.parent_node_id:
+            if self.parent_node.path.startswith(self.path):
+                raise ValidationError({'parent_node': "A node cannot be moved under itself or one of its descendants"})
+    
+    @classmethod
+    def path_depth(cls, path):
+        return path.count(cls.PATH_SEPARATOR)
+    
+    @classmethod
+    def child_path(cls, parent_path, node_id):
+        return f"{parent_path}{node_id}{cls.PATH_SEPARATOR}"
+    
+    def save(self, *args, **kwargs):
+        """
+        Keep path and level in step with parent_node; level is always derived
+        from the path, never taken from the caller. Moving a node rewrites the
+        paths and levels of its whole subtree in one UPDATE.
+        The node's own and its parent's paths are read from the database, since
+        in-memory instances may be stale after a move_subtree() of an ancestor.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent_node' not in update_fields:
+            return super().save(*args, **kwargs)
+        
+        previous_path = ''
+        if self.pk:
+            previous_path = StructureNode.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+            self.path = previous_path
+        parent_path = ''
+        if self.parent_node_id:
+            parent_path = StructureNode.objects.filter(pk=self.parent_node_id).values_list('path', flat=True).first()
+            if parent_path is None:
+                raise ValidationError({'parent_node': "Parent node does not exist"})
+            if StructureNode.parent_node.is_cached(self):
+                self.parent_node.path = parent_path
+        if previous_path and parent_path.startswith(previous_path):
+            raise ValidationError("A node cannot be moved under itself or one of its descendants")
+        
+        self.level = self.path_depth(parent_path) + 1
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'level'}
+        super().save(*args, **kwargs)
+        
+        path = self.child_path(parent_path, self.pk)
+        if path != self.path:
+            StructureNode.objects.filter(pk=self.pk).update(path=path)
+            self.path = path
+            if previous_path:
+                self.move_subtree(previous_path, path)
+    
+    def move_subtree(self, old_path, new_path):
+        """Re-root the descendants of this node from old_path to new_path"""
+        return StructureNode.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+            path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1)),
+            level=models.F('level') + (self.path_depth(new_path) - self.path_depth(old_path)),
+        )
+    
+    def ancestor_ids(self):
+        """Ids from the root down to the parent, read straight from the path"""
+        return [int(part) for part in self.path.split(self.PATH_SEPARATOR)[:-2]]
+    
+    def get_ancestors(self):
+        """All ancestors, root first, in one query"""
+        return StructureNode.objects.filter(pk__in=self.ancestor_ids()).order_by('level')
+    
+    def get_descendants(self, include_self=False):
+        """The whole subtree below this node in one indexed prefix query"""
+        if not self.path:
+            return StructureNode.objects.none()
+        descendants = StructureNode.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+    
+    def get_root(self):
+        ancestor_ids = self.ancestor_ids()
+        return StructureNode.objects.get(pk=ancestor_ids[0]) if ancestor_ids else self
+    
+    @classmethod
+    def rebuild_paths(cls, structure=None):
+        """
+        Recompute path and level of every node (of one structure) from parent_node
+        in memory, from one query; returns the number of nodes that changed.
+        Nodes caught in a parent cycle keep their stored values.
+        """
+        nodes = cls.objects.all() if structure is None else cls.objects.filter(structure=structure)
+        rows = {row[0]: row for row in nodes.values_list('id', 'parent_node_id', 'path', 'level')}
+        
+        children = {}
+        for node_id, parent_id, _, _ in rows.values():
+            children.setdefault(parent_id if parent_id in rows else None, []).append(node_id)
+        
+        paths = {}
+        stack = [(node_id, '') for node_id in children.get(None, [])]
+        while stack:
+            node_id, parent_path = stack.pop()
+            paths[node_id] = cls.child_path(parent_path, node_id)
+            stack.extend((child_id, paths[node_id]) for child_id in children.get(node_id, []))
+        
+        changed = []
+        for node_id, path in paths.items():
+            _, _, current_path, current_level = rows[node_id]
+            level = cls.path_depth(path)
+            if (current_path, current_level) != (path, level):
+                changed.append(cls(id=node_id, path=path, level=level))
+        cls.objects.bulk_update(changed, ['path', 'level'], batch_size=500)
+        return len(changed)
 
 
 class NodeOwnership(models.Model):
@@ -1506,8 +1716,8 @@ class NodeOwnership(models.Model):
         if self.owner_node and self.owner_node == self.owned_node:
             raise ValidationError("Node cannot own itself")
         
-        # Validate shares don't exceed total shares
-        if self.owned_shares > self.owned_node.total_shares:
+        # Validate shares don't exceed total shares (batched inside deferred_validation())
+        if not deferred_validation.defer(self) and self.owned_shares > self.owned_node.total_shares:
             raise ValidationError("Owned shares cannot exceed total shares")
     
     def get_owner_name(self):
@@ -1530,3 +1740,282 @@ class NodeOwnership(models.Model):
         """Calculate total value of this ownership"""
         return self.owned_shares * self.share_value_usd
 
+
+
+class PartyExposure(models.Model):
+    """
+    Precomputed exposure of a Party in one entity of one structure.
+    Keeps both the direct ownership (sum of the party's own EntityOwnership rows)
+    and the effective look-through percentage through intermediate entities.
+    Rebuilt per structure whenever its ownerships change (see corporate.exposure_index).
+    """
+
+    party = models.ForeignKey(
+        'parties.Party',
+        on_delete=models.CASCADE,
+        related_name='exposures'
+    )
+    structure = models.ForeignKey(
+        Structure,
+        on_delete=models.CASCADE,
+        related_name='party_exposures'
+    )
+    entity = models.ForeignKey(
+        Entity,
+        on_delete=models.CASCADE,
+        related_name='party_exposures'
+    )
+
+    direct_percentage = models.DecimalField(
+        max_digits=9,
+        decimal_places=4,
+        default=0,
+        help_text="Ownership held directly by the party"
+    )
+    effective_percentage = models.DecimalField(
+        max_digits=9,
+        decimal_places=4,
+        default=0,
+        help_text="Look-through ownership, direct and through intermediate entities"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Party Exposure"
+        verbose_name_plural = "Party Exposures"
+        unique_together = ['party', 'structure', 'entity']
+        ordering = ['party', '-effective_percentage']
+        indexes = [
+            models.Index(fields=["structure"]),
+            models.Index(fields=["entity"]),
+        ]
+
+    def __str__(self):
+        return f"{self.party} → {self.entity} ({self.effective_percentage}%)"
+
+    @property
+    def is_indirect(self):
+        return self.direct_percentage == 0
+
+
+class StructureMetrics(models.Model):
+    """
+    Denormalized per-structure figures for listings, dashboards and reports.
+    Recomputed once after each transaction that changed a structure's
+    ownerships commits (see corporate.structure_metrics), so sorting and
+    filtering structures by them is a plain indexed column read.
+    """
+
+    VALIDATION_STATUS_CHOICES = [
+        ('valid', 'Valid'),
+        ('warning', 'Warning'),
+        ('invalid', 'Invalid'),
+    ]
+
+    structure = models.OneToOneField(
+        Structure,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='metrics'
+    )
+    entities_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Distinct entities owned in the structure"
+    )
+    complete_entities_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Entities whose ownership adds up to exactly 100%"
+    )
+    over_allocated_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Entities whose ownership adds up to more than 100%"
+    )
+    completion_percentage = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=0,
+        help_text="Share of entities whose ownership is complete"
+    )
+    max_depth = models.PositiveIntegerField(
+        default=0,
+        help_text="Longest ownership chain, in levels"
+    )
+    party_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Distinct parties owning entities or nodes of the structure"
+    )
+    total_value_usd = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=0,
+        help_text="Value of all ownerships in USD (entity and node ownerships)"
+    )
+    total_value_eur = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=0,
+        help_text="Value of all entity ownerships in EUR"
+    )
+    validation_status = models.CharField(
+        max_length=10,
+        choices=VALIDATION_STATUS_CHOICES,
+        default='invalid',
+        help_text="invalid: no ownerships or an entity above 100%; warning: an entity below 100%"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Structure Metrics"
+        verbose_name_plural = "Structure Metrics"
+        indexes = [
+            models.Index(fields=["completion_percentage"]),
+            models.Index(fields=["max_depth"]),
+            models.Index(fields=["entities_count"]),
+            models.Index(fields=["party_count"]),
+            models.Index(fields=["total_value_usd"]),
+            models.Index(fields=["validation_status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.structure} metrics"
+
+
+class StructureSnapshot(models.Model):
+    """
+    Append-only version history of a structure's ownership graph.
+    Every CHECKPOINT_INTERVAL-th version stores the full edge set; the others
+    store only the edges added, removed or changed since the previous version.
+    Payloads are zlib-compressed JSON (see corporate.structure_snapshots).
+    """
+
+    CHECKPOINT_INTERVAL = 20
+
+    structure = models.ForeignKey(
+        Structure,
+        on_delete=models.CASCADE,
+        related_name='snapshots'
+    )
+    version = models.PositiveIntegerField()
+    is_checkpoint = models.BooleanField(default=False)
+    payload = models.BinaryField(help_text="zlib-compressed JSON: full edge set or delta")
+    digest = models.CharField(max_length=64, help_text="SHA-256 of the full edge set at this version")
+    edge_count = models.PositiveIntegerField(default=0)
+    reason = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Structure Snapshot"
+        verbose_name_plural = "Structure Snapshots"
+        ordering = ['structure', 'version']
+        unique_together = ('structure', 'version')
+        indexes = [
+            models.Index(fields=["structure", "created_at"]),
+            models.Index(fields=["structure", "is_checkpoint", "version"]),
+        ]
+
+    def __str__(self):
+        return f"{self.structure} v{self.version}"
+
+
+class StructureSnapshotParty(models.Model):
+    """
+    Party that owned part of a structure in at least one recorded version,
+    so a party's history reaches structures it no longer holds
+    (maintained by corporate.structure_snapshots.record)
+    """
+
+    structure = models.ForeignKey(
+        Structure,
+        on_delete=models.CASCADE,
+        related_name='snapshot_parties'
+    )
+    party = models.ForeignKey(
+        'parties.Party',
+        on_delete=models.CASCADE,
+        related_name='structure_snapshots'
+    )
+    first_version = models.PositiveIntegerField(help_text="First recorded version the party appears in")
+
+    class Meta:
+        verbose_name = "Structure Snapshot Party"
+        verbose_name_plural = "Structure Snapshot Parties"
+        unique_together = ('party', 'structure')
+
+    def __str__(self):
+        return f"{self.party} in {self.structure} since v{self.first_version}"
+
+
+class ReportJob(models.Model):
+    """
+    Queued organogram report generation.
+    Web requests only create the job; `manage.py process_report_jobs` renders it
+    and the file is served through the job download endpoint once it is DONE.
+    """
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('pdf', 'PDF'),
+        ('html', 'HTML'),
+        ('excel', 'Excel'),
+        ('powerpoint', 'PowerPoint'),
+    ]
+
+    structure = models.ForeignKey(
+        Structure,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='report_jobs'
+    )
+    party = models.ForeignKey(
+        'parties.Party',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='report_jobs'
+    )
+    report_type = models.CharField(max_length=50, default='structure_overview')
+    format = models.CharField(max_length=20, choices=FORMAT_CHOICES, default='pdf')
+    template = models.CharField(max_length=50, default='professional')
+    options = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Completion percentage (0-100)")
+    message = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='report_jobs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Report Job"
+        verbose_name_plural = "Report Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        target = self.structure or self.party or self.report_type
+        return f"{self.get_format_display()} report for {target} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('DONE', 'FAILED')
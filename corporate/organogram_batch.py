@@ -0,0 +1,344 @@
+"""
+Organogram Batch
+Applies an ordered list of organogram builder operations (add/update/delete
+of nodes and ownerships) to one structure in a single transaction.
+Operations may reference objects created earlier in the same batch through
+client-side temporary IDs; the response maps those to database IDs.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Entity, NodeOwnership, StructureNode
+from .signals import invalidate_structure_caches
+from parties.models import Party
+
+
+NODE_FIELDS = ('custom_name', 'total_shares', 'corporate_name')
+OWNERSHIP_FIELDS = ('ownership_percentage', 'owned_shares', 'share_value_usd')
+
+# Foreign keys are resolved by the batch itself, validating them would query per object
+NODE_FK_FIELDS = ['entity_template', 'structure', 'parent_node']
+OWNERSHIP_FK_FIELDS = ['owner_party', 'owner_node', 'owned_node']
+
+
+class BatchOperationError(Exception):
+    """An operation of the batch is invalid; nothing has been written"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+def is_temp_id(value, temp_ids):
+    return isinstance(value, str) and value in temp_ids
+
+
+def existing_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def validation_message(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f'{field}: {", ".join(messages)}' for field, messages in error.message_dict.items())
+    return '; '.join(error.messages)
+
+
+class OrganogramBatch:
+    """
+    Resolves the whole batch in memory against data preloaded with a handful
+    of queries, then writes it with bulk operations
+    """
+
+    def __init__(self, structure, operations):
+        self.structure = structure
+        self.operations = operations
+
+        # Temporary IDs declared by add_* operations
+        self.temp_nodes = {}
+        self.temp_ownerships = {}
+
+        self.nodes = {}
+        self.ownerships = {}
+        self.new_nodes = []
+        self.new_ownerships = []
+        self.dirty_nodes = {}
+        self.dirty_ownerships = {}
+        self.deleted_node_ids = set()
+        self.deleted_ownership_ids = set()
+
+    # Loading
+
+    def preload(self):
+        """One query per referenced model, whatever the size of the batch"""
+        entity_ids, party_ids, ownership_ids = set(), set(), set()
+        declared = set()
+        for operation in self.operations:
+            action = operation.get('action')
+            if action == 'add_node':
+                entity_ids.add(existing_id(operation.get('entity_template_id')))
+            elif action == 'add_ownership' and operation.get('owner_party_id'):
+                party_ids.add(existing_id(operation.get('owner_party_id')))
+            elif action in ('update_ownership', 'delete_ownership'):
+                if not is_temp_id(operation.get('ownership_id'), declared):
+                    ownership_ids.add(existing_id(operation.get('ownership_id')))
+            if operation.get('temp_id'):
+                declared.add(operation['temp_id'])
+
+        self.nodes = {node.id: node for node in StructureNode.objects.filter(structure=self.structure)}
+        self.entities = Entity.objects.in_bulk(entity_ids - {None})
+        self.parties = Party.objects.in_bulk(party_ids - {None})
+        self.ownerships = NodeOwnership.objects.filter(
+            id__in=ownership_ids - {None}, owned_node__structure=self.structure
+        ).select_related('owner_party', 'owner_node', 'owned_node').in_bulk()
+
+    # Resolution
+
+    def node(self, index, value, field):
+        if is_temp_id(value, self.temp_nodes):
+            node = self.temp_nodes[value]
+            if node is None:
+                raise BatchOperationError(index, f'{field}: node "{value}" foi removido neste lote')
+            return node
+        node_id = existing_id(value)
+        if node_id is None or node_id not in self.nodes or node_id in self.deleted_node_ids:
+            raise BatchOperationError(index, f'{field}: node "{value}" não encontrado nesta estrutura')
+        return self.nodes[node_id]
+
+    def ownership(self, index, value):
+        if is_temp_id(value, self.temp_ownerships):
+            ownership = self.temp_ownerships[value]
+            if ownership is None:
+                raise BatchOperationError(index, f'ownership "{value}" foi removido neste lote')
+            return ownership
+        ownership_id = existing_id(value)
+        if ownership_id is None or ownership_id not in self.ownerships or ownership_id in self.deleted_ownership_ids:
+            raise BatchOperationError(index, f'ownership "{value}" não encontrado nesta estrutura')
+        return self.ownerships[ownership_id]
+
+    def declare(self, index, operation):
+        temp_id = operation.get('temp_id')
+        if temp_id is None:
+            return None
+        if not isinstance(temp_id, str) or temp_id in self.temp_nodes or temp_id in self.temp_ownerships:
+            raise BatchOperationError(index, f'temp_id inválido ou repetido: "{temp_id}"')
+        return temp_id
+
+    def add_node(self, index, operation):
+        temp_id = self.declare(index, operation)
+        entity = self.entities.get(existing_id(operation.get('entity_template_id')))
+        if entity is None:
+            raise BatchOperationError(index, 'Entity template não encontrado')
+
+        parent = None
+        if operation.get('parent_node_id') is not None:
+            parent = self.node(index, operation['parent_node_id'], 'parent_node_id')
+
+        node = StructureNode(
+            entity_template=entity,
+            structure=self.structure,
+            custom_name=operation.get('custom_name', ''),
+            total_shares=operation.get('total_shares', 1000),
+            corporate_name=operation.get('corporate_name', ''),
+            level=parent.level + 1 if parent else 1,
+            parent_node=parent,
+        )
+        self.new_nodes.append(node)
+        if temp_id:
+            self.temp_nodes[temp_id] = node
+
+    def update_node(self, index, operation):
+        node = self.node(index, operation.get('node_id'), 'node_id')
+        for field in NODE_FIELDS:
+            if field in operation:
+                setattr(node, field, operation[field])
+        if node.pk:
+            self.dirty_nodes[node.pk] = node
+
+    def delete_node(self, index, operation):
+        self.remove_node(self.node(index, operation.get('node_id'), 'node_id'))
+
+    def remove_node(self, node):
+        """Remove a node and, like the database cascade, its descendants and their ownerships"""
+        children = [child for child in self.new_nodes if child.parent_node is node]
+        if node.pk:
+            self.deleted_node_ids.add(node.pk)
+            self.dirty_nodes.pop(node.pk, None)
+            children += [
+                child for child in self.nodes.values()
+                if child.parent_node_id == node.pk and child.pk not in self.deleted_node_ids
+            ]
+        else:
+            self.new_nodes.remove(node)
+            self.temp_nodes = {key: (None if value is node else value) for key, value in self.temp_nodes.items()}
+
+        for child in children:
+            self.remove_node(child)
+        for ownership in [o for o in self.new_ownerships if node in (o.owned_node, o.owner_node)]:
+            self.drop_new_ownership(ownership)
+
+    def add_ownership(self, index, operation):
+        temp_id = self.declare(index, operation)
+        ownership = NodeOwnership(
+            owned_node=self.node(index, operation.get('owned_node_id'), 'owned_node_id'),
+            ownership_percentage=operation.get('ownership_percentage'),
+            owned_shares=operation.get('owned_shares', 0),
+            share_value_usd=operation.get('share_value_usd', 0),
+        )
+        if operation.get('owner_party_id'):
+            ownership.owner_party = self.parties.get(existing_id(operation['owner_party_id']))
+            if ownership.owner_party is None:
+                raise BatchOperationError(index, 'Party não encontrada')
+        elif operation.get('owner_node_id') is not None:
+            ownership.owner_node = self.node(index, operation['owner_node_id'], 'owner_node_id')
+        else:
+            raise BatchOperationError(index, 'Owner não especificado')
+
+        self.new_ownerships.append(ownership)
+        if temp_id:
+            self.temp_ownerships[temp_id] = ownership
+
+    def update_ownership(self, index, operation):
+        ownership = self.ownership(index, operation.get('ownership_id'))
+        for field in OWNERSHIP_FIELDS:
+            if field in operation:
+                setattr(ownership, field, operation[field])
+        if ownership.pk:
+            self.dirty_ownerships[ownership.pk] = ownership
+
+    def delete_ownership(self, index, operation):
+        ownership = self.ownership(index, operation.get('ownership_id'))
+        if ownership.pk:
+            self.deleted_ownership_ids.add(ownership.pk)
+            self.dirty_ownerships.pop(ownership.pk, None)
+        else:
+            self.drop_new_ownership(ownership)
+
+    def drop_new_ownership(self, ownership):
+        self.new_ownerships.remove(ownership)
+        self.temp_ownerships = {
+            key: (None if value is ownership else value) for key, value in self.temp_ownerships.items()
+        }
+
+    ACTIONS = ('add_node', 'update_node', 'delete_node', 'add_ownership', 'update_ownership', 'delete_ownership')
+
+    def resolve(self):
+        for index, operation in enumerate(self.operations):
+            action = operation.get('action') if isinstance(operation, dict) else None
+            if action not in self.ACTIONS:
+                raise BatchOperationError(index, f'Ação não reconhecida: {action}')
+            getattr(self, action)(index, operation)
+
+    # Validation
+
+    def validate(self):
+        """Field and model validation of everything that will be written, before any write"""
+        names = {}
+        remaining = [node for pk, node in self.nodes.items() if pk not in self.deleted_node_ids]
+        for node in remaining + self.new_nodes:
+            if node.custom_name in names:
+                raise BatchOperationError(self.index_of(node), f'Nome de node repetido: "{node.custom_name}"')
+            names[node.custom_name] = node
+
+        for node in self.new_nodes + list(self.dirty_nodes.values()):
+            try:
+                node.full_clean(exclude=NODE_FK_FIELDS, validate_unique=False)
+            except ValidationError as e:
+                raise BatchOperationError(self.index_of(node), validation_message(e))
+
+        for ownership in self.new_ownerships + list(self.dirty_ownerships.values()):
+            if ownership.owner_node_id in self.deleted_node_ids or ownership.owned_node_id in self.deleted_node_ids:
+                # Existing ownership of a deleted node: removed by the cascade
+                continue
+            try:
+                ownership.full_clean(exclude=OWNERSHIP_FK_FIELDS, validate_unique=False)
+            except ValidationError as e:
+                raise BatchOperationError(self.index_of(ownership), validation_message(e))
+
+    def index_of(self, obj):
+        """Index of the operation that introduced an object, for error reporting"""
+        for registry in (self.temp_nodes, self.temp_ownerships):
+            for temp_id, value in registry.items():
+                if value is obj:
+                    for index, operation in enumerate(self.operations):
+                        if operation.get('temp_id') == temp_id:
+                            return index
+        for index, operation in enumerate(self.operations):
+            for key in ('node_id', 'ownership_id'):
+                if obj.pk is not None and existing_id(operation.get(key)) == obj.pk:
+                    return index
+        return None
+
+    # Writing
+
+    def write(self):
+        """Deletes, then node inserts one hierarchy level at a time, then updates and ownership inserts"""
+        if self.deleted_ownership_ids:
+            NodeOwnership.objects.filter(id__in=self.deleted_ownership_ids).delete()
+        if self.deleted_node_ids:
+            StructureNode.objects.filter(id__in=self.deleted_node_ids).delete()
+
+        # A node can only be inserted once its parent has a primary key
+        pending = list(self.new_nodes)
+        while pending:
+            wave = [node for node in pending if node.parent_node is None or node.parent_node.pk is not None]
+            StructureNode.objects.bulk_create(wave)
+            for node in wave:
+                parent_path = node.parent_node.path if node.parent_node else ''
+                node.path = StructureNode.child_path(parent_path, node.pk)
+            pending = [node for node in pending if node.pk is None]
+        if self.new_nodes:
+            # Paths embed the new primary keys, so they are written after the inserts
+            StructureNode.objects.bulk_update(self.new_nodes, ['path'])
+
+        if self.dirty_nodes:
+            StructureNode.objects.bulk_update(self.dirty_nodes.values(), NODE_FIELDS)
+
+        # bulk_create picks up the primary keys of the nodes created above
+        NodeOwnership.objects.bulk_create(self.new_ownerships)
+
+        dirty_ownerships = [
+            ownership for ownership in self.dirty_ownerships.values()
+            if ownership.owned_node_id not in self.deleted_node_ids
+            and ownership.owner_node_id not in self.deleted_node_ids
+        ]
+        if dirty_ownerships:
+            NodeOwnership.objects.bulk_update(dirty_ownerships, OWNERSHIP_FIELDS)
+
+    def apply(self):
+        self.preload()
+        self.resolve()
+        self.validate()
+        with transaction.atomic():
+            self.write()
+            # Bulk writes skip the model signals that keep structure caches fresh
+            invalidate_structure_caches(self.structure.id)
+
+        return {
+            'nodes': {
+                temp_id: node.pk for temp_id, node in self.temp_nodes.items() if node is not None
+            },
+            'ownerships': {
+                temp_id: ownership.pk for temp_id, ownership in self.temp_ownerships.items() if ownership is not None
+            },
+        }
+
+    def summary(self):
+        return {
+            'nodes_created': len(self.new_nodes),
+            'nodes_updated': len(self.dirty_nodes),
+            'nodes_deleted': len(self.deleted_node_ids),
+            'ownerships_created': len(self.new_ownerships),
+            'ownerships_updated': len(self.dirty_ownerships),
+            'ownerships_deleted': len(self.deleted_ownership_ids),
+        }
+
+
+def apply_operations(structure, operations):
+    """Apply a builder batch; returns (temporary ID mapping, summary counts)"""
+    batch = OrganogramBatch(structure, operations)
+    id_map = batch.apply()
+    return id_map, batch.summary()
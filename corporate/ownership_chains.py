@@ -0,0 +1,218 @@
+"""
+Ownership Chains
+Ancestors and descendants of an entity (EntityOwnership) or a structure node
+(NodeOwnership) through any number of ownership hops, resolved by a single
+WITH RECURSIVE query (SQLite and PostgreSQL). Every result carries its path
+and the cumulative percentage along that path.
+"""
+
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Entity, EntityOwnership, NodeOwnership, StructureNode
+from parties.models import Party
+
+
+MAX_DEPTH = 50
+PERCENTAGE_QUANTUM = Decimal('0.0001')
+
+# kind is 'entity', 'node' or 'party'; path lists the chain top-down as
+# tokens ("e:12", "n:7", "p:3") between slashes
+ChainLink = namedtuple('ChainLink', 'kind id name depth path percentage')
+
+
+class ChainSpec:
+    """Table and column names of one ownership model, read from its model meta"""
+
+    def __init__(self, model, node_model, token, owned, owner, party_owner, name_field, structure=None):
+        meta = model._meta
+        self.table = connection.ops.quote_name(meta.db_table)
+        self.owned = meta.get_field(owned).column
+        self.owner = meta.get_field(owner).column
+        self.party_owner = meta.get_field(party_owner).column
+        self.percentage = meta.get_field('ownership_percentage').column
+        self.structure = meta.get_field(structure).column if structure else None
+        self.node_table = connection.ops.quote_name(node_model._meta.db_table)
+        self.name_column = node_model._meta.get_field(name_field).column
+        self.party_table = connection.ops.quote_name(Party._meta.db_table)
+        self.token = token
+        self.kind = 'entity' if token == 'e' else 'node'
+
+    def token_sql(self, column):
+        return f"'{self.token}:' || CAST({column} AS TEXT)"
+
+    def structure_filter(self, alias, structure_id, params):
+        if self.structure is None or structure_id is None:
+            return ''
+        params.append(structure_id)
+        return f' AND {alias}.{self.structure} = %s'
+
+
+ENTITY_CHAINS = ChainSpec(
+    EntityOwnership, Entity, 'e', 'owned_entity', 'owner_entity', 'owner_ubo', 'name', structure='structure'
+)
+NODE_CHAINS = ChainSpec(
+    NodeOwnership, StructureNode, 'n', 'owned_node', 'owner_node', 'owner_party', 'custom_name'
+)
+
+
+def descendants_cte(spec, start_id, structure_id=None, max_depth=MAX_DEPTH):
+    """
+    CTE "chain(item_id, depth, path, percentage)": everything owned, directly or
+    through intermediate owners, by ``start_id``; one row per distinct path
+    """
+    params = [start_id, start_id]
+    anchor_filter = spec.structure_filter('o', structure_id, params)
+    params.append(max_depth)
+    recursive_filter = spec.structure_filter('o', structure_id, params)
+    owned_token = spec.token_sql(f'o.{spec.owned}')
+    sql = f"""
+        WITH RECURSIVE chain(item_id, depth, path, percentage) AS (
+            SELECT o.{spec.owned}, 1,
+                   '/' || {spec.token_sql('%s')} || '/' || {owned_token} || '/',
+                   CAST(o.{spec.percentage} AS NUMERIC)
+            FROM {spec.table} o
+            WHERE o.{spec.owner} = %s{anchor_filter}
+            UNION ALL
+            SELECT o.{spec.owned}, c.depth + 1,
+                   c.path || {owned_token} || '/',
+                   c.percentage * o.{spec.percentage} / 100.0
+            FROM chain c
+            JOIN {spec.table} o ON o.{spec.owner} = c.item_id
+            WHERE c.depth < %s
+              AND c.path NOT LIKE ('%%/' || {owned_token} || '/%%'){recursive_filter}
+        )"""
+    return sql, params
+
+
+def ancestors_cte(spec, start_id, structure_id=None, max_depth=MAX_DEPTH):
+    """
+    CTE "chain(owner_id, party_id, depth, path, percentage)": every entity/node
+    and party owning ``start_id`` directly or indirectly; ``percentage`` is the
+    share of the start reached through that path
+    """
+    params = [start_id, start_id]
+    anchor_filter = spec.structure_filter('o', structure_id, params)
+    params.append(max_depth)
+    recursive_filter = spec.structure_filter('o', structure_id, params)
+    owner_token = (
+        f"CASE WHEN o.{spec.owner} IS NOT NULL THEN {spec.token_sql(f'o.{spec.owner}')}"
+        f" ELSE 'p:' || CAST(o.{spec.party_owner} AS TEXT) END"
+    )
+    sql = f"""
+        WITH RECURSIVE chain(owner_id, party_id, depth, path, percentage) AS (
+            SELECT o.{spec.owner}, o.{spec.party_owner}, 1,
+                   '/' || {owner_token} || '/' || {spec.token_sql('%s')} || '/',
+                   CAST(o.{spec.percentage} AS NUMERIC)
+            FROM {spec.table} o
+            WHERE o.{spec.owned} = %s{anchor_filter}
+            UNION ALL
+            SELECT o.{spec.owner}, o.{spec.party_owner}, c.depth + 1,
+                   '/' || {owner_token} || c.path,
+                   c.percentage * o.{spec.percentage} / 100.0
+            FROM chain c
+            JOIN {spec.table} o ON o.{spec.owned} = c.owner_id
+            WHERE c.depth < %s
+              AND c.path NOT LIKE ('%%/' || {owner_token} || '/%%'){recursive_filter}
+        )"""
+    return sql, params
+
+
+def as_percentage(value):
+    return Decimal(str(value)).quantize(PERCENTAGE_QUANTUM)
+
+
+def fetch_descendants(spec, start_id, structure_id=None, max_depth=MAX_DEPTH):
+    cte, params = descendants_cte(spec, start_id, structure_id, max_depth)
+    sql = f"""{cte}
+        SELECT c.item_id, t.{spec.name_column}, c.depth, c.path, c.percentage
+        FROM chain c
+        JOIN {spec.node_table} t ON t.id = c.item_id
+        ORDER BY c.depth, c.path"""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            ChainLink(spec.kind, item_id, name, depth, path, as_percentage(percentage))
+            for item_id, name, depth, path, percentage in cursor.fetchall()
+        ]
+
+
+def fetch_ancestors(spec, start_id, structure_id=None, max_depth=MAX_DEPTH):
+    cte, params = ancestors_cte(spec, start_id, structure_id, max_depth)
+    sql = f"""{cte}
+        SELECT c.owner_id, c.party_id, COALESCE(t.{spec.name_column}, p.name), c.depth, c.path, c.percentage
+        FROM chain c
+        LEFT JOIN {spec.node_table} t ON t.id = c.owner_id
+        LEFT JOIN {spec.party_table} p ON p.id = c.party_id
+        ORDER BY c.depth, c.path"""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            ChainLink(
+                spec.kind if owner_id is not None else 'party',
+                owner_id if owner_id is not None else party_id,
+                name, depth, path, as_percentage(percentage),
+            )
+            for owner_id, party_id, name, depth, path, percentage in cursor.fetchall()
+        ]
+
+
+# Rows: one database round trip each
+
+def entity_descendants(entity, structure=None, max_depth=MAX_DEPTH):
+    """Entities owned by ``entity`` directly or indirectly, as ChainLinks"""
+    return fetch_descendants(ENTITY_CHAINS, _pk(entity), _pk(structure), max_depth)
+
+
+def entity_ancestors(entity, structure=None, max_depth=MAX_DEPTH):
+    """Entities and parties owning ``entity`` directly or indirectly, as ChainLinks"""
+    return fetch_ancestors(ENTITY_CHAINS, _pk(entity), _pk(structure), max_depth)
+
+
+def node_descendants(node, max_depth=MAX_DEPTH):
+    """Nodes owned by ``node`` through NodeOwnership chains, as ChainLinks"""
+    return fetch_descendants(NODE_CHAINS, _pk(node), None, max_depth)
+
+
+def node_ancestors(node, max_depth=MAX_DEPTH):
+    """Nodes and parties owning ``node`` through NodeOwnership chains, as ChainLinks"""
+    return fetch_ancestors(NODE_CHAINS, _pk(node), None, max_depth)
+
+
+# QuerySets: the CTE becomes an "id IN (WITH RECURSIVE ...)" subquery, so the
+# result can be filtered, ordered and annotated like any other queryset
+
+def _ids(cte, params, column, extra=''):
+    return RawSQL(f'{cte} SELECT {column} FROM chain{extra}', params)
+
+
+def descendant_entities(entity, structure=None, max_depth=MAX_DEPTH):
+    cte, params = descendants_cte(ENTITY_CHAINS, _pk(entity), _pk(structure), max_depth)
+    return Entity.objects.filter(pk__in=_ids(cte, params, 'item_id'))
+
+
+def ancestor_entities(entity, structure=None, max_depth=MAX_DEPTH):
+    cte, params = ancestors_cte(ENTITY_CHAINS, _pk(entity), _pk(structure), max_depth)
+    return Entity.objects.filter(pk__in=_ids(cte, params, 'owner_id', ' WHERE owner_id IS NOT NULL'))
+
+
+def ancestor_parties(entity, structure=None, max_depth=MAX_DEPTH):
+    cte, params = ancestors_cte(ENTITY_CHAINS, _pk(entity), _pk(structure), max_depth)
+    return Party.objects.filter(pk__in=_ids(cte, params, 'party_id', ' WHERE party_id IS NOT NULL'))
+
+
+def descendant_nodes(node, max_depth=MAX_DEPTH):
+    cte, params = descendants_cte(NODE_CHAINS, _pk(node), None, max_depth)
+    return StructureNode.objects.filter(pk__in=_ids(cte, params, 'item_id'))
+
+
+def ancestor_nodes(node, max_depth=MAX_DEPTH):
+    cte, params = ancestors_cte(NODE_CHAINS, _pk(node), None, max_depth)
+    return StructureNode.objects.filter(pk__in=_ids(cte, params, 'owner_id', ' WHERE owner_id IS NOT NULL'))
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
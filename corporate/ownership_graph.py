@@ -0,0 +1,295 @@
+"""
+Ownership Graph
+Compact in-memory ownership graph shared by all structure analyses
+(hierarchy depth, node levels, cycle detection and ownership totals)
+"""
+
+from array import array
+from collections import deque
+from decimal import Decimal
+
+
+PARTY = 'party'
+ENTITY = 'entity'
+NODE = 'node'
+
+ENTITY_OWNERSHIP_FIELDS = (
+    'id', 'owner_ubo_id', 'owner_entity_id', 'owned_entity_id', 'ownership_percentage',
+)
+NODE_OWNERSHIP_FIELDS = (
+    'id', 'owner_party_id', 'owner_node_id', 'owned_node_id', 'ownership_percentage',
+)
+
+
+class OwnershipGraph:
+    """
+    Directed owner → owned graph with integer-indexed adjacency arrays.
+
+    Nodes are identified by hashable keys such as ('party', 3) or ('entity', 7)
+    and mapped to consecutive integer indexes. Edges are stored in parallel
+    arrays (source, target, percentage, ownership id) and each node keeps the
+    list of its outgoing and incoming edge indexes.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.index = {}
+        self.out_edges = []
+        self.in_edges = []
+        self.edge_source = array('l')
+        self.edge_target = array('l')
+        self.edge_percentage = []
+        self.edge_ids = []
+
+    # Construction
+
+    @classmethod
+    def for_structure(cls, structure):
+        """Build the EntityOwnership graph of a structure with one values() query"""
+        from .models import EntityOwnership
+        return cls.from_entity_ownerships(EntityOwnership.objects.filter(structure=structure))
+
+    @classmethod
+    def for_structure_nodes(cls, structure):
+        """Build the NodeOwnership graph of a structure with one values() query"""
+        from .models import NodeOwnership
+        return cls.from_node_ownerships(NodeOwnership.objects.filter(owned_node__structure=structure))
+
+    @classmethod
+    def from_entity_ownerships(cls, queryset):
+        """Build a graph from an EntityOwnership queryset"""
+        return cls.from_rows(queryset.order_by().values(*ENTITY_OWNERSHIP_FIELDS))
+
+    @classmethod
+    def from_node_ownerships(cls, queryset):
+        """Build a graph from a NodeOwnership queryset"""
+        graph = cls()
+        for row in queryset.order_by().values(*NODE_OWNERSHIP_FIELDS):
+            if row['owner_party_id']:
+                owner = (PARTY, row['owner_party_id'])
+            else:
+                owner = (NODE, row['owner_node_id'])
+            graph.add_edge(owner, (NODE, row['owned_node_id']), row['ownership_percentage'], row['id'])
+        return graph
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a graph from EntityOwnership value rows"""
+        graph = cls()
+        for row in rows:
+            if row['owner_ubo_id']:
+                owner = (PARTY, row['owner_ubo_id'])
+            elif row['owner_entity_id']:
+                owner = (ENTITY, row['owner_entity_id'])
+            else:
+                continue
+            graph.add_edge(owner, (ENTITY, row['owned_entity_id']), row['ownership_percentage'], row['id'])
+        return graph
+
+    def add_node(self, key):
+        """Return the index of a node, registering it if needed"""
+        idx = self.index.get(key)
+        if idx is None:
+            idx = len(self.keys)
+            self.index[key] = idx
+            self.keys.append(key)
+            self.out_edges.append([])
+            self.in_edges.append([])
+        return idx
+
+    def add_edge(self, owner_key, owned_key, percentage=None, ownership_id=None):
+        """Add an ownership edge between two node keys"""
+        source = self.add_node(owner_key)
+        target = self.add_node(owned_key)
+        edge = len(self.edge_source)
+        self.edge_source.append(source)
+        self.edge_target.append(target)
+        self.edge_percentage.append(Decimal(percentage or 0))
+        self.edge_ids.append(ownership_id)
+        self.out_edges[source].append(edge)
+        self.in_edges[target].append(edge)
+        return edge
+
+    # Basic accessors
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_source)
+
+    def children(self, idx):
+        return [self.edge_target[edge] for edge in self.out_edges[idx]]
+
+    def parents(self, idx):
+        return [self.edge_source[edge] for edge in self.in_edges[idx]]
+
+    def nodes_of_kind(self, kind):
+        return [idx for idx, key in enumerate(self.keys) if key[0] == kind]
+
+    def ids_of(self, indexes):
+        """Translate node indexes back to their database ids"""
+        return [self.keys[idx][1] for idx in indexes]
+
+    # Analyses
+
+    def roots(self):
+        """Nodes nobody owns"""
+        return [idx for idx in range(len(self.keys)) if not self.in_edges[idx]]
+
+    def leaves(self):
+        """Nodes that own nothing"""
+        return [idx for idx in range(len(self.keys)) if not self.out_edges[idx]]
+
+    def topological_order(self):
+        """
+        Owners before owned (Kahn's algorithm).
+        Nodes that sit on or below an ownership cycle are left out.
+        """
+        in_degree = [len(edges) for edges in self.in_edges]
+        queue = deque(idx for idx, degree in enumerate(in_degree) if degree == 0)
+        order = []
+        while queue:
+            idx = queue.popleft()
+            order.append(idx)
+            for edge in self.out_edges[idx]:
+                target = self.edge_target[edge]
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+        return order
+
+    def is_acyclic(self):
+        return len(self.topological_order()) == len(self.keys)
+
+    def levels(self):
+        """Shortest distance (in edges) from a root, 0 for unreachable nodes"""
+        levels = [0] * len(self.keys)
+        visited = [False] * len(self.keys)
+        queue = deque(self.roots())
+        for idx in queue:
+            visited[idx] = True
+        while queue:
+            idx = queue.popleft()
+            for edge in self.out_edges[idx]:
+                target = self.edge_target[edge]
+                if not visited[target]:
+                    visited[target] = True
+                    levels[target] = levels[idx] + 1
+                    queue.append(target)
+        return levels
+
+    def depths(self):
+        """Longest ownership chain (in edges) from a root down to each node"""
+        depths = [0] * len(self.keys)
+        for idx in self.topological_order():
+            for edge in self.out_edges[idx]:
+                target = self.edge_target[edge]
+                if depths[idx] + 1 > depths[target]:
+                    depths[target] = depths[idx] + 1
+        return depths
+
+    def max_depth(self):
+        return max(self.depths(), default=0)
+
+    def strongly_connected_components(self):
+        """Tarjan's algorithm, iterative so deep chains do not hit the recursion limit"""
+        size = len(self.keys)
+        index_of = [-1] * size
+        lowlink = [0] * size
+        on_stack = [False] * size
+        stack = []
+        components = []
+        counter = 0
+
+        for start in range(size):
+            if index_of[start] != -1:
+                continue
+            work = [(start, 0)]
+            while work:
+                idx, position = work.pop()
+                if position == 0:
+                    index_of[idx] = lowlink[idx] = counter
+                    counter += 1
+                    stack.append(idx)
+                    on_stack[idx] = True
+                recurse = False
+                out_edges = self.out_edges[idx]
+                while position < len(out_edges):
+                    target = self.edge_target[out_edges[position]]
+                    position += 1
+                    if index_of[target] == -1:
+                        work.append((idx, position))
+                        work.append((target, 0))
+                        recurse = True
+                        break
+                    if on_stack[target]:
+                        lowlink[idx] = min(lowlink[idx], index_of[target])
+                if recurse:
+                    continue
+                if lowlink[idx] == index_of[idx]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == idx:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[idx])
+        return components
+
+    def cyclic_components(self):
+        """
+        Strongly connected components that contain a cycle (more than one
+        member, or a node owning itself), members sorted by node index
+        """
+        return [
+            sorted(component) for component in self.strongly_connected_components()
+            if len(component) > 1 or component[0] in self.children(component[0])
+        ]
+
+    def cycles(self):
+        """
+        One ownership cycle per strongly connected component, as a closed path
+        of node indexes (first node repeated at the end)
+        """
+        return [self.shortest_cycle(members) for members in self.cyclic_components()]
+
+    def shortest_cycle(self, members):
+        """Shortest path from the first member back to itself inside one component"""
+        start = members[0]
+        members = set(members)
+        previous = {}
+        queue = deque([start])
+        while queue:
+            idx = queue.popleft()
+            for target in self.children(idx):
+                if target not in members:
+                    continue
+                if target == start:
+                    path = [idx]
+                    while path[-1] != start:
+                        path.append(previous[path[-1]])
+                    path.reverse()
+                    return path + [start]
+                if target not in previous:
+                    previous[target] = idx
+                    queue.append(target)
+        return [start, start]
+
+    def totals(self):
+        """Sum of incoming ownership percentages per node"""
+        totals = [Decimal(0)] * len(self.keys)
+        for edge, target in enumerate(self.edge_target):
+            totals[target] += self.edge_percentage[edge]
+        return totals
+
+    def total_owned(self, key):
+        idx = self.index.get(key)
+        if idx is None:
+            return Decimal(0)
+        return sum((self.edge_percentage[edge] for edge in self.in_edges[idx]), Decimal(0))
@@ -0,0 +1,248 @@
+"""
+PDF Ownership Matrix
+Owner × entity matrix drawn straight onto a ReportLab canvas. Large matrices
+are tiled across pages (row bands × column bands) with the owner and entity
+headers repeated on every page.
+"""
+
+from .xlsx_export import PivotAccumulator
+
+try:
+    from reportlab.lib.colors import HexColor, black, white
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+
+FONT = 'Helvetica'
+BOLD_FONT = 'Helvetica-Bold'
+FONT_SIZE = 7
+TITLE_SIZE = 12
+ROW_HEIGHT = 11
+MARGIN = 28
+CELL_PADDING = 3
+MAX_COLUMN_WIDTH = 90
+MAX_ROW_HEADER_WIDTH = 160
+
+HEADER_COLOR = '#667eea'
+STRIPE_COLOR = '#f2f4fd'
+
+
+def format_percentage(value):
+    return '' if value is None else f'{value:.2f}'
+
+
+def fit_text(text, width, font=FONT):
+    """Truncate text with an ellipsis so it fits in ``width`` points"""
+    if stringWidth(text, font, FONT_SIZE) <= width:
+        return text
+    while text and stringWidth(text + '…', font, FONT_SIZE) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+class MatrixLayout:
+    """
+    Column widths, labels and page tiling computed once up front, so drawing
+    each page is a straight loop over its cells
+    """
+
+    def __init__(self, pivot, page_size):
+        self.columns = pivot.ordered_columns()
+        self.rows = pivot.ordered_rows()
+        self.values = pivot.values
+        self.label = pivot.label
+        self._widths = {}
+
+        # Column totals become the last matrix row; widest value per column in the same pass
+        self.totals = {column: 0.0 for column in self.columns}
+        self.widest = {column: 0.0 for column in self.columns}
+        for row in self.values.values():
+            for column, value in row.items():
+                self.totals[column] += value
+                self.widest[column] = max(self.widest[column], self.text_width(format_percentage(value)))
+
+        self.row_header_width = min(
+            MAX_ROW_HEADER_WIDTH,
+            max(stringWidth(label, BOLD_FONT, FONT_SIZE) for label in [*map(self.label, self.rows), 'Total'])
+            + 2 * CELL_PADDING
+        )
+        self.column_widths = [self.column_width(column) for column in self.columns]
+        self.column_index = {column: index for index, column in enumerate(self.columns)}
+
+        # Labels are fitted once, not on every page they are repeated on
+        self.column_labels = [
+            fit_text(self.label(column), width - 2 * CELL_PADDING, BOLD_FONT)
+            for column, width in zip(self.columns, self.column_widths)
+        ]
+        self.row_labels = {
+            row: fit_text(self.label(row), self.row_header_width - 2 * CELL_PADDING, BOLD_FONT)
+            for row in self.rows
+        }
+        self.row_labels[None] = 'Total'
+
+        self.page_width, self.page_height = page_size
+        usable_width = self.page_width - 2 * MARGIN - self.row_header_width
+        usable_height = self.page_height - 2 * MARGIN - TITLE_SIZE - 2 * ROW_HEIGHT
+        self.rows_per_page = max(1, int(usable_height // ROW_HEIGHT))
+        self.column_bands = self.split_columns(usable_width)
+
+    def text_width(self, text):
+        """Width of a (regular font) value, cached since percentages repeat a lot"""
+        width = self._widths.get(text)
+        if width is None:
+            width = self._widths[text] = stringWidth(text, FONT, FONT_SIZE)
+        return width
+
+    def column_width(self, column):
+        widest = max(
+            stringWidth(self.label(column), BOLD_FONT, FONT_SIZE),
+            stringWidth(format_percentage(self.totals[column]), BOLD_FONT, FONT_SIZE),
+            self.widest[column],
+        )
+        return min(MAX_COLUMN_WIDTH, widest + 2 * CELL_PADDING)
+
+    def split_columns(self, usable_width):
+        """
+        Greedy split of the columns into bands that each fit the page width.
+        Also records each column's x offset inside its band.
+        """
+        self.column_offsets = [0] * len(self.columns)
+        self.column_band = [0] * len(self.columns)
+        bands = []
+        start = 0
+        used = 0
+        for index, width in enumerate(self.column_widths):
+            if index > start and used + width > usable_width:
+                bands.append((start, index))
+                start = index
+                used = 0
+            self.column_offsets[index] = used
+            self.column_band[index] = len(bands)
+            used += width
+        bands.append((start, len(self.columns)))
+        return bands
+
+    def row_bands(self):
+        labels = self.rows + [None]  # None stands for the totals row
+        return [labels[i:i + self.rows_per_page] for i in range(0, len(labels), self.rows_per_page)]
+
+    def tiles(self):
+        """
+        (row band number, row labels, column band number, column band) of
+        every tile that holds at least one value.
+        Empty tiles of sparse matrices are skipped; the totals row keeps
+        every column band on the last row band.
+        """
+        tiles = []
+        for row_number, row_labels in enumerate(self.row_bands(), 1):
+            used = set()
+            for row_label in row_labels:
+                values = self.totals if row_label is None else self.values[row_label]
+                used.update(self.column_band[self.column_index[column]] for column in values)
+            tiles.extend(
+                (row_number, row_labels, band + 1, self.column_bands[band]) for band in sorted(used)
+            )
+        return tiles
+
+
+def draw_page(pdf, layout, title, row_labels, band, page_label):
+    """
+    Draw one tile. Text goes through two text objects (bold headers, regular
+    values) instead of one drawString call, and font switch, per cell.
+    """
+    start, end = band
+    top = layout.page_height - MARGIN
+    left = MARGIN + layout.row_header_width
+    band_width = layout.row_header_width + sum(layout.column_widths[start:end])
+    header_y = top - TITLE_SIZE - 2 * ROW_HEIGHT
+
+    pdf.setFont(BOLD_FONT, TITLE_SIZE)
+    pdf.drawString(MARGIN, top - TITLE_SIZE, title)
+    pdf.setFont(FONT, FONT_SIZE)
+    pdf.drawRightString(layout.page_width - MARGIN, top - TITLE_SIZE, page_label)
+
+    # Header band and row stripes
+    pdf.setFillColor(HexColor(STRIPE_COLOR))
+    for position in range(1, len(row_labels), 2):
+        pdf.rect(MARGIN, header_y - (position + 1) * ROW_HEIGHT - 3, band_width, ROW_HEIGHT, stroke=0, fill=1)
+    pdf.setFillColor(HexColor(HEADER_COLOR))
+    pdf.rect(MARGIN, header_y - 3, band_width, ROW_HEIGHT, stroke=0, fill=1)
+
+    # Column headers (white) and row headers (black), repeated on every page
+    headers = pdf.beginText()
+    headers.setFont(BOLD_FONT, FONT_SIZE)
+    headers.setFillColor(white)
+    headers.setTextOrigin(MARGIN + CELL_PADDING, header_y)
+    headers.textOut('Owner \\ Entity')
+    for index in range(start, end):
+        headers.setTextOrigin(left + layout.column_offsets[index] + CELL_PADDING, header_y)
+        headers.textOut(layout.column_labels[index])
+    headers.setFillColor(black)
+    for position, row_label in enumerate(row_labels, 1):
+        headers.setTextOrigin(MARGIN + CELL_PADDING, header_y - position * ROW_HEIGHT)
+        headers.textOut(layout.row_labels[row_label])
+    pdf.drawText(headers)
+
+    # Matrix values, right aligned; only the non-empty cells of a row are visited
+    cells = pdf.beginText()
+    cells.setFont(FONT, FONT_SIZE)
+    cells.setFillColor(black)
+    for position, row_label in enumerate(row_labels, 1):
+        y = header_y - position * ROW_HEIGHT
+        if row_label is None:
+            cells.setFont(BOLD_FONT, FONT_SIZE)
+            values = layout.totals
+        else:
+            values = layout.values[row_label]
+        for column, value in values.items():
+            index = layout.column_index[column]
+            if start <= index < end:
+                text = format_percentage(value)
+                right = left + layout.column_offsets[index] + layout.column_widths[index] - CELL_PADDING
+                cells.setTextOrigin(right - layout.text_width(text), y)
+                cells.textOut(text)
+    pdf.drawText(cells)
+
+
+def render_matrix(pivot, target, title='Ownership Matrix', page_size=None):
+    """Render a PivotAccumulator as a tiled PDF matrix into ``target`` (path or binary file)"""
+    if not REPORTLAB_AVAILABLE:
+        raise Exception("ReportLab not available for PDF generation")
+
+    layout = MatrixLayout(pivot, page_size or landscape(A4))
+    pdf = canvas.Canvas(target, pagesize=(layout.page_width, layout.page_height))
+    pdf.setTitle(title)
+
+    row_band_count = len(layout.row_bands())
+    tiles = layout.tiles()
+    for page, (row_number, row_labels, column_number, band) in enumerate(tiles, 1):
+        page_label = (
+            f'Rows {row_number}/{row_band_count}'
+            f' · Columns {column_number}/{len(layout.column_bands)}'
+            f' · Page {page} of {len(tiles)}'
+        )
+        draw_page(pdf, layout, title, row_labels, band, page_label)
+        pdf.showPage()
+    pdf.save()
+
+
+def write_ownership_matrix(rows, target, title='Ownership Matrix'):
+    """
+    Render EntityOwnership export rows (see views_ownership_matrix.EXPORT_FIELDS)
+    as an owner × entity PDF matrix
+    """
+    pivot = PivotAccumulator()
+    for row in rows:
+        if row['owner_entity_id'] is not None:
+            owner_key, owner_name = ('entity', row['owner_entity_id']), row['owner_entity__name']
+        else:
+            owner_key, owner_name = ('party', row['owner_ubo_id']), row['owner_ubo__name']
+        pivot.add(
+            owner_key, ('entity', row['owned_entity_id']), row['ownership_percentage'],
+            row_label=owner_name, column_label=row['owned_entity__name'],
+        )
+    render_matrix(pivot, target, title)
@@ -0,0 +1,207 @@
+"""
+Report Cache
+Content-addressed storage for generated organogram reports. The file name is
+a hash of the data version and the rendering request, so an unchanged request
+reuses the file already on disk; the reports directory is bounded by
+least-recently-used eviction (ordered by access time).
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils.text import slugify
+
+from .models import EntityOwnership
+
+
+# Bump whenever the report renderers change, so files from the old renderer are not reused
+RENDER_VERSION = 1
+
+FORMAT_EXTENSIONS = {
+    'pdf': '.pdf',
+    'html': '.html',
+    'excel': '.xlsx',
+    'powerpoint': '.pptx',
+}
+
+
+def reports_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'reports')
+
+
+def ownership_version(ownerships):
+    """
+    Fingerprint of an ownership queryset and every row a report reads through it
+    (owners, owned entities, structures), from a single aggregate query
+    """
+    version = ownerships.aggregate(
+        count=Count('id'),
+        ids=Sum('id'),
+        ownerships=Max('updated_at'),
+        owned_entities=Max('owned_entity__updated_at'),
+        owner_entities=Max('owner_entity__updated_at'),
+        owner_parties=Max('owner_ubo__updated_at'),
+        structures=Max('structure__updated_at'),
+    )
+    return {key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in version.items()}
+
+
+def ownership_rows_version(ownerships):
+    """
+    ownership_version() of already fetched ownerships (owner_entity, owner_ubo,
+    owned_entity and structure loaded), so preloaded batches need no extra query
+    """
+    def latest(stamps):
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        return max(stamps).isoformat() if stamps else None
+
+    return {
+        'count': len(ownerships),
+        'ids': sum(ownership.id for ownership in ownerships) if ownerships else None,
+        'ownerships': latest(ownership.updated_at for ownership in ownerships),
+        'owned_entities': latest(ownership.owned_entity.updated_at for ownership in ownerships),
+        'owner_entities': latest(
+            ownership.owner_entity.updated_at for ownership in ownerships if ownership.owner_entity_id
+        ),
+        'owner_parties': latest(
+            ownership.owner_ubo.updated_at for ownership in ownerships if ownership.owner_ubo_id
+        ),
+        'structures': latest(ownership.structure.updated_at for ownership in ownerships),
+    }
+
+
+def structure_version(structure, ownerships=None):
+    """Data version of a structure report; pass the fetched ownerships to skip the aggregate query"""
+    return {
+        'structure': structure.id,
+        'updated_at': structure.updated_at.isoformat(),
+        'ownerships': (
+            ownership_version(EntityOwnership.objects.filter(structure=structure))
+            if ownerships is None else ownership_rows_version(ownerships)
+        ),
+    }
+
+
+def party_version(party):
+    return {
+        'party': party.id,
+        'updated_at': party.updated_at.isoformat(),
+        'ownerships': ownership_version(EntityOwnership.objects.filter(owner_ubo=party)),
+    }
+
+
+def report_key(version, report_type, format_type, template, options):
+    """Stable hash of everything that determines a report's content"""
+    payload = json.dumps(
+        {
+            'render_version': RENDER_VERSION,
+            'data_version': version,
+            'report_type': report_type,
+            'format': format_type,
+            'template': template,
+            'options': options or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def report_filename(structure=None, party=None, report_type='structure_overview', format_type='pdf',
+                    template='professional', options=None, version=None):
+    """
+    File name (inside the reports directory) of the report for this request and
+    data version; the version is looked up unless the caller already has it
+    """
+    if format_type not in FORMAT_EXTENSIONS:
+        raise ValueError('Unsupported format')
+
+    if structure is not None:
+        prefix, subject = 'organogram', structure
+        version = version or structure_version(structure)
+    elif party is not None:
+        prefix, subject = 'party_organogram', party
+        version = version or party_version(party)
+    else:
+        raise ValueError('Structure or Party ID required')
+
+    key = report_key(version, report_type, format_type, template, options)
+    name = slugify(subject.name)[:50] or str(subject.id)
+    return f"{prefix}_{name}_{key}{FORMAT_EXTENSIONS[format_type]}"
+
+
+def lookup(filename):
+    """
+    Path of a cached report, or None when it is not on disk.
+    A hit refreshes the file's access time, which is what eviction orders by;
+    the mtime is left alone since downloads use it for Last-Modified/ETag.
+    """
+    file_path = os.path.join(reports_dir(), filename)
+    try:
+        os.utime(file_path, (time.time(), os.stat(file_path).st_mtime))
+    except FileNotFoundError:
+        return None
+    return file_path
+
+
+def partial_name(filename):
+    """
+    Base name (without extension, as the report generators expect) to render into
+    before the file is moved into place; readers never see a half-written report
+    """
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}.partial-{uuid.uuid4().hex[:8]}"
+
+
+def store(rendered_path, filename, keep=()):
+    """
+    Move a freshly rendered file to its content-addressed name, then enforce the
+    cache bounds; ``keep`` lists other paths still in use (e.g. a batch's members)
+    """
+    file_path = os.path.join(reports_dir(), filename)
+    os.replace(rendered_path, file_path)
+    evict(keep={file_path, *keep})
+    return file_path
+
+
+def evict(max_bytes=None, max_files=None, keep=None):
+    """
+    Delete the least recently used reports until the directory holds at most
+    ``max_bytes`` / ``max_files`` (REPORT_CACHE_MAX_BYTES / REPORT_CACHE_MAX_FILES
+    by default). Paths in ``keep`` are never deleted. Returns the number of files removed.
+    """
+    max_bytes = settings.REPORT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_files = settings.REPORT_CACHE_MAX_FILES if max_files is None else max_files
+    keep = set(keep or ())
+
+    entries = []
+    try:
+        with os.scandir(reports_dir()) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+
+    total_bytes = sum(size for _, size, _ in entries)
+    total_files = len(entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes and total_files <= max_files:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        total_files -= 1
+        removed += 1
+    return removed
@@ -0,0 +1,151 @@
+"""
+Report Files
+Serving generated reports from MEDIA_ROOT/reports: streamed FileResponse,
+single byte-range requests, ETag/Last-Modified validation and optional
+X-Sendfile / X-Accel-Redirect offload to the front-end web server
+"""
+
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from . import report_cache
+
+
+REPORT_CONTENT_TYPES = {
+    '.pdf': 'application/pdf',
+    '.html': 'text/html',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.zip': 'application/zip',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_safe_filename(filename):
+    """Report names are plain file names inside the reports directory"""
+    return (
+        bool(filename)
+        and filename == os.path.basename(filename)
+        and not filename.startswith('.')
+        and '\x00' not in filename
+    )
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, both inclusive; None when the header
+    should be ignored (absent, malformed or multi-range) and 'unsatisfiable'
+    when it lies outside the file
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, end
+
+
+def if_range_matches(request, etag, mtime):
+    """A Range header only applies when If-Range (if any) still names this version of the file"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    last_modified = parse_http_date_safe(if_range)
+    return last_modified is not None and int(mtime) <= last_modified
+
+
+def iter_range(file_path, start, length):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(file_path):
+    """
+    Empty response telling the web server to send the file itself.
+    X-Accel-Redirect (nginx) takes an internal URI, X-Sendfile (Apache, lighttpd) a path.
+    """
+    header = settings.REPORT_SENDFILE_HEADER
+    response = HttpResponse()
+    if header.lower() == 'x-accel-redirect':
+        response[header] = settings.REPORT_SENDFILE_URL + os.path.basename(file_path)
+    else:
+        response[header] = file_path
+    return response
+
+
+def serve_report(request, filename):
+    """Response serving a generated report from MEDIA_ROOT/reports"""
+    if not is_safe_filename(filename):
+        return JsonResponse({'error': 'Invalid file name'}, status=400)
+
+    file_path = report_cache.lookup(filename)
+    if file_path is None:
+        return JsonResponse({'error': 'File not found'}, status=404)
+
+    stat = os.stat(file_path)
+    etag = file_etag(stat)
+    last_modified = http_date(stat.st_mtime)
+    content_type = REPORT_CONTENT_TYPES.get(os.path.splitext(filename)[1], 'application/octet-stream')
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        conditional['ETag'] = etag
+        conditional['Last-Modified'] = last_modified
+        return conditional
+
+    byte_range = None
+    if settings.REPORT_SENDFILE_HEADER:
+        response = sendfile_response(file_path)
+    else:
+        if if_range_matches(request, etag, stat.st_mtime):
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(iter_range(file_path, start, end - start + 1), status=206)
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        else:
+            # FileResponse streams in blocks and lets the WSGI server use wsgi.file_wrapper (sendfile)
+            response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+
+    response['Content-Type'] = content_type
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    return response
@@ -0,0 +1,214 @@
+"""
+Report Jobs
+DB-backed queue for organogram report generation, drained by
+`manage.py process_report_jobs` so web workers never render reports
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import report_cache
+from .models import ReportJob
+
+
+def enqueue(structure=None, party=None, report_type='structure_overview', format_type='pdf',
+            template='professional', options=None, user=None):
+    """
+    Queue a report; returns the ReportJob.
+    When the report cache already holds this exact report the job is created
+    DONE and no worker is involved.
+    """
+    job = ReportJob(
+        structure=structure,
+        party=party,
+        report_type=report_type,
+        format=format_type,
+        template=template,
+        options=options or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+        message='Waiting for a report worker',
+    )
+
+    filename = expected_filename(job)
+    if report_cache.lookup(filename):
+        now = timezone.now()
+        job.status = 'DONE'
+        job.progress = 100
+        job.message = 'Report ready (cached)'
+        job.file_name = filename
+        job.started_at = job.finished_at = now
+
+    job.save()
+    return job
+
+
+def expected_filename(job):
+    """Report cache name the job will produce with the current data"""
+    if job.report_type == 'batch':
+        from .batch_reports import expected_filename as batch_filename
+        return batch_filename(
+            job.options.get('structure_ids', []),
+            template=job.template,
+            options=job.options.get('report_options'),
+            output=job.options.get('output', 'zip'),
+        )
+    return report_cache.report_filename(
+        structure=job.structure, party=job.party, report_type=job.report_type,
+        format_type=job.format, template=job.template, options=job.options,
+    )
+
+
+def claim_next():
+    """
+    Atomically move the oldest PENDING job to RUNNING and return its id.
+    The conditional UPDATE makes concurrent workers skip each other's jobs
+    on every database backend.
+    """
+    candidates = ReportJob.objects.filter(status='PENDING').order_by('created_at', 'id')
+    for job_id in candidates.values_list('id', flat=True)[:20]:
+        claimed = ReportJob.objects.filter(pk=job_id, status='PENDING').update(
+            status='RUNNING',
+            progress=0,
+            message='Starting',
+            started_at=timezone.now(),
+        )
+        if claimed:
+            return job_id
+    return None
+
+
+def requeue_stale(timeout=None):
+    """Put RUNNING jobs whose worker died (older than the timeout) back in the queue"""
+    timeout = timeout if timeout is not None else settings.REPORT_JOB_TIMEOUT
+    return ReportJob.objects.filter(
+        status='RUNNING',
+        started_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status='PENDING', progress=0, message='Requeued after worker timeout')
+
+
+def set_progress(job_id, progress, message=''):
+    ReportJob.objects.filter(pk=job_id).update(progress=progress, message=message[:200])
+
+
+def run_job(job_id):
+    """Render one claimed job; never raises, failures are stored on the job"""
+    from .views_organogram_printing import build_report
+
+    job = ReportJob.objects.get(pk=job_id)
+    try:
+        file_path = build_report(
+            structure_id=job.structure_id,
+            party_id=job.party_id,
+            report_type=job.report_type,
+            format_type=job.format,
+            template=job.template,
+            options=job.options,
+            progress=lambda progress, message='': set_progress(job_id, progress, message),
+        )
+    except Exception as e:
+        ReportJob.objects.filter(pk=job_id).update(
+            status='FAILED',
+            error=str(e),
+            message='Report generation failed',
+            finished_at=timezone.now(),
+        )
+        return 'FAILED'
+
+    ReportJob.objects.filter(pk=job_id).update(
+        status='DONE',
+        progress=100,
+        message='Report ready',
+        file_name=os.path.basename(file_path),
+        finished_at=timezone.now(),
+    )
+    return 'DONE'
+
+
+def init_worker():
+    """Pool initializer: make Django usable and drop connections inherited from the parent"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def drain(workers=1, limit=None):
+    """
+    Process queued jobs until the queue is empty (or ``limit`` jobs ran).
+    With more than one worker the jobs are rendered in a process pool;
+    claiming always happens in this process. Returns the number of jobs run.
+    """
+    processed = 0
+
+    if workers <= 1:
+        while limit is None or processed < limit:
+            job_id = claim_next()
+            if job_id is None:
+                break
+            run_job(job_id)
+            processed += 1
+        return processed
+
+    # Only start a pool when there is work: the command polls an idle queue every few seconds
+    if limit is not None and limit < 1:
+        return 0
+    first_job = claim_next()
+    if first_job is None:
+        return 0
+
+    # Children must not share the parent's database connections. The pool forks
+    # every worker on its first submit, so start them with a no-op task while
+    # this process holds no connection; claim_next() reconnects afterwards.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        pool.submit(os.getpid).result()
+        running = {pool.submit(run_job, first_job): first_job}
+        while True:
+            while len(running) < workers and (limit is None or processed + len(running) < limit):
+                job_id = claim_next()
+                if job_id is None:
+                    break
+                running[pool.submit(run_job, job_id)] = job_id
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                processed += 1
+                if future.exception() is not None:
+                    ReportJob.objects.filter(pk=job_id).update(
+                        status='FAILED',
+                        error=str(future.exception()),
+                        message='Report worker crashed',
+                        finished_at=timezone.now(),
+                    )
+    return processed
+
+
+def job_payload(job):
+    """JSON description of a job for the status endpoint"""
+    from django.urls import reverse
+
+    data = {
+        'job_id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'format': job.format,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': reverse('corporate:report_job_status', args=[job.id]),
+    }
+    if job.status == 'DONE':
+        data['download_url'] = reverse('corporate:download_report_job', args=[job.id])
+        data['filename'] = job.file_name
+    if job.status == 'FAILED':
+        data['error'] = job.error
+    return data
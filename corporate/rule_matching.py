@@ -0,0 +1,107 @@
+"""
+Rule Matching Engine
+Loads every ValidationRule touching a set of entities in a single query and
+indexes it by unordered entity pair, so structure validations do not need a
+query per entity pair
+"""
+
+from collections import defaultdict
+
+from django.db.models import Q
+
+
+NO_TAX_IMPACTS = "No tax impacts identified"
+
+
+def pair_key(entity_a_id, entity_b_id):
+    """Return the unordered key for a pair of entity ids"""
+    if entity_a_id <= entity_b_id:
+        return (entity_a_id, entity_b_id)
+    return (entity_b_id, entity_a_id)
+
+
+def format_tax_impacts(impacts):
+    """Format a collection of tax impact texts for Structure.tax_impacts"""
+    impacts = sorted({impact for impact in impacts if impact})
+    return "; ".join(impacts) if impacts else NO_TAX_IMPACTS
+
+
+class RuleMatchResult:
+    """
+    Outcome of matching validation rules against a set of entities
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    @property
+    def tax_impacts(self):
+        return [rule.tax_impacts for rule in self.rules if rule.tax_impacts]
+
+    @property
+    def severities(self):
+        return sorted({rule.severity for rule in self.rules if rule.severity})
+
+    @property
+    def prohibited(self):
+        return [
+            rule for rule in self.rules
+            if rule.relationship_type == 'PROHIBITED'
+        ]
+
+    @property
+    def combined_tax_impacts(self):
+        return format_tax_impacts(self.tax_impacts)
+
+
+class RuleMatcher:
+    """
+    In-memory index of ValidationRules keyed by unordered entity pair
+    """
+
+    def __init__(self, rules):
+        self.by_pair = defaultdict(list)
+        for rule in rules:
+            # A rule only applies to two distinct entities of a structure
+            if rule.parent_entity_id == rule.related_entity_id:
+                continue
+            key = pair_key(rule.parent_entity_id, rule.related_entity_id)
+            self.by_pair[key].append(rule)
+
+    @classmethod
+    def for_entities(cls, entity_ids, touching=None):
+        """
+        Load every rule whose both ends are in entity_ids.
+        When touching is given, only rules with at least one end in it are loaded.
+        """
+        from .models import ValidationRule
+
+        entity_ids = set(entity_ids)
+        if len(entity_ids) < 2 or touching is not None and not touching:
+            return cls([])
+
+        rules = ValidationRule.objects.filter(
+            parent_entity_id__in=entity_ids,
+            related_entity_id__in=entity_ids,
+        )
+        if touching is not None:
+            touching = set(touching)
+            rules = rules.filter(
+                Q(parent_entity_id__in=touching) |
+                Q(related_entity_id__in=touching)
+            )
+        return cls(rules.order_by('id'))
+
+    def rules_for_pair(self, entity_a_id, entity_b_id):
+        """Return rules defined between two entities, in either direction"""
+        return list(self.by_pair.get(pair_key(entity_a_id, entity_b_id), []))
+
+    def match(self, entity_ids):
+        """Match the indexed rules against a set of entity ids in one pass"""
+        entity_ids = set(entity_ids)
+        matched = []
+        for (entity_a_id, entity_b_id), rules in self.by_pair.items():
+            if entity_a_id in entity_ids and entity_b_id in entity_ids:
+                matched.extend(rules)
+        matched.sort(key=lambda rule: rule.id)
+        return RuleMatchResult(matched)
@@ -0,0 +1,51 @@
+"""
+Corporate signals
+Keep structure-level caches in step with ownership changes
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import exposure_index, structure_metrics, structure_snapshots
+from .models import EntityOwnership, NodeOwnership, Structure, StructureMetrics, StructureNode
+
+
+def invalidate_structure_caches(structure_id):
+    """
+    Drop every cached result derived from a structure's ownerships.
+    Call this after bulk operations that bypass model signals
+    (bulk_create, bulk_update, QuerySet.update / delete).
+    """
+    if structure_id is None:
+        return
+    exposure_index.schedule_refresh(structure_id)
+    structure_metrics.schedule_refresh(structure_id)
+    structure_snapshots.schedule_record(structure_id)
+
+
+@receiver(post_save, sender=EntityOwnership)
+@receiver(post_delete, sender=EntityOwnership)
+def entity_ownership_changed(sender, instance, **kwargs):
+    invalidate_structure_caches(instance.structure_id)
+
+
+@receiver(post_save, sender=NodeOwnership)
+@receiver(post_delete, sender=NodeOwnership)
+def node_ownership_changed(sender, instance, **kwargs):
+    structure_id = StructureNode.objects.filter(
+        pk=instance.owned_node_id
+    ).values_list('structure_id', flat=True).first()
+    invalidate_structure_caches(structure_id)
+
+
+@receiver(post_save, sender=StructureNode)
+@receiver(post_delete, sender=StructureNode)
+def structure_node_changed(sender, instance, **kwargs):
+    invalidate_structure_caches(instance.structure_id)
+
+
+@receiver(post_save, sender=Structure)
+def structure_created(sender, instance, created, **kwargs):
+    # Empty structures get their metrics row up front so filters see them too
+    if created:
+        StructureMetrics.objects.get_or_create(structure=instance)
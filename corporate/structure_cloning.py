@@ -0,0 +1,163 @@
+"""
+Structure Cloning
+Copies any number of structures with their EntityOwnerships, StructureNodes
+(parent links remapped) and NodeOwnerships using bulk inserts in dependency
+order. Derived fields are computed once at the end: validation rules are
+matched for every clone from a single rule query, and the structure caches
+are refreshed after commit.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import EntityOwnership, NodeOwnership, Structure, StructureNode, ValidationRule
+from .rule_matching import RuleMatcher
+from .signals import invalidate_structure_caches
+
+
+# Never copied: identity, ownership of the row and auto-maintained fields
+SKIPPED_FIELDS = {'id', 'structure', 'created_at', 'updated_at'}
+
+
+def copy_instance(instance, **overrides):
+    """Unsaved copy of a model instance with every concrete field except SKIPPED_FIELDS"""
+    model = type(instance)
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields
+        if field.name not in SKIPPED_FIELDS
+    }
+    values.update(overrides)
+    return model(**values)
+
+
+def clone_structures(structures, name_format='{name} (Copy)', description_format='Copy of {description}',
+                     hash_suffix=''):
+    """
+    Clone structures (a queryset or list) in one transaction; returns the new
+    structures in the same order. The number of queries does not depend on
+    how many structures or rows are copied, except for one node insert per
+    hierarchy level.
+    """
+    sources = list(structures)
+    if not sources:
+        return []
+
+    with transaction.atomic():
+        # Structure.save() would match rules for every clone; they are matched once below
+        clones = Structure.objects.bulk_create([
+            Structure(
+                name=name_format.format(name=source.name),
+                description=description_format.format(name=source.name, description=source.description),
+                status='DRAFTING',
+            )
+            for source in sources
+        ])
+        clone_of = {source.pk: clone for source, clone in zip(sources, clones)}
+
+        ownerships = EntityOwnership.objects.bulk_create([
+            copy_instance(
+                ownership,
+                structure_id=clone_of[ownership.structure_id].pk,
+                hash_number=f"{ownership.hash_number}{hash_suffix}" if ownership.hash_number else ownership.hash_number,
+            )
+            for ownership in EntityOwnership.objects.filter(structure__in=clone_of).order_by('id')
+        ])
+
+        node_map = clone_nodes(clone_of)
+        NodeOwnership.objects.bulk_create([
+            copy_instance(
+                ownership,
+                owned_node_id=node_map[ownership.owned_node_id].pk,
+                owner_node_id=(
+                    node_map[ownership.owner_node_id].pk if ownership.owner_node_id in node_map
+                    else ownership.owner_node_id
+                ),
+            )
+            for ownership in NodeOwnership.objects.filter(owned_node__structure__in=clone_of).order_by('id')
+        ])
+
+        apply_validation_rules(clones, ownerships)
+
+        # Bulk writes skip the model signals that keep structure caches fresh
+        for clone in clones:
+            invalidate_structure_caches(clone.pk)
+
+    return clones
+
+
+def clone_nodes(clone_of):
+    """
+    Copy every StructureNode of the source structures, one bulk insert per
+    hierarchy level so every parent has its new primary key before its
+    children are inserted. Returns {source node id: new node}.
+    A parent outside the node's own structure is not followed, and a parent
+    cycle is broken at one of its nodes: those copies become roots.
+    """
+    sources = list(StructureNode.objects.filter(structure__in=clone_of).order_by('level', 'id'))
+    by_id = {node.pk: node for node in sources}
+    children = defaultdict(list)
+    for node in sources:
+        parent = by_id.get(node.parent_node_id)
+        if parent is None or parent.structure_id != node.structure_id:
+            node.parent_node_id = None
+        children[node.parent_node_id].append(node)
+
+    node_map = {}
+    wave = children[None]
+    while wave:
+        copies = []
+        for node in wave:
+            parent = node_map.get(node.parent_node_id)
+            copies.append(copy_instance(
+                node,
+                structure_id=clone_of[node.structure_id].pk,
+                parent_node_id=parent.pk if parent else None,
+                path='',
+            ))
+        for node, copy in zip(wave, StructureNode.objects.bulk_create(copies)):
+            parent = node_map.get(node.parent_node_id)
+            copy.path = StructureNode.child_path(parent.path if parent else '', copy.pk)
+            copy.level = StructureNode.path_depth(copy.path)
+            node_map[node.pk] = copy
+        wave = [child for node in wave for child in children[node.pk]]
+        if not wave and len(node_map) < len(sources):
+            # Only nodes on or below parent cycles are left
+            uncopied = next(node for node in sources if node.pk not in node_map)
+            wave = [break_parent_cycle(uncopied, by_id, children)]
+
+    if node_map:
+        # Paths embed the new primary keys, so they are written after the inserts
+        StructureNode.objects.bulk_update(node_map.values(), ['path', 'level'])
+    return node_map
+
+
+def break_parent_cycle(node, by_id, children):
+    """Walk up from ``node`` to the parent cycle above it and detach the node where the walk closes"""
+    seen = set()
+    while node.pk not in seen:
+        seen.add(node.pk)
+        node = by_id[node.parent_node_id]
+    children[node.parent_node_id].remove(node)
+    node.parent_node_id = None
+    return node
+
+
+def apply_validation_rules(clones, ownerships):
+    """Fill tax_impacts / severity_levels of every clone from one rule query"""
+    rows = defaultdict(dict)
+    entity_ids = defaultdict(set)
+    for ownership in ownerships:
+        rows[ownership.structure_id][str(ownership.pk)] = [ownership.owner_entity_id, ownership.owned_entity_id]
+        entity_ids[ownership.structure_id].update(
+            Structure._entity_ids_from_rows([[ownership.owner_entity_id, ownership.owned_entity_id]])
+        )
+
+    rules_version = ValidationRule.table_version()
+    matcher = RuleMatcher.for_entities(set().union(*entity_ids.values()))
+    for clone in clones:
+        matched = matcher.match(entity_ids[clone.pk]).rules
+        clone.apply_validation_rules(rows[clone.pk], rules_version, matched)
+
+    Structure.objects.bulk_update(clones, ['tax_impacts', 'severity_levels', 'validation_state'])
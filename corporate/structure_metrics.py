@@ -0,0 +1,119 @@
+"""
+Structure Metrics
+Maintains the denormalized StructureMetrics row of each structure (entity and
+party counts, ownership completion, hierarchy depth, USD/EUR totals and
+validation status) and annotates structure querysets with it, so listings
+sort and filter on stored columns instead of recomputing per row
+"""
+
+import threading
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import EntityOwnership, NodeOwnership, Structure, StructureMetrics
+from .ownership_graph import ENTITY, PARTY, OwnershipGraph
+
+
+COMPLETE_TOTAL = Decimal(100)
+TWO_PLACES = Decimal('0.01')
+
+_pending = threading.local()
+
+
+def _pending_ids():
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    return _pending.ids
+
+
+def compute(structure_id):
+    """Metric values of one structure: ownership graph, value totals and node ownerships, three queries"""
+    entity_ownerships = EntityOwnership.objects.filter(structure_id=structure_id)
+    graph = OwnershipGraph.from_entity_ownerships(entity_ownerships)
+    totals = graph.totals()
+    owned = [idx for idx in graph.nodes_of_kind(ENTITY) if graph.in_edges[idx]]
+    complete = sum(1 for idx in owned if totals[idx] == COMPLETE_TOTAL)
+    over_allocated = sum(1 for idx in owned if totals[idx] > COMPLETE_TOTAL)
+    completion = Decimal(complete * 100) / len(owned) if owned else Decimal(0)
+
+    values = entity_ownerships.aggregate(usd=Sum('total_value_usd'), eur=Sum('total_value_eur'))
+    party_ids = set(graph.ids_of(graph.nodes_of_kind(PARTY)))
+    node_value_usd = Decimal(0)
+    for party_id, owned_shares, share_value_usd in NodeOwnership.objects.filter(
+        owned_node__structure_id=structure_id
+    ).values_list('owner_party_id', 'owned_shares', 'share_value_usd'):
+        if party_id:
+            party_ids.add(party_id)
+        node_value_usd += owned_shares * (share_value_usd or 0)
+
+    if not owned or over_allocated:
+        validation_status = 'invalid'
+    elif complete < len(owned):
+        validation_status = 'warning'
+    else:
+        validation_status = 'valid'
+
+    return {
+        'entities_count': len(owned),
+        'complete_entities_count': complete,
+        'over_allocated_count': over_allocated,
+        'completion_percentage': completion.quantize(TWO_PLACES),
+        'max_depth': graph.max_depth(),
+        'party_count': len(party_ids),
+        'total_value_usd': ((values['usd'] or 0) + node_value_usd).quantize(TWO_PLACES),
+        'total_value_eur': Decimal(values['eur'] or 0).quantize(TWO_PLACES),
+        'validation_status': validation_status,
+    }
+
+
+def refresh_structure(structure_id):
+    """Recompute and store the metrics of one structure"""
+    if not Structure.objects.filter(pk=structure_id).exists():
+        return None
+    metrics, _created = StructureMetrics.objects.update_or_create(
+        structure_id=structure_id, defaults=compute(structure_id)
+    )
+    return metrics
+
+
+def schedule_refresh(structure_id):
+    """
+    Refresh a structure's metrics once the current transaction commits.
+    Any number of ownership changes inside one transaction lead to a single refresh.
+    """
+    _pending_ids().add(structure_id)
+    transaction.on_commit(partial(_run_pending, structure_id))
+
+
+def _run_pending(structure_id):
+    pending = _pending_ids()
+    if structure_id in pending:
+        pending.discard(structure_id)
+        refresh_structure(structure_id)
+
+
+def rebuild(structure_ids=None):
+    """Recompute the metrics of the given structures (all structures by default)"""
+    if structure_ids is None:
+        structure_ids = list(Structure.objects.values_list('id', flat=True))
+    return sum(1 for structure_id in structure_ids if refresh_structure(structure_id) is not None)
+
+
+def with_metrics(queryset):
+    """
+    Annotate a Structure queryset with the cached metrics columns, joined in
+    the same query (zero/invalid until the structure's first refresh)
+    """
+    return queryset.annotate(
+        entities_total=Coalesce(F('metrics__entities_count'), Value(0)),
+        completion=Coalesce(F('metrics__completion_percentage'), Value(Decimal(0))),
+        depth=Coalesce(F('metrics__max_depth'), Value(0)),
+        parties_total=Coalesce(F('metrics__party_count'), Value(0)),
+        value_usd=Coalesce(F('metrics__total_value_usd'), Value(Decimal(0))),
+        value_eur=Coalesce(F('metrics__total_value_eur'), Value(Decimal(0))),
+        validation=Coalesce(F('metrics__validation_status'), Value('invalid')),
+    )
@@ -0,0 +1,338 @@
+"""
+Structure Snapshots
+Append-only version history of each structure's ownership graph.
+
+A structure's state is a flat edge map {"<owner>><owned>": "<percentage>"}
+with typed endpoints ("p12" party, "e5" entity, "n7" structure node). Each
+StructureSnapshot row stores either the whole map (a checkpoint, every
+CHECKPOINT_INTERVAL versions) or only the edges that changed since the
+previous version, so unchanged edges are shared between versions instead of
+copied. Any version is rebuilt from its nearest checkpoint plus the deltas
+after it: two queries, independent of how long the history is.
+"""
+
+import hashlib
+import json
+import threading
+import zlib
+from bisect import bisect_right
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import EntityOwnership, NodeOwnership, Structure, StructureSnapshot, StructureSnapshotParty
+
+
+PARTY, ENTITY, NODE = 'p', 'e', 'n'
+EDGE_SEPARATOR = '>'
+COMPRESSION_LEVEL = 6
+RECORD_ATTEMPTS = 3
+
+_pending = threading.local()
+
+
+def _pending_ids():
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    return _pending.ids
+
+
+# State
+
+def edge_key(owner, owned):
+    return f'{owner}{EDGE_SEPARATOR}{owned}'
+
+
+def split_edge(key):
+    """'p12>e5' -> (('p', 12), ('e', 5))"""
+    owner, owned = key.split(EDGE_SEPARATOR)
+    return (owner[0], int(owner[1:])), (owned[0], int(owned[1:]))
+
+
+def _add_edge(state, key, percentage):
+    if percentage is None:
+        state.setdefault(key, None)
+        return
+    current = state.get(key)
+    total = Decimal(percentage) + (Decimal(current) if current is not None else 0)
+    state[key] = str(total)
+
+
+def capture_state(structure_id):
+    """Current edge map of a structure (two queries); rows without an owner are not edges"""
+    state = {}
+    entity_edges = EntityOwnership.objects.filter(structure_id=structure_id).values_list(
+        'owner_ubo_id', 'owner_entity_id', 'owned_entity_id', 'ownership_percentage'
+    )
+    for party_id, owner_entity_id, owned_entity_id, percentage in entity_edges:
+        if party_id is None and owner_entity_id is None:
+            continue
+        owner = f'{PARTY}{party_id}' if party_id is not None else f'{ENTITY}{owner_entity_id}'
+        _add_edge(state, edge_key(owner, f'{ENTITY}{owned_entity_id}'), percentage)
+
+    node_edges = NodeOwnership.objects.filter(owned_node__structure_id=structure_id).values_list(
+        'owner_party_id', 'owner_node_id', 'owned_node_id', 'ownership_percentage'
+    )
+    for party_id, owner_node_id, owned_node_id, percentage in node_edges:
+        if party_id is None and owner_node_id is None:
+            continue
+        owner = f'{PARTY}{party_id}' if party_id is not None else f'{NODE}{owner_node_id}'
+        _add_edge(state, edge_key(owner, f'{NODE}{owned_node_id}'), percentage)
+    return state
+
+
+def _canonical(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def state_digest(state):
+    return hashlib.sha256(_canonical(state).encode()).hexdigest()
+
+
+def encode(data):
+    return zlib.compress(_canonical(data).encode(), COMPRESSION_LEVEL)
+
+
+def decode(payload):
+    return json.loads(zlib.decompress(bytes(payload)))
+
+
+# Diffs
+
+def diff(old, new):
+    """Delta turning edge map ``old`` into ``new``"""
+    return {
+        'added': {key: value for key, value in new.items() if key not in old},
+        'removed': sorted(key for key in old if key not in new),
+        'changed': {
+            key: [old[key], value]
+            for key, value in new.items()
+            if key in old and old[key] != value
+        },
+    }
+
+
+def apply_delta(state, delta):
+    """Apply a stored delta to ``state`` in place"""
+    for key in delta['removed']:
+        state.pop(key, None)
+    state.update(delta['added'])
+    for key, (_old, new) in delta['changed'].items():
+        state[key] = new
+    return state
+
+
+# Recording
+
+def record(structure_id, reason=''):
+    """
+    Append a version if the structure's ownership graph changed since the last
+    one. Returns the new StructureSnapshot, or None when nothing changed.
+    """
+    state = capture_state(structure_id)
+    digest = state_digest(state)
+
+    for attempt in range(RECORD_ATTEMPTS):
+        latest = StructureSnapshot.objects.filter(structure_id=structure_id).order_by('-version').only(
+            'version', 'digest'
+        ).first()
+        if latest is not None and latest.digest == digest:
+            return None
+
+        version = latest.version + 1 if latest else 1
+        is_checkpoint = latest is None or version % StructureSnapshot.CHECKPOINT_INTERVAL == 1
+        if is_checkpoint:
+            payload = encode(state)
+        else:
+            payload = encode(diff(state_at(structure_id, version=latest.version), state))
+
+        try:
+            with transaction.atomic():
+                snapshot = StructureSnapshot.objects.create(
+                    structure_id=structure_id,
+                    version=version,
+                    is_checkpoint=is_checkpoint,
+                    payload=payload,
+                    digest=digest,
+                    edge_count=len(state),
+                    reason=reason[:200],
+                )
+                StructureSnapshotParty.objects.bulk_create([
+                    StructureSnapshotParty(structure_id=structure_id, party_id=party_id, first_version=version)
+                    for party_id in party_ids(state)
+                ], ignore_conflicts=True)
+                return snapshot
+        except IntegrityError:
+            # Another process recorded this version number first
+            if attempt == RECORD_ATTEMPTS - 1:
+                raise
+    return None
+
+
+def schedule_record(structure_id, reason='ownership change'):
+    """
+    Record a structure version once the current transaction commits.
+    Any number of ownership changes inside one transaction produce one version.
+    """
+    _pending_ids().add(structure_id)
+    transaction.on_commit(partial(_run_pending, structure_id, reason))
+
+
+def _run_pending(structure_id, reason):
+    pending = _pending_ids()
+    if structure_id in pending:
+        pending.discard(structure_id)
+        # The change may have been the structure's own deletion
+        if Structure.objects.filter(pk=structure_id).exists():
+            record(structure_id, reason)
+
+
+# Reading
+
+def _snapshot_chain(structure_id, version=None, when=None):
+    """
+    Nearest checkpoint at or before the target, then every delta up to the
+    target, as (version, created_at, payload) tuples; two queries
+    """
+    snapshots = StructureSnapshot.objects.filter(structure_id=structure_id)
+    if version is not None:
+        snapshots = snapshots.filter(version__lte=version)
+    if when is not None:
+        snapshots = snapshots.filter(created_at__lte=when)
+
+    checkpoint = snapshots.filter(is_checkpoint=True).order_by('-version').values_list('version', flat=True).first()
+    if checkpoint is None:
+        return []
+    return list(
+        snapshots.filter(version__gte=checkpoint).order_by('version').values_list(
+            'version', 'created_at', 'payload'
+        )
+    )
+
+
+def _replay(chain):
+    state = {}
+    for index, (_version, _created_at, payload) in enumerate(chain):
+        data = decode(payload)
+        if index == 0:
+            state = data
+        else:
+            apply_delta(state, data)
+    return state
+
+
+def state_at(structure_id, when=None, version=None):
+    """
+    Edge map of a structure at a version or point in time; None when the
+    structure had no recorded version yet
+    """
+    chain = _snapshot_chain(structure_id, version=version, when=when)
+    if not chain:
+        return None
+    return _replay(chain)
+
+
+def states_at(structure_id, points):
+    """
+    Edge maps at each of the ascending datetimes ``points`` (None before the
+    first version), replaying the history once from the checkpoint that
+    precedes the earliest point
+    """
+    if not points:
+        return []
+    first = _snapshot_chain(structure_id, when=points[0])
+    start_version = first[0][0] if first else 0
+    rows = list(
+        StructureSnapshot.objects.filter(
+            structure_id=structure_id, version__gte=start_version, created_at__lte=points[-1]
+        ).order_by('version').values_list('is_checkpoint', 'created_at', 'payload')
+    )
+
+    times = [created_at for _checkpoint, created_at, _payload in rows]
+    results = []
+    state = None
+    applied = 0
+    for point in points:
+        target = bisect_right(times, point)
+        while applied < target:
+            is_checkpoint, _created_at, payload = rows[applied]
+            data = decode(payload)
+            if is_checkpoint or state is None:
+                state = data
+            else:
+                apply_delta(state, data)
+            applied += 1
+        results.append(dict(state) if state is not None else None)
+    return results
+
+
+def diff_versions(structure_id, from_version, to_version):
+    """Delta between two recorded versions of a structure"""
+    return diff(
+        state_at(structure_id, version=from_version) or {},
+        state_at(structure_id, version=to_version) or {},
+    )
+
+
+def latest_version(structure_id):
+    return StructureSnapshot.objects.filter(structure_id=structure_id).order_by('-version').values_list(
+        'version', flat=True
+    ).first()
+
+
+# Derived series
+
+def party_ids(state):
+    """Parties owning part of the structure in an edge map"""
+    return {
+        owner_id for (kind, owner_id), _owned in map(split_edge, state) if kind == PARTY
+    }
+
+
+def party_structure_ids(party_id):
+    """Structures the party owned part of in any recorded version (one indexed query)"""
+    return list(
+        StructureSnapshotParty.objects.filter(party_id=party_id).values_list('structure_id', flat=True)
+    )
+
+
+def party_holdings(state, party_id):
+    """Sum of the party's direct percentages in an edge map"""
+    prefix = f'{PARTY}{party_id}{EDGE_SEPARATOR}{ENTITY}'
+    return sum(
+        (Decimal(value) for key, value in state.items() if key.startswith(prefix) and value is not None),
+        Decimal('0')
+    )
+
+
+def party_timeline(party_id, points, structure_ids=None):
+    """
+    Total direct ownership of a party across ``structure_ids`` at each point;
+    None where none of the structures had a recorded version yet. By default
+    every structure the party appears in the history of, including those it
+    has since sold out of.
+    """
+    if structure_ids is None:
+        structure_ids = party_structure_ids(party_id)
+    totals = [None] * len(points)
+    for structure_id in structure_ids:
+        for index, state in enumerate(states_at(structure_id, points)):
+            if state is None:
+                continue
+            totals[index] = (totals[index] or Decimal('0')) + party_holdings(state, party_id)
+    return totals
+
+
+def month_ends(count, now=None):
+    """The last ``count`` month boundaries, oldest first, ending with ``now``"""
+    now = now or timezone.now()
+    points = [now]
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while len(points) < count:
+        points.append(month_start)
+        previous = month_start - timedelta(days=1)
+        month_start = previous.replace(day=1)
+    return list(reversed(points))
@@ -0,0 +1,80 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.test import TestCase
+
+from sirius_project.deferred_validation import BatchValidationError, deferred_validation
+from corporate.models import Entity, EntityOwnership, NodeOwnership, Structure, StructureNode
+from parties.models import BeneficiaryRelation, Party
+
+
+class DeferredValidationTest(TestCase):
+    def setUp(self):
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.entity = Entity.objects.create(name='Holding', total_shares=100)
+
+    def ownership(self, shares):
+        return EntityOwnership(
+            structure_id=self.structure.id, owner_ubo_id=self.party.id, owned_entity_id=self.entity.id,
+            owned_shares=shares, corporate_name='Holding'
+        )
+
+    def test_import_checks_totals_with_grouped_queries(self):
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=Entity.objects.create(name='Other'),
+            owned_entity=self.entity, owned_shares=40, corporate_name='Holding'
+        )
+        rows = [self.ownership(10) for _ in range(8)]
+
+        with self.assertNumQueries(2):
+            with deferred_validation(raise_errors=False) as batch:
+                for row in rows:
+                    row.clean()
+
+        # 40 existing + 6 × 10 fills the entity; the last two rows would exceed it
+        self.assertEqual([error.index for error in batch.errors], [6, 7])
+        self.assertIn('Total owned shares (110) cannot exceed', batch.errors[0].message)
+        self.assertIs(batch.errors[0].instance, rows[6])
+
+    def test_row_cleaned_twice_is_checked_once(self):
+        rows = [self.ownership(60), self.ownership(40)]
+
+        with deferred_validation(raise_errors=False) as batch:
+            for row in rows:
+                row.clean()
+            rows[0].clean()  # e.g. the form and then the model validating the same row
+
+        self.assertEqual(batch.errors, [])
+
+    def test_errors_raised_on_exit_roll_back_the_import(self):
+        giver = Party.objects.create(name='Giver', person_type='NATURAL_PERSON')
+        beneficiaries = [
+            Party.objects.create(name=f'Heir {number}', person_type='NATURAL_PERSON') for number in range(3)
+        ]
+
+        with self.assertRaises(BatchValidationError) as raised:
+            with transaction.atomic(), deferred_validation():
+                for beneficiary in beneficiaries:
+                    relation = BeneficiaryRelation(giver_party=giver, beneficiary=beneficiary, percentage=40)
+                    relation.clean()
+                    relation.save()
+
+        self.assertEqual([error.index for error in raised.exception.row_errors], [2])
+        self.assertIsInstance(raised.exception, ValidationError)
+        self.assertFalse(BeneficiaryRelation.objects.exists())
+
+    def test_node_ownerships_and_immediate_mode(self):
+        node = StructureNode.objects.create(
+            structure=self.structure, entity_template=self.entity, custom_name='Top', total_shares=50, level=1
+        )
+        too_many = NodeOwnership(owner_party=self.party, owned_node=node, ownership_percentage=100, owned_shares=60)
+
+        with deferred_validation(raise_errors=False) as batch:
+            too_many.clean()
+        self.assertEqual([error.instance for error in batch.errors], [too_many])
+
+        # Outside a deferred block clean() still validates right away
+        with self.assertRaisesMessage(ValidationError, 'Owned shares cannot exceed total shares'):
+            too_many.clean()
+        with self.assertRaises(ValidationError):
+            self.ownership(200).clean()
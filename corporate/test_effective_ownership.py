@@ -0,0 +1,123 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from corporate.effective_ownership import effective_ownership, propagate
+from corporate.models import Entity, EntityOwnership, NodeOwnership, Structure, StructureNode
+from corporate.ownership_graph import OwnershipGraph
+from parties.models import Party
+
+
+class PropagateTest(SimpleTestCase):
+    def fractions(self, edges):
+        graph = OwnershipGraph()
+        for owner, owned, percentage in edges:
+            graph.add_edge(owner, owned, percentage)
+        vectors = propagate(graph)
+        return {
+            graph.keys[idx]: {graph.keys[source]: round(fraction, 6) for source, fraction in vector.items()}
+            for idx, vector in enumerate(vectors)
+        }
+
+    def test_chains_multiply_and_paths_add_up(self):
+        fractions = self.fractions([
+            (('party', 1), 'holding', 80),
+            (('party', 2), 'holding', 20),
+            ('holding', 'opco', 50),
+            (('party', 1), 'opco', 50),
+            ('opco', 'subsidiary', 60),
+        ])
+        self.assertEqual(fractions['opco'], {('party', 1): 0.9, ('party', 2): 0.1})
+        self.assertEqual(fractions['subsidiary'], {('party', 1): 0.54, ('party', 2): 0.06})
+
+    def test_cross_holdings_converge(self):
+        # A and B hold 50% of each other; the party holds the other 50% of A
+        fractions = self.fractions([
+            (('party', 1), 'a', 50),
+            ('b', 'a', 50),
+            ('a', 'b', 50),
+        ])
+        self.assertAlmostEqual(fractions['a'][('party', 1)], 2 / 3, places=6)
+        self.assertAlmostEqual(fractions['b'][('party', 1)], 1 / 3, places=6)
+
+    def test_diverging_cycle_capped_and_flagged(self):
+        # A and B hold 100% of each other: the relaxation never converges
+        graph = OwnershipGraph()
+        for owner, owned, percentage in [(('party', 1), 'a', 50), ('b', 'a', 100), ('a', 'b', 100)]:
+            graph.add_edge(owner, owned, percentage)
+        diverging = set()
+        vectors = propagate(graph, diverging=diverging)
+
+        party = graph.index[('party', 1)]
+        for node in ('a', 'b'):
+            self.assertEqual(vectors[graph.index[node]][party], 1.0)
+        self.assertEqual(diverging, {(graph.index['a'], party), (graph.index['b'], party)})
+
+
+class EffectiveOwnershipTableTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.holding = Entity.objects.create(name='Holding')
+        self.opco = Entity.objects.create(name='OpCo')
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_ubo=self.party, owned_entity=self.holding,
+            ownership_percentage=100, corporate_name='Holding'
+        )
+        self.ownership = EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=self.holding, owned_entity=self.opco,
+            ownership_percentage=40, corporate_name='OpCo'
+        )
+
+    def test_table_is_cached_until_ownerships_change(self):
+        table = effective_ownership(self.structure)
+        self.assertEqual(table.percentage(self.party.id, self.opco.id), 40.0)
+
+        # Only the two version aggregates; the table itself comes from the cache
+        with self.assertNumQueries(2):
+            effective_ownership(self.structure)
+
+        # A QuerySet.update() sends no signal but still changes the version
+        EntityOwnership.objects.filter(pk=self.ownership.pk).update(ownership_percentage=50)
+        self.assertEqual(effective_ownership(self.structure).percentage(self.party.id, self.opco.id), 50.0)
+
+        self.ownership.ownership_percentage = 70
+        self.ownership.save()
+        self.assertEqual(effective_ownership(self.structure).percentage(self.party.id, self.opco.id), 70.0)
+
+    def test_node_ownerships_included(self):
+        top = StructureNode.objects.create(
+            entity_template=self.holding, structure=self.structure,
+            custom_name='Top', total_shares=100, level=1
+        )
+        bottom = StructureNode.objects.create(
+            entity_template=self.opco, structure=self.structure,
+            custom_name='Bottom', total_shares=100, level=2, parent_node=top
+        )
+        NodeOwnership.objects.create(owner_party=self.party, owned_node=top, ownership_percentage=60, owned_shares=60)
+        NodeOwnership.objects.create(owner_node=top, owned_node=bottom, ownership_percentage=50, owned_shares=50)
+
+        table = effective_ownership(self.structure)
+        self.assertEqual(table.nodes[self.party.id], {top.id: 60.0, bottom.id: 30.0})
+
+    def test_diverging_cycle_reported_as_capped(self):
+        self.ownership.ownership_percentage = 100
+        self.ownership.save()
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=self.opco, owned_entity=self.holding,
+            ownership_percentage=100, corporate_name='Holding'
+        )
+
+        for table in (effective_ownership(self.structure), effective_ownership(self.structure)):  # computed, cached
+            self.assertEqual(table.percentage(self.party.id, self.opco.id), 100.0)
+            self.assertEqual(
+                {(row['target_id'], row['capped']) for row in table.rows()},
+                {(self.holding.id, True), (self.opco.id, True)}
+            )
+
+    def test_api_unknown_structure_is_404(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('corporate:effective_ownership_api', args=[self.structure.id + 1]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,110 @@
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from corporate import exposure_index
+from corporate.models import Entity, EntityOwnership, PartyExposure, Structure
+from corporate.views_party_dashboard import get_party_structures
+from parties.models import Party
+
+
+class PartyExposureIndexTest(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.holding = Entity.objects.create(name='Holding')
+        self.opco = Entity.objects.create(name='OpCo')
+        self.structure = Structure.objects.create(name='Group', description='Test')
+
+    def add_ownerships(self):
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_ubo=self.party, owned_entity=self.holding,
+            ownership_percentage=80, corporate_name='Holding'
+        )
+        return EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=self.holding, owned_entity=self.opco,
+            ownership_percentage=50, corporate_name='OpCo'
+        )
+
+    def test_refreshed_once_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.add_ownerships()
+
+        # one callback per change, but only the first one recomputes
+        refreshes = [callback for callback in callbacks if callback.func is exposure_index._run_pending]
+        self.assertEqual(len(refreshes), 2)
+        exposures = {e.entity_id: e for e in PartyExposure.objects.filter(party=self.party)}
+        self.assertEqual(exposures[self.holding.id].direct_percentage, Decimal('80'))
+        self.assertEqual(exposures[self.opco.id].direct_percentage, Decimal('0'))
+        self.assertEqual(exposures[self.opco.id].effective_percentage, Decimal('40'))
+
+    def test_dashboard_reads_index_with_one_query(self):
+        ownership = self.add_ownerships()
+        exposure_index.rebuild()
+
+        with self.assertNumQueries(1):
+            structures = get_party_structures(self.party)
+
+        self.assertEqual(structures, [{
+            'id': self.structure.id,
+            'name': 'Group',
+            'structure_type': 'Unknown',
+            'status': 'Active',
+            'entities_count': 1,
+            'indirect_entities_count': 1,
+            'party_ownership_percentage': 80.0,
+        }])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ownership.delete()
+        self.assertEqual(
+            list(PartyExposure.objects.values_list('entity_id', flat=True)), [self.holding.id]
+        )
+
+    def test_migration_backfills_existing_structures(self):
+        self.add_ownerships()  # on_commit callbacks never run here, so the index stays empty
+        self.assertFalse(PartyExposure.objects.exists())
+
+        migration = import_module('corporate.migrations.0006_partyexposure')
+        migration.build_exposures(apps, None)
+
+        self.assertEqual(
+            sorted(PartyExposure.objects.values_list('entity__name', 'direct_percentage', 'effective_percentage')),
+            [('Holding', Decimal('80'), Decimal('80')), ('OpCo', Decimal('0'), Decimal('40'))]
+        )
+
+    def test_migration_backfill_matches_index_on_cross_holdings(self):
+        self.add_ownerships()
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=self.opco, owned_entity=self.holding,
+            ownership_percentage=20, corporate_name='Holding'
+        )
+
+        import_module('corporate.migrations.0006_partyexposure').build_exposures(apps, None)
+
+        self.assertEqual(
+            sorted(PartyExposure.objects.values_list('party_id', 'entity_id', 'direct_percentage', 'effective_percentage')),
+            sorted(
+                (row.party_id, row.entity_id, row.direct_percentage, row.effective_percentage)
+                for row in exposure_index.exposure_rows(self.structure.id)
+            )
+        )
+
+    def test_validation_keeps_same_named_structures_apart(self):
+        twin = Structure.objects.create(name='Group', description='Clone')
+        with self.captureOnCommitCallbacks(execute=True):
+            for structure in (self.structure, twin):
+                EntityOwnership.objects.create(
+                    structure=structure, owner_ubo=self.party, owned_entity=self.holding,
+                    ownership_percentage=60, corporate_name='Holding'
+                )
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('corporate:validate_party_ownership', args=[self.party.id]))
+
+        validation = response.json()['validation']
+        self.assertEqual(validation['errors'], [])
+        self.assertEqual(validation['warnings'], ['Total ownership in Group is less than 100%'] * 2)
@@ -0,0 +1,102 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from corporate.models import Entity, NodeOwnership, Structure, StructureNode
+from parties.models import Party
+
+
+class OrganogramBatchTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        self.entity = Entity.objects.create(name='Wyoming LLC')
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+
+    def post(self, operations):
+        response = self.client.post(
+            reverse('corporate:organogram_builder_batch_api'),
+            json.dumps({'structure_id': self.structure.id, 'operations': operations}),
+            content_type='application/json'
+        )
+        return response.json()
+
+    def tree_operations(self, count):
+        operations = [{
+            'action': 'add_node', 'temp_id': 'n0', 'entity_template_id': self.entity.id,
+            'custom_name': 'Node 0', 'total_shares': 1000,
+        }, {
+            'action': 'add_ownership', 'temp_id': 'o0', 'owner_party_id': self.party.id,
+            'owned_node_id': 'n0', 'ownership_percentage': 100, 'owned_shares': 1000,
+        }]
+        for number in range(1, count):
+            parent = f'n{(number - 1) // 2}'
+            operations.append({
+                'action': 'add_node', 'temp_id': f'n{number}', 'entity_template_id': self.entity.id,
+                'custom_name': f'Node {number}', 'parent_node_id': parent, 'total_shares': 1000,
+            })
+            operations.append({
+                'action': 'add_ownership', 'temp_id': f'o{number}', 'owner_node_id': parent,
+                'owned_node_id': f'n{number}', 'ownership_percentage': 100, 'owned_shares': 1000,
+            })
+        return operations
+
+    def test_tree_saved_in_one_request(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.tree_operations(5))
+        StructureNode.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.post(self.tree_operations(30))
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(len(result['id_map']['nodes']), 30)
+        self.assertEqual(len(result['id_map']['ownerships']), 30)
+        # Inserts go one hierarchy level at a time, not one row at a time
+        self.assertLessEqual(len(queries), len(small) + 2)
+
+        node = StructureNode.objects.get(pk=result['id_map']['nodes']['n10'])
+        self.assertEqual(node.parent_node_id, result['id_map']['nodes']['n4'])
+        self.assertEqual(node.level, 4)
+        self.assertEqual(NodeOwnership.objects.get(pk=result['id_map']['ownerships']['o10']).owner_node_id,
+                         result['id_map']['nodes']['n4'])
+
+    def test_invalid_operation_rolls_back_everything(self):
+        operations = self.tree_operations(3)
+        operations.append({'action': 'update_node', 'node_id': 'missing', 'custom_name': 'X'})
+
+        result = self.post(operations)
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['operation_index'], len(operations) - 1)
+        self.assertFalse(StructureNode.objects.exists())
+
+    def test_updates_and_deletes_of_existing_and_temporary_objects(self):
+        saved = self.post(self.tree_operations(3))['id_map']
+        root_id = saved['nodes']['n0']
+
+        result = self.post([
+            {'action': 'update_node', 'node_id': root_id, 'custom_name': 'Root'},
+            {'action': 'update_ownership', 'ownership_id': saved['ownerships']['o0'], 'ownership_percentage': 60},
+            {'action': 'delete_node', 'node_id': saved['nodes']['n1']},
+            {'action': 'add_node', 'temp_id': 'tmp', 'entity_template_id': self.entity.id,
+             'custom_name': 'Node 1', 'parent_node_id': root_id, 'total_shares': 10},
+            {'action': 'add_node', 'temp_id': 'gone', 'entity_template_id': self.entity.id,
+             'custom_name': 'Gone', 'parent_node_id': 'tmp', 'total_shares': 10},
+            {'action': 'update_node', 'node_id': 'tmp', 'total_shares': 20},
+            {'action': 'delete_node', 'node_id': 'gone'},
+        ])
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['summary']['nodes_created'], 1)
+        self.assertEqual(
+            sorted(StructureNode.objects.values_list('custom_name', flat=True)),
+            ['Node 1', 'Node 2', 'Root']
+        )
+        self.assertEqual(StructureNode.objects.get(pk=result['id_map']['nodes']['tmp']).total_shares, 20)
+        self.assertEqual(NodeOwnership.objects.get(pk=saved['ownerships']['o0']).ownership_percentage, 60)
+        self.assertNotIn('gone', result['id_map']['nodes'])
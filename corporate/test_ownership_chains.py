@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from corporate import ownership_chains
+from corporate.models import Entity, EntityOwnership, NodeOwnership, Structure, StructureNode
+from parties.models import Party
+
+
+class OwnershipChainTest(TestCase):
+    def setUp(self):
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.a, self.b, self.c = (Entity.objects.create(name=name) for name in ('A', 'B', 'C'))
+
+        def own(owned, percentage, owner_entity=None, owner_ubo=None):
+            EntityOwnership.objects.create(
+                structure=self.structure, owner_entity=owner_entity, owner_ubo=owner_ubo,
+                owned_entity=owned, ownership_percentage=percentage, corporate_name=owned.name
+            )
+
+        own(self.a, 100, owner_ubo=self.party)
+        own(self.b, 50, owner_entity=self.a)
+        own(self.c, 50, owner_entity=self.b)
+        own(self.c, 10, owner_entity=self.a)
+        # Cycle back to the top of the chain
+        own(self.a, 5, owner_entity=self.c)
+
+    def test_descendants_with_paths_and_cumulative_percentages(self):
+        with self.assertNumQueries(1):
+            links = ownership_chains.entity_descendants(self.a)
+
+        chains = {(link.name, link.path): (link.depth, link.percentage) for link in links}
+        self.assertEqual(chains, {
+            ('B', f'/e:{self.a.pk}/e:{self.b.pk}/'): (1, Decimal('50.0000')),
+            ('C', f'/e:{self.a.pk}/e:{self.c.pk}/'): (1, Decimal('10.0000')),
+            ('C', f'/e:{self.a.pk}/e:{self.b.pk}/e:{self.c.pk}/'): (2, Decimal('25.0000')),
+        })
+
+    def test_ancestors_reach_parties_and_stop_at_cycles(self):
+        with self.assertNumQueries(1):
+            links = ownership_chains.entity_ancestors(self.c, structure=self.structure)
+
+        party_links = [link for link in links if link.kind == 'party']
+        self.assertEqual(sorted(link.percentage for link in party_links), [Decimal('10.0000'), Decimal('25.0000')])
+        self.assertEqual(max(link.depth for link in links), 3)
+        self.assertTrue(all(link.path.endswith(f'/e:{self.c.pk}/') for link in links))
+
+    def test_querysets_compose(self):
+        self.assertEqual(set(ownership_chains.descendant_entities(self.a)), {self.b, self.c})
+        self.assertEqual(list(ownership_chains.descendant_entities(self.a).filter(name='C')), [self.c])
+        self.assertEqual(list(ownership_chains.ancestor_parties(self.c)), [self.party])
+        # The C -> A edge closes a cycle: C is never reported as its own owner
+        self.assertEqual(set(ownership_chains.ancestor_entities(self.c)), {self.a, self.b})
+
+    def test_node_chains_and_api(self):
+        template = Entity.objects.create(name='Template')
+        top, middle, bottom = (
+            StructureNode.objects.create(
+                entity_template=template, structure=self.structure, custom_name=name, total_shares=100, level=1
+            )
+            for name in ('Top', 'Middle', 'Bottom')
+        )
+        NodeOwnership.objects.create(owner_party=self.party, owned_node=top, ownership_percentage=100, owned_shares=100)
+        NodeOwnership.objects.create(owner_node=top, owned_node=middle, ownership_percentage=80, owned_shares=80)
+        NodeOwnership.objects.create(owner_node=middle, owned_node=bottom, ownership_percentage=50, owned_shares=50)
+
+        self.assertEqual(set(ownership_chains.descendant_nodes(top)), {middle, bottom})
+        self.assertEqual(list(ownership_chains.ancestor_nodes(bottom).order_by('custom_name')), [middle, top])
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(
+            reverse('corporate:ownership_chain_api', args=['node', bottom.pk]), {'direction': 'ancestors'}
+        )
+        chain = response.json()['chain']
+        self.assertEqual(chain[-1]['type'], 'party')
+        self.assertEqual(chain[-1]['cumulative_percentage'], 40.0)
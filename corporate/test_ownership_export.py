@@ -0,0 +1,125 @@
+import io
+import json
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from reportlab.lib.pagesizes import A4, landscape
+
+from corporate.models import Entity, EntityOwnership, Structure
+from corporate.pdf_matrix import MatrixLayout, render_matrix
+from corporate.xlsx_export import PivotAccumulator
+from parties.models import Party
+
+
+class OwnershipMatrixExportTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.holding = Entity.objects.create(name='Holding')
+        self.opco = Entity.objects.create(name='OpCo')
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_ubo=self.party, owned_entity=self.holding,
+            ownership_percentage=100, corporate_name='Holding'
+        )
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=self.holding, owned_entity=self.opco,
+            ownership_percentage='62.50', corporate_name='OpCo'
+        )
+
+    def export(self, export_format, **options):
+        return self.client.post(
+            reverse('corporate:export_ownership_matrix_api'),
+            json.dumps({'format': export_format, 'structure_id': self.structure.id, **options}),
+            content_type='application/json'
+        )
+
+    def content(self, response):
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_is_streamed(self):
+        lines = self.content(self.export('csv')).splitlines()
+        self.assertEqual(lines[0], 'Owner,Owner Type,Owned Entity,Ownership %,Structure,Notes,Created At')
+        self.assertTrue(lines[1].startswith('Owner,Party,Holding,100.00,Group,,'))
+        self.assertTrue(lines[2].startswith('Holding,Entity,OpCo,62.50,Group,,'))
+
+    def test_json_array_and_ndjson(self):
+        items = json.loads(self.content(self.export('json', include_metadata=False)))
+        self.assertEqual([item['ownership_percentage'] for item in items], [100.0, 62.5])
+        self.assertEqual(items[1]['owner'], {'name': 'Holding', 'type': 'entity', 'id': self.holding.id})
+
+        lines = self.content(self.export('ndjson')).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['owner']['type'], 'party')
+
+    def test_xlsx_has_flat_and_pivot_sheets(self):
+        response = self.export('excel')
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+
+        self.assertEqual(workbook.sheetnames, ['Ownerships', 'Matrix'])
+        flat = list(workbook['Ownerships'].values)
+        self.assertEqual(flat[1][:4], ('Owner', 'Party', 'Holding', 100.0))
+
+        matrix = list(workbook['Matrix'].values)
+        self.assertEqual(matrix[0], ('Owner \\ Entity', 'Holding', 'OpCo', 'Total'))
+        self.assertEqual(matrix[1], ('Holding', None, 62.5, 62.5))
+        self.assertEqual(matrix[2], ('Owner', 100.0, None, 100.0))
+        self.assertEqual(matrix[3], ('Total', 100.0, 62.5, 162.5))
+
+    def test_pivot_keeps_same_named_owners_and_entities_apart(self):
+        # A party and a second entity both called "Holding"
+        namesake = Party.objects.create(name='Holding', person_type='NATURAL_PERSON')
+        other_opco = Entity.objects.create(name='OpCo')
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_ubo=namesake, owned_entity=other_opco,
+            ownership_percentage=30, corporate_name='OpCo'
+        )
+
+        response = self.export('excel')
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+
+        matrix = list(workbook['Matrix'].values)
+        self.assertEqual(matrix[0], ('Owner \\ Entity', 'Holding', 'OpCo', 'OpCo', 'Total'))
+        self.assertEqual(matrix[1], ('Holding', None, 62.5, None, 62.5))  # the entity
+        self.assertEqual(matrix[2], ('Holding', None, None, 30.0, 30.0))  # the party
+        self.assertEqual(matrix[4], ('Total', 100.0, 62.5, 30.0, 192.5))
+
+    def test_pdf_matrix(self):
+        response = self.export('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+
+class PdfMatrixLayoutTest(SimpleTestCase):
+    def test_large_matrix_tiled_with_headers_on_every_page(self):
+        pivot = PivotAccumulator()
+        for owner in range(300):
+            for entity in range(owner, owner + 3):
+                pivot.add(f'Owner {owner:03}', f'Entity {entity:03}', 10)
+
+        layout = MatrixLayout(pivot, landscape(A4))
+        self.assertGreater(len(layout.column_bands), 1)
+        self.assertEqual(sum(end - start for start, end in layout.column_bands), 302)
+        self.assertEqual(sum(len(band) for band in layout.row_bands()), 301)
+
+        # sparse diagonal: empty tiles are skipped
+        tiles = layout.tiles()
+        self.assertLess(len(tiles), len(layout.row_bands()) * len(layout.column_bands))
+
+        output = io.BytesIO()
+        render_matrix(pivot, output)
+        self.assertEqual(output.getvalue().count(b'/Type /Page\n'), len(tiles))
+
+    def test_same_named_rows_and_columns_stay_apart(self):
+        pivot = PivotAccumulator()
+        pivot.add(('party', 1), ('entity', 1), 40, row_label='Holding', column_label='OpCo')
+        pivot.add(('entity', 2), ('entity', 3), 60, row_label='Holding', column_label='OpCo')
+
+        layout = MatrixLayout(pivot, landscape(A4))
+        self.assertEqual(layout.rows, [('entity', 2), ('party', 1)])
+        self.assertEqual(layout.column_labels, ['OpCo', 'OpCo'])
+        self.assertEqual(layout.totals, {('entity', 1): 40.0, ('entity', 3): 60.0})
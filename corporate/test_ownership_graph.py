@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from corporate.models import Entity, EntityOwnership, Structure
+from corporate.ownership_graph import ENTITY, PARTY, OwnershipGraph
+from corporate.views import generate_structure_preview
+from parties.models import Party
+
+
+class OwnershipGraphTest(SimpleTestCase):
+    def build(self, edges):
+        graph = OwnershipGraph()
+        for owner, owned, percentage in edges:
+            graph.add_edge(owner, owned, percentage)
+        return graph
+
+    def test_roots_leaves_and_levels(self):
+        graph = self.build([
+            ('ubo', 'holding', 100),
+            ('holding', 'opco', 60),
+            ('ubo', 'opco', 40),
+            ('opco', 'subsidiary', 100),
+        ])
+        self.assertEqual([graph.keys[idx] for idx in graph.roots()], ['ubo'])
+        self.assertEqual([graph.keys[idx] for idx in graph.leaves()], ['subsidiary'])
+
+        levels = dict(zip(graph.keys, graph.levels()))
+        depths = dict(zip(graph.keys, graph.depths()))
+        self.assertEqual(levels['opco'], 1)
+        self.assertEqual(depths['opco'], 2)
+        self.assertEqual(graph.max_depth(), 3)
+
+        order = [graph.keys[idx] for idx in graph.topological_order()]
+        self.assertLess(order.index('holding'), order.index('opco'))
+        self.assertEqual(graph.total_owned('opco'), Decimal(100))
+        self.assertEqual(graph.cycles(), [])
+
+    def test_cycles_reported_once_per_component(self):
+        graph = self.build([
+            ('a', 'b', 50), ('b', 'c', 50), ('c', 'a', 50),
+            ('d', 'd', 10),
+            ('c', 'e', 100),
+        ])
+        cycles = [[graph.keys[idx] for idx in cycle] for cycle in graph.cycles()]
+
+        self.assertEqual(len(cycles), 2)
+        self.assertIn(['a', 'b', 'c', 'a'], cycles)
+        self.assertIn(['d', 'd'], cycles)
+        self.assertEqual(
+            sorted(sorted(graph.keys[idx] for idx in members) for members in graph.cyclic_components()),
+            [['a', 'b', 'c'], ['d']]
+        )
+        self.assertFalse(graph.is_acyclic())
+
+    def test_long_chain_does_not_recurse(self):
+        graph = self.build([(i, i + 1, 100) for i in range(5000)])
+        self.assertEqual(graph.max_depth(), 5000)
+        self.assertEqual(len(graph.strongly_connected_components()), 5001)
+
+
+class OwnershipGraphStructureTest(TestCase):
+    def test_built_with_a_single_query(self):
+        party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        holding = Entity.objects.create(name='Holding')
+        opco = Entity.objects.create(name='OpCo')
+        structure = Structure.objects.create(name='Group', description='Test')
+        EntityOwnership.objects.create(
+            structure=structure, owner_ubo=party, owned_entity=holding,
+            ownership_percentage=100, corporate_name='Holding'
+        )
+        EntityOwnership.objects.create(
+            structure=structure, owner_entity=holding, owned_entity=opco,
+            ownership_percentage=75, corporate_name='OpCo'
+        )
+
+        with self.assertNumQueries(1):
+            graph = OwnershipGraph.for_structure(structure)
+
+        self.assertEqual(graph.roots(), [graph.index[(PARTY, party.id)]])
+        self.assertEqual(graph.total_owned((ENTITY, opco.id)), Decimal('75'))
+        self.assertEqual(graph.max_depth(), 2)
+
+    def test_preview_keeps_rows_without_owner(self):
+        entity = Entity.objects.create(name='Orphan')
+        structure = Structure.objects.create(name='Group', description='Test')
+        EntityOwnership.objects.create(
+            structure=structure, owned_entity=entity, ownership_percentage=40, corporate_name='Orphan'
+        )
+
+        preview = generate_structure_preview(structure)
+
+        self.assertEqual(preview['entities'][0]['total_ownership'], 0)
+        self.assertEqual(preview['ownerships'][0]['owner_name'], '')
+
+
+class ValidateOwnershipMatrixTest(TestCase):
+    def test_every_cycle_reported_with_constant_queries(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        structure = Structure.objects.create(name='Group', description='Test')
+        a, b, c, d, e = [Entity.objects.create(name=name) for name in 'ABCDE']
+        Entity.objects.create(name='Unused')
+        for owner, owned in [(a, b), (b, a), (b, e), (e, a), (c, d), (d, c)]:
+            EntityOwnership.objects.create(
+                structure=structure, owner_entity=owner, owned_entity=owned,
+                ownership_percentage=50, corporate_name=owned.name
+            )
+
+        # session + user, ownership rows with names, orphaned entities
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                reverse('corporate:validate_ownership_matrix_api'), '{}',
+                content_type='application/json'
+            )
+
+        results = response.json()
+        messages = [
+            result['message'] for result in results
+            if result['title'] == 'Circular ownership detected'
+        ]
+        self.assertEqual(sorted(messages), [
+            'Circular ownership path: A → B → A (entities in this ownership loop: A, B, E)',
+            'Circular ownership path: C → D → C',
+        ])
+        self.assertEqual(
+            [result['title'] for result in results if result['title'].startswith('Orphaned')],
+            ['Orphaned entity: Unused']
+        )
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from corporate.models import Entity, EntityOwnership, Structure
+from corporate.views_party_dashboard import (
+    PartySnapshot, get_party_analytics, get_party_statistics, get_party_structures_data,
+)
+from parties.models import Party
+
+
+class PartyDashboardTest(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.structures = [
+            Structure.objects.create(name=f'Group {i}', description='Test') for i in range(2)
+        ]
+        self.entities = [
+            Entity.objects.create(name='Delaware Co', jurisdiction='US'),
+            Entity.objects.create(name='Bahamas Co', jurisdiction='BS'),
+        ]
+        for structure, entity, percentage in [
+            (self.structures[0], self.entities[0], 80),
+            (self.structures[0], self.entities[1], 40),
+            (self.structures[1], self.entities[1], 60),
+        ]:
+            EntityOwnership.objects.create(
+                structure=structure, owner_ubo=self.party, owned_entity=entity,
+                ownership_percentage=percentage, corporate_name=entity.name
+            )
+
+    def test_metrics_derived_from_one_snapshot(self):
+        with self.assertNumQueries(2):
+            snapshot = PartySnapshot(self.party)
+
+        with self.assertNumQueries(0):
+            stats = get_party_statistics(self.party, snapshot)
+            analytics = get_party_analytics(self.party, snapshot)
+
+        self.assertEqual(stats['total_structures'], 2)
+        self.assertEqual(stats['total_ownership'], Decimal('180'))
+        self.assertEqual(stats['max_ownership'], Decimal('80'))
+        self.assertEqual(stats['active_entities'], 2)
+        self.assertEqual(stats['total_ownerships'], 3)
+        self.assertEqual(stats['jurisdictions_count'], 2)
+        self.assertEqual(stats['diversification_index'], 66.7)
+        self.assertEqual(stats['complexity_score'], 60)
+        self.assertEqual(analytics['concentration_risk'], Decimal('80'))
+        self.assertEqual(analytics['jurisdiction_risk'], 50)
+        self.assertEqual(analytics['complexity_risk'], 50)
+
+    def test_structures_data_batched(self):
+        # the party's ownerships with their entities and structures
+        with self.assertNumQueries(1):
+            structures = get_party_structures_data(self.party)
+
+        by_name = {structure['name']: structure for structure in structures}
+        self.assertEqual(by_name['Group 0']['party_ownership_percentage'], 120.0)
+        self.assertEqual(
+            sorted(entity['name'] for entity in by_name['Group 0']['entities']),
+            ['Bahamas Co', 'Delaware Co']
+        )
+        self.assertEqual(by_name['Group 1']['entities'][0]['ownership_percentage'], Decimal('60'))
+        self.assertEqual(set(by_name['Group 0']), {
+            'id', 'name', 'structure_type', 'status', 'entities_count', 'party_ownership_percentage', 'entities'
+        })
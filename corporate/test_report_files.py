@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from corporate import report_cache
+
+
+class ReportDownloadTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        os.makedirs(report_cache.reports_dir())
+        self.content = bytes(range(256)) * 1000
+        with open(os.path.join(report_cache.reports_dir(), 'report.pdf'), 'wb') as f:
+            f.write(self.content)
+        self.url = reverse('corporate:download_report', args=['report.pdf'])
+
+    def test_streams_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        suffix = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(suffix.streaming_content), self.content[-10:])
+
+        outside = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(outside.status_code, 416)
+
+        stale = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_conditional_requests(self):
+        first = self.client.get(self.url)
+        by_etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(by_etag.status_code, 304)
+        by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_rejects_paths_outside_reports(self):
+        self.assertEqual(self.client.get(reverse('corporate:download_report', args=['..'])).status_code, 400)
+        self.assertEqual(self.client.get(reverse('corporate:download_report', args=['missing.pdf'])).status_code, 404)
+
+    @override_settings(REPORT_SENDFILE_HEADER='X-Accel-Redirect', REPORT_SENDFILE_URL='/protected/reports/')
+    def test_sendfile_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/reports/report.pdf')
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,232 @@
+import json
+import os
+import tempfile
+import time
+import zipfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from corporate import batch_reports, report_cache, report_jobs
+from corporate.models import Entity, EntityOwnership, ReportJob, Structure
+from corporate.views_organogram_printing import generate_party_report_data, generate_structure_report_data
+from parties.models import Party
+
+
+class ReportJobTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        entity = Entity.objects.create(name='Holding')
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        self.ownership = EntityOwnership.objects.create(
+            structure=self.structure, owner_ubo=party, owned_entity=entity,
+            ownership_percentage=100, corporate_name='Holding'
+        )
+
+    def queue(self, export_format, expected_status=202):
+        response = self.client.post(
+            reverse('corporate:generate_organogram_report'),
+            json.dumps({'structure_id': self.structure.id, 'format': export_format}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, expected_status)
+        return response.json()
+
+    def test_request_only_queues_and_worker_renders(self):
+        queued = self.queue('excel')
+        job = ReportJob.objects.get(pk=queued['job_id'])
+        self.assertEqual(job.status, 'PENDING')
+
+        pending = self.client.get(queued['download_url'])
+        self.assertEqual(pending.status_code, 202)
+
+        self.assertEqual(report_jobs.drain(workers=1), 1)
+
+        status = self.client.get(queued['status_url']).json()['job']
+        self.assertEqual((status['status'], status['progress']), ('DONE', 100))
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(download['Content-Disposition'].endswith('.xlsx"'))
+
+    def test_jobs_claimed_once(self):
+        first = self.queue('html')['job_id']
+        second = self.queue('html')['job_id']
+
+        self.assertEqual(report_jobs.claim_next(), first)
+        self.assertEqual(report_jobs.claim_next(), second)
+        self.assertIsNone(report_jobs.claim_next())
+
+    def test_idle_poll_starts_no_worker_processes(self):
+        with mock.patch.object(report_jobs, 'ProcessPoolExecutor') as pool:
+            self.assertEqual(report_jobs.drain(workers=4), 0)
+        pool.assert_not_called()
+
+    def test_unchanged_request_reuses_cached_report(self):
+        self.queue('excel')
+        report_jobs.drain(workers=1)
+
+        cached = self.queue('excel', expected_status=200)
+        self.assertEqual(cached['status'], 'DONE')
+        self.assertEqual(self.client.get(cached['download_url']).status_code, 200)
+        self.assertEqual(len(os.listdir(report_cache.reports_dir())), 1)
+
+        # Changing the data gives a new cache key
+        self.ownership.ownership_percentage = 60
+        self.ownership.save()
+        queued = self.queue('excel')
+        report_jobs.drain(workers=1)
+        job = ReportJob.objects.get(pk=queued['job_id'])
+        self.assertNotEqual(job.file_name, cached['filename'])
+        self.assertEqual(len(os.listdir(report_cache.reports_dir())), 2)
+
+    def test_eviction_drops_least_recently_used(self):
+        directory = report_cache.reports_dir()
+        os.makedirs(directory)
+        now = time.time()
+        for age, name in enumerate(['newest.pdf', 'middle.pdf', 'oldest.pdf']):
+            path = os.path.join(directory, name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 10)
+            os.utime(path, (now - age * 60, now - age * 60))
+
+        # A cache hit makes the oldest file the most recently used
+        report_cache.lookup('oldest.pdf')
+        self.assertEqual(report_cache.evict(max_bytes=20, max_files=10), 1)
+        self.assertEqual(sorted(os.listdir(directory)), ['newest.pdf', 'oldest.pdf'])
+
+
+class BatchReportTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        holding = Entity.objects.create(name='Holding')
+        self.structures = []
+        for number in range(3):
+            structure = Structure.objects.create(name=f'Group {number}', description='Test')
+            subsidiary = Entity.objects.create(name=f'Subsidiary {number}')
+            EntityOwnership.objects.create(
+                structure=structure, owner_ubo=party, owned_entity=holding,
+                ownership_percentage=100, corporate_name='Holding'
+            )
+            EntityOwnership.objects.create(
+                structure=structure, owner_entity=holding, owned_entity=subsidiary,
+                ownership_percentage=50 + number, corporate_name=f'Subsidiary {number}'
+            )
+            self.structures.append(structure)
+
+    def test_preload_uses_two_queries_and_matches_single_report_keys(self):
+        ids = [structure.id for structure in self.structures]
+        with self.assertNumQueries(2):
+            batch = batch_reports.preload(ids)
+        self.assertEqual([structure.id for structure, _ in batch], ids)
+
+        structure, ownerships = batch[0]
+        self.assertEqual(
+            batch_reports.member_filename(structure, ownerships, 'professional', None),
+            report_cache.report_filename(structure=structure, format_type='pdf', template='professional'),
+        )
+
+    def test_batch_zip_through_the_queue(self):
+        response = self.client.post(
+            reverse('corporate:generate_batch_report'),
+            json.dumps({'structure_ids': [structure.id for structure in self.structures]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 202)
+        report_jobs.drain(workers=1)
+
+        job = ReportJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.status, 'DONE', job.error)
+        with zipfile.ZipFile(os.path.join(report_cache.reports_dir(), job.file_name)) as archive:
+            names = archive.namelist()
+        self.assertEqual(len(names), 3)
+        self.assertTrue(all(name.endswith('.pdf') for name in names))
+
+    @override_settings(REPORT_CACHE_MAX_FILES=1)
+    def test_members_not_evicted_while_batch_renders(self):
+        path = batch_reports.render_batch([structure.id for structure in self.structures], workers=1)
+
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+        # once the batch is stored the cache bound applies again
+        self.assertEqual(os.listdir(report_cache.reports_dir()), [os.path.basename(path)])
+
+    def test_merged_pdf(self):
+        path = batch_reports.render_batch(
+            [structure.id for structure in self.structures], output='merged', workers=1
+        )
+        with open(path, 'rb') as f:
+            self.assertTrue(f.read(5).startswith(b'%PDF'))
+
+
+class ReportDataTest(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.structures = []
+        for number in range(4):
+            structure = Structure.objects.create(name=f'Group {number}', description='Test')
+            for jurisdiction in ('BS', 'US'):
+                EntityOwnership.objects.create(
+                    structure=structure, owner_ubo=self.party,
+                    owned_entity=Entity.objects.create(name=f'{jurisdiction} {number}', jurisdiction=jurisdiction),
+                    ownership_percentage=25, corporate_name=f'{jurisdiction} {number}'
+                )
+            self.structures.append(structure)
+
+    def test_party_report_query_count_is_constant(self):
+        with self.assertNumQueries(3):
+            data = generate_party_report_data(self.party, {})
+
+        self.assertEqual(data['statistics']['total_structures'], 4)
+        self.assertEqual(data['statistics']['total_entities'], 8)
+        self.assertEqual(data['statistics']['total_ownership'], 200)
+        self.assertEqual([structure['party_ownership'] for structure in data['structures']], [50] * 4)
+        self.assertEqual(
+            [(row['jurisdiction'], row['entities']) for row in data['jurisdiction_breakdown']],
+            [('BS', 4), ('US', 4)]
+        )
+
+    def test_structure_report_uses_one_query(self):
+        with self.assertNumQueries(1):
+            data = generate_structure_report_data(self.structures[0], {})
+
+        self.assertEqual(data['statistics']['total_parties'], 1)
+        self.assertEqual(data['statistics']['avg_ownership'], 25)
+        self.assertEqual(
+            [(row['jurisdiction'], row['ownerships']) for row in data['jurisdiction_breakdown']],
+            [('BS', 1), ('US', 1)]
+        )
+
+    def test_null_percentages_ignored_in_statistics(self):
+        EntityOwnership.objects.create(
+            structure=self.structures[0], owner_ubo=self.party,
+            owned_entity=Entity.objects.create(name='Unknown share', jurisdiction='US'),
+            ownership_percentage=None, corporate_name='Unknown share'
+        )
+
+        data = generate_structure_report_data(self.structures[0], {})
+
+        self.assertEqual(data['statistics']['total_ownerships'], 3)
+        self.assertEqual(data['statistics']['avg_ownership'], 25)
+        self.assertEqual(data['statistics']['max_ownership'], 25)
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with override_settings(MEDIA_ROOT=media.name):
+            path = batch_reports.render_batch([self.structures[0].id], output='merged', workers=1)
+        self.assertTrue(os.path.exists(path))
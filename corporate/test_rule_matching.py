@@ -0,0 +1,127 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from corporate.models import Entity, EntityOwnership, Structure, ValidationRule
+from corporate.rule_matching import NO_TAX_IMPACTS, RuleMatcher
+from parties.models import Party
+
+
+class RuleMatcherTest(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.entities = [
+            Entity.objects.create(name=f'Entity {i}', total_shares=1000)
+            for i in range(4)
+        ]
+        self.structure = Structure.objects.create(name='Holding', description='Test')
+
+        a, b, c, d = self.entities
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_ubo=self.party, owned_entity=a,
+            ownership_percentage=100, corporate_name='A'
+        )
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=a, owned_entity=b,
+            ownership_percentage=100, corporate_name='B'
+        )
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=b, owned_entity=c,
+            ownership_percentage=100, corporate_name='C'
+        )
+
+        ValidationRule.objects.create(
+            parent_entity=a, related_entity=b, relationship_type='RECOMMENDED',
+            severity='INFO', description='A with B', tax_impacts='Pass-through'
+        )
+        ValidationRule.objects.create(
+            parent_entity=c, related_entity=a, relationship_type='CONDITIONAL',
+            severity='WARNING', description='C with A', tax_impacts='Withholding'
+        )
+        # D is not part of the structure, so this rule must never match
+        ValidationRule.objects.create(
+            parent_entity=a, related_entity=d, relationship_type='INCOMPATIBLE',
+            severity='ERROR', description='A with D', tax_impacts='Double taxation'
+        )
+
+    def test_rules_indexed_by_unordered_pair(self):
+        a, b, c, d = self.entities
+        matcher = RuleMatcher.for_entities([a.id, b.id, c.id])
+
+        self.assertEqual(len(matcher.rules_for_pair(b.id, a.id)), 1)
+        self.assertEqual(len(matcher.rules_for_pair(a.id, c.id)), 1)
+        self.assertEqual(matcher.rules_for_pair(a.id, d.id), [])
+
+    def test_combined_fields_computed_from_one_rule_query(self):
+        with self.assertNumQueries(3):
+            self.structure.update_calculated_fields()
+
+        self.assertEqual(self.structure.tax_impacts, 'Pass-through; Withholding')
+        self.assertEqual(self.structure.severity_levels, 'INFO, WARNING')
+
+    def test_structure_without_rules(self):
+        empty = Structure.objects.create(name='Empty', description='Test')
+        self.assertEqual(empty.combined_tax_impacts, NO_TAX_IMPACTS)
+        self.assertEqual(empty.combined_severities, [])
+
+    def test_prohibited_combination_raises(self):
+        a, b, c, d = self.entities
+        ValidationRule.objects.create(
+            parent_entity=b, related_entity=c, relationship_type='PROHIBITED',
+            severity='ERROR', description='Not allowed', tax_impacts='n/a'
+        )
+
+        with self.assertRaisesMessage(ValidationError, 'Prohibited combination'):
+            self.structure.validate_entity_combinations()
+
+
+class IncrementalValidationFieldsTest(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.a = Entity.objects.create(name='A')
+        self.b = Entity.objects.create(name='B')
+        self.c = Entity.objects.create(name='C')
+        ValidationRule.objects.create(
+            parent_entity=self.a, related_entity=self.b, relationship_type='RECOMMENDED',
+            severity='INFO', description='A with B', tax_impacts='Pass-through'
+        )
+        ValidationRule.objects.create(
+            parent_entity=self.b, related_entity=self.c, relationship_type='CONDITIONAL',
+            severity='WARNING', description='B with C', tax_impacts='Withholding'
+        )
+        self.structure = Structure.objects.create(name='Holding', description='Test')
+        EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=self.a, owned_entity=self.b,
+            ownership_percentage=100, corporate_name='B'
+        )
+        self.structure.save()
+
+    def test_save_without_changes_skips_recomputation(self):
+        self.structure.description = 'Only the description changed'
+
+        # UPDATE, ownership rows and rule table version; no second UPDATE
+        with self.assertNumQueries(3):
+            self.structure.save()
+
+        self.assertEqual(self.structure.tax_impacts, 'Pass-through')
+
+    def test_added_and_removed_ownerships_update_contributions(self):
+        ownership = EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=self.b, owned_entity=self.c,
+            ownership_percentage=100, corporate_name='C'
+        )
+        self.structure.save()
+        self.assertEqual(self.structure.tax_impacts, 'Pass-through; Withholding')
+        self.assertEqual(self.structure.severity_levels, 'INFO, WARNING')
+
+        ownership.delete()
+        self.structure.save()
+        self.assertEqual(self.structure.tax_impacts, 'Pass-through')
+        self.assertEqual(self.structure.severity_levels, 'INFO')
+
+    def test_rule_change_triggers_full_recompute(self):
+        rule = ValidationRule.objects.get(parent_entity=self.a, related_entity=self.b)
+        rule.tax_impacts = 'Corporate tax'
+        rule.save()
+
+        self.structure.save()
+        self.assertEqual(self.structure.tax_impacts, 'Corporate tax')
@@ -0,0 +1,113 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from corporate import structure_cloning
+from corporate.models import (
+    Entity, EntityOwnership, NodeOwnership, Structure, StructureMetrics, StructureNode, ValidationRule
+)
+from parties.models import Party
+
+
+class StructureCloningTest(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.holding, self.opco = (Entity.objects.create(name=name) for name in ('Holding', 'OpCo'))
+        ValidationRule.objects.create(
+            parent_entity=self.holding, related_entity=self.opco, relationship_type='RECOMMENDED',
+            severity='LOW', description='Pair', tax_impacts='Withholding tax'
+        )
+
+    def build(self, name, depth=3):
+        structure = Structure.objects.create(name=name, description='Original')
+        EntityOwnership.objects.create(
+            structure=structure, owner_ubo=self.party, owned_entity=self.holding,
+            ownership_percentage=100, corporate_name='Holding', hash_number='H1'
+        )
+        EntityOwnership.objects.create(
+            structure=structure, owner_entity=self.holding, owned_entity=self.opco,
+            ownership_percentage=100, corporate_name='OpCo'
+        )
+        parent = None
+        for level in range(depth):
+            node = StructureNode.objects.create(
+                structure=structure, entity_template=self.holding, custom_name=f'Node {level}',
+                total_shares=100, level=level + 1, parent_node=parent
+            )
+            if parent is None:
+                NodeOwnership.objects.create(owner_party=self.party, owned_node=node,
+                                             ownership_percentage=100, owned_shares=100)
+            else:
+                NodeOwnership.objects.create(owner_node=parent, owned_node=node,
+                                             ownership_percentage=100, owned_shares=100)
+            parent = node
+        return structure
+
+    def test_clone_copies_rows_with_remapped_nodes(self):
+        original = self.build('Group')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            clone, = structure_cloning.clone_structures([original], hash_suffix='_copy')
+
+        self.assertEqual(clone.name, 'Group (Copy)')
+        self.assertEqual(clone.status, 'DRAFTING')
+        self.assertEqual(
+            sorted(clone.entity_ownerships.values_list('owned_entity__name', 'hash_number')),
+            [('Holding', 'H1_copy'), ('OpCo', '')]
+        )
+
+        leaf = clone.nodes.get(custom_name='Node 2')
+        self.assertEqual([node.custom_name for node in leaf.get_ancestors()], ['Node 0', 'Node 1'])
+        self.assertEqual(leaf.get_root().structure_id, clone.pk)
+        owner = NodeOwnership.objects.get(owned_node=leaf).owner_node
+        self.assertEqual((owner.structure_id, owner.custom_name), (clone.pk, 'Node 1'))
+        self.assertEqual(NodeOwnership.objects.filter(owned_node__structure=original).count(), 3)
+
+        clone.refresh_from_db()
+        self.assertEqual(clone.tax_impacts, 'Withholding tax')
+        self.assertFalse(clone.refresh_validation_fields())
+        self.assertEqual(StructureMetrics.objects.get(structure=clone).entities_count, 2)
+
+    def test_query_count_independent_of_structure_count(self):
+        originals = [self.build(f'Group {number}') for number in range(6)]
+
+        with CaptureQueriesContext(connection) as one:
+            structure_cloning.clone_structures(originals[:1])
+        with CaptureQueriesContext(connection) as many:
+            clones = structure_cloning.clone_structures(Structure.objects.filter(pk__in=[s.pk for s in originals]))
+
+        self.assertEqual(len(clones), 6)
+        self.assertEqual(len(many), len(one) + 1)  # + loading the queryset
+        self.assertEqual(StructureNode.objects.filter(structure__in=clones).count(), 18)
+
+    def test_nodes_unreachable_from_a_root_are_copied(self):
+        original = self.build('Group', depth=1)
+        other = self.build('Other', depth=1)
+        stray = StructureNode.objects.create(
+            structure=original, entity_template=self.opco, custom_name='Stray',
+            total_shares=100, level=1, parent_node=other.nodes.get()
+        )
+        first, second, below = (
+            StructureNode.objects.create(
+                structure=original, entity_template=self.opco, custom_name=name, total_shares=100, level=1
+            )
+            for name in ('First', 'Second', 'Below')
+        )
+        # Corrupt hierarchy written behind save()'s back: First <-> Second, Below under Second
+        StructureNode.objects.filter(pk=first.pk).update(parent_node=second)
+        StructureNode.objects.filter(pk__in=[second.pk, below.pk]).update(parent_node=first)
+        StructureNode.objects.filter(pk=below.pk).update(parent_node=second)
+        NodeOwnership.objects.create(owner_node=second, owned_node=first, ownership_percentage=50, owned_shares=50)
+
+        clone, = structure_cloning.clone_structures([original])
+
+        copies = {node.custom_name: node for node in clone.nodes.all()}
+        self.assertEqual(sorted(copies), ['Below', 'First', 'Node 0', 'Second', 'Stray'])
+        self.assertEqual((copies['Stray'].parent_node_id, copies['Stray'].level), (None, 1))
+        for node in copies.values():
+            ancestors = list(node.get_ancestors())
+            self.assertEqual(node.level, len(ancestors) + 1)
+            self.assertTrue(all(ancestor.structure_id == clone.pk for ancestor in ancestors))
+        self.assertEqual(copies['Below'].parent_node_id, copies['Second'].pk)
+        ownership = NodeOwnership.objects.get(owned_node=copies['First'])
+        self.assertEqual(ownership.owner_node_id, copies['Second'].pk)
@@ -0,0 +1,154 @@
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from corporate import structure_metrics
+from corporate.models import Entity, EntityOwnership, NodeOwnership, Structure, StructureMetrics, StructureNode
+from parties.models import Party
+
+
+class StructureMetricsTest(TestCase):
+    def setUp(self):
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.holding, self.opco = (Entity.objects.create(name=name) for name in ('Holding', 'OpCo'))
+
+    def build(self, name, execute=True):
+        structure = Structure.objects.create(name=name, description='Test')
+        with self.captureOnCommitCallbacks(execute=execute):
+            EntityOwnership.objects.create(
+                structure=structure, owner_ubo=self.party, owned_entity=self.holding,
+                ownership_percentage=100, corporate_name='Holding',
+                total_value_usd=1000, total_value_eur=900
+            )
+            EntityOwnership.objects.create(
+                structure=structure, owner_entity=self.holding, owned_entity=self.opco,
+                ownership_percentage=60, corporate_name='OpCo'
+            )
+        return structure
+
+    def test_metrics_refreshed_after_commit(self):
+        structure = self.build('Group')
+
+        metrics = StructureMetrics.objects.get(structure=structure)
+        self.assertEqual(metrics.entities_count, 2)
+        self.assertEqual(metrics.complete_entities_count, 1)
+        self.assertEqual(metrics.completion_percentage, Decimal('50.00'))
+        self.assertEqual(metrics.max_depth, 2)
+        self.assertEqual(metrics.party_count, 1)
+        self.assertEqual(metrics.total_value_usd, Decimal('1000.00'))
+        self.assertEqual(metrics.total_value_eur, Decimal('900.00'))
+        self.assertEqual(metrics.validation_status, 'warning')
+
+        annotated = structure_metrics.with_metrics(Structure.objects.all()).get(pk=structure.pk)
+        self.assertEqual((annotated.entities_total, annotated.completion, annotated.depth), (2, Decimal('50'), 2))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:corporate_structure_changelist')
+        for number in range(3):
+            self.build(f'Group {number}')
+
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for number in range(3, 15):
+            self.build(f'Group {number}')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, {'o': '-5'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(many), len(few))
+
+    def test_status_filter_reads_stored_column(self):
+        empty = Structure.objects.create(name='Empty', description='Test')
+        partial = self.build('Partial')
+        with self.captureOnCommitCallbacks(execute=True):
+            EntityOwnership.objects.filter(structure=partial, owned_entity=self.opco).update(ownership_percentage=100)
+            structure_metrics.schedule_refresh(partial.id)
+
+        self.assertEqual(
+            list(Structure.objects.filter(metrics__validation_status='invalid')), [empty]
+        )
+        self.assertEqual(
+            list(Structure.objects.filter(metrics__validation_status='valid')), [partial]
+        )
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(
+            reverse('admin:corporate_structure_changelist'), {'metrics__validation_status__exact': 'valid'}
+        )
+        self.assertContains(response, '📝 Partial')
+        self.assertNotContains(response, '📝 Empty')
+
+    def test_migration_backfills_existing_structures(self):
+        structure = self.build('Group', execute=False)
+        StructureMetrics.objects.all().delete()  # structures created before the table existed
+
+        import_module('corporate.migrations.0010_structuremetrics').build_metrics(apps, None)
+
+        metrics = StructureMetrics.objects.get(structure=structure)
+        self.assertEqual(
+            (metrics.entities_count, metrics.complete_entities_count, metrics.completion_percentage, metrics.max_depth),
+            (2, 1, Decimal('50.00'), 2)
+        )
+
+    def build_irregular(self):
+        """Cross-holding (Holding over 100%), an ownerless row and a chain below the cycle"""
+        structure = self.build('Irregular', execute=False)
+        subsidiary = Entity.objects.create(name='Subsidiary')
+        for owner, owned, percentage in [(self.opco, self.holding, 50), (self.opco, subsidiary, 100), (None, subsidiary, 30)]:
+            EntityOwnership.objects.create(
+                structure=structure, owner_entity=owner, owned_entity=owned,
+                ownership_percentage=percentage, corporate_name=owned.name, total_value_usd=10
+            )
+        return structure
+
+    def test_migration_backfill_matches_live_metrics(self):
+        structure = self.build_irregular()
+        StructureMetrics.objects.all().delete()
+
+        import_module('corporate.migrations.0010_structuremetrics').build_metrics(apps, None)
+
+        fields = ('entities_count', 'complete_entities_count', 'completion_percentage', 'max_depth')
+        expected = structure_metrics.compute(structure.id)
+        self.assertEqual(
+            StructureMetrics.objects.filter(structure=structure).values(*fields).get(),
+            {field: expected[field] for field in fields}
+        )
+
+    def test_status_migration_backfills_existing_structures(self):
+        structure = self.build('Group', execute=False)
+        self.assertEqual(StructureMetrics.objects.get(structure=structure).validation_status, 'invalid')
+
+        import_module('corporate.migrations.0011_structuremetrics_totals_and_status').build_metrics(apps, None)
+
+        metrics = StructureMetrics.objects.get(structure=structure)
+        self.assertEqual(metrics.validation_status, 'warning')
+        self.assertEqual((metrics.party_count, metrics.over_allocated_count), (1, 0))
+        self.assertEqual((metrics.total_value_usd, metrics.total_value_eur), (Decimal('1000.00'), Decimal('900.00')))
+
+    def test_status_migration_backfill_matches_live_metrics(self):
+        structure = self.build_irregular()
+        node = StructureNode.objects.create(
+            entity_template=self.opco, structure=structure, custom_name='Node', total_shares=100, level=1
+        )
+        NodeOwnership.objects.create(
+            owner_party=Party.objects.create(name='Investor', person_type='NATURAL_PERSON'), owned_node=node,
+            ownership_percentage=10, owned_shares=10, share_value_usd=Decimal('2.50')
+        )
+
+        import_module('corporate.migrations.0011_structuremetrics_totals_and_status').build_metrics(apps, None)
+
+        fields = ('over_allocated_count', 'party_count', 'total_value_usd', 'total_value_eur', 'validation_status')
+        expected = structure_metrics.compute(structure.id)
+        self.assertEqual(expected['validation_status'], 'invalid')
+        self.assertEqual(
+            StructureMetrics.objects.filter(structure=structure).values(*fields).get(),
+            {field: expected[field] for field in fields}
+        )
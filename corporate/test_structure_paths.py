@@ -0,0 +1,97 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from corporate.models import Entity, Structure, StructureNode
+
+
+class StructureNodePathTest(TestCase):
+    def setUp(self):
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        self.entity = Entity.objects.create(name='Wyoming LLC')
+
+    def add(self, name, parent=None):
+        return StructureNode.objects.create(
+            entity_template=self.entity, structure=self.structure, custom_name=name,
+            total_shares=1000, level=99, parent_node=parent
+        )
+
+    def test_paths_and_levels_follow_parents(self):
+        root = self.add('Root')
+        child = self.add('Child', root)
+        grandchild = self.add('Grandchild', child)
+
+        self.assertEqual(grandchild.path, f'{root.pk}/{child.pk}/{grandchild.pk}/')
+        self.assertEqual([root.level, child.level, grandchild.level], [1, 2, 3])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(list(grandchild.get_ancestors()), [root, child])
+        with self.assertNumQueries(1):
+            self.assertEqual({node.pk for node in root.get_descendants()}, {child.pk, grandchild.pk})
+
+    def test_move_rewrites_subtree(self):
+        first = self.add('First')
+        second = self.add('Second')
+        branch = self.add('Branch', first)
+        leaf = self.add('Leaf', branch)
+
+        branch.parent_node = second
+        branch.save()
+
+        leaf.refresh_from_db()
+        self.assertEqual(leaf.path, f'{second.pk}/{branch.pk}/{leaf.pk}/')
+        self.assertEqual(leaf.level, 3)
+        self.assertFalse(first.get_descendants().exists())
+
+        # Moving to the top level shortens the subtree
+        branch.parent_node = None
+        branch.save()
+        leaf.refresh_from_db()
+        self.assertEqual((leaf.path, leaf.level), (f'{branch.pk}/{leaf.pk}/', 2))
+
+        branch.parent_node = leaf
+        with self.assertRaises(ValidationError):
+            branch.save()
+
+    def test_child_saved_under_stale_parent_instance(self):
+        first = self.add('First')
+        second = self.add('Second')
+        branch = self.add('Branch', first)
+        stale_leaf = self.add('Leaf', branch)
+
+        # Moving the branch through another instance leaves stale_leaf.parent_node outdated
+        moved = StructureNode.objects.get(pk=branch.pk)
+        moved.parent_node = second
+        moved.save()
+
+        child = self.add('Child', stale_leaf.parent_node)
+        self.assertEqual(child.path, f'{second.pk}/{branch.pk}/{child.pk}/')
+        self.assertEqual(child.level, 3)
+
+    def test_stale_node_moved_after_ancestor_move(self):
+        first = self.add('First')
+        second = self.add('Second')
+        branch = self.add('Branch', first)
+        stale_leaf = self.add('Leaf', branch)
+        below = self.add('Below', stale_leaf)
+
+        moved = StructureNode.objects.get(pk=branch.pk)
+        moved.parent_node = second
+        moved.save()
+
+        # stale_leaf still holds its pre-move path when it is re-parented
+        stale_leaf.parent_node = first
+        stale_leaf.save()
+
+        below.refresh_from_db()
+        self.assertEqual(below.path, f'{first.pk}/{stale_leaf.pk}/{below.pk}/')
+        self.assertEqual(below.level, 3)
+
+    def test_rebuild_paths(self):
+        root = self.add('Root')
+        child = self.add('Child', root)
+        StructureNode.objects.update(path='', level=7)
+
+        self.assertEqual(StructureNode.rebuild_paths(self.structure), 2)
+        child.refresh_from_db()
+        self.assertEqual((child.path, child.level), (f'{root.pk}/{child.pk}/', 2))
+        self.assertEqual(StructureNode.rebuild_paths(self.structure), 0)
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from corporate import structure_snapshots
+from corporate.models import Entity, EntityOwnership, Structure, StructureSnapshot, StructureSnapshotParty
+from corporate.views_party_dashboard import generate_timeline_data
+from parties.models import Party
+
+
+class StructureSnapshotTest(TestCase):
+    def setUp(self):
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.holding, self.operating = (Entity.objects.create(name=name) for name in ('Holding', 'OpCo'))
+
+    def own(self, owned, percentage, owner_entity=None, owner_ubo=None):
+        return EntityOwnership.objects.create(
+            structure=self.structure, owner_entity=owner_entity, owner_ubo=owner_ubo,
+            owned_entity=owned, ownership_percentage=percentage, corporate_name=owned.name
+        )
+
+    def test_versions_store_deltas_and_rebuild_any_state(self):
+        holding = self.own(self.holding, 100, owner_ubo=self.party)
+        first = structure_snapshots.record(self.structure.id)
+        self.assertIsNone(structure_snapshots.record(self.structure.id))
+
+        self.own(self.operating, 60, owner_entity=self.holding)
+        holding.ownership_percentage = 80
+        holding.save()
+        second = structure_snapshots.record(self.structure.id)
+
+        self.assertTrue(first.is_checkpoint)
+        self.assertFalse(second.is_checkpoint)
+        self.assertEqual(structure_snapshots.decode(second.payload), {
+            'added': {f'e{self.holding.id}>e{self.operating.id}': '60.00'},
+            'removed': [],
+            'changed': {f'p{self.party.id}>e{self.holding.id}': ['100.00', '80.00']},
+        })
+
+        with self.assertNumQueries(2):
+            state = structure_snapshots.state_at(self.structure.id, version=2)
+        self.assertEqual(state, structure_snapshots.capture_state(self.structure.id))
+        self.assertEqual(structure_snapshots.state_at(self.structure.id, version=1),
+                         {f'p{self.party.id}>e{self.holding.id}': '100.00'})
+
+        delta = structure_snapshots.diff_versions(self.structure.id, 2, 1)
+        self.assertEqual(delta['removed'], [f'e{self.holding.id}>e{self.operating.id}'])
+
+    def test_checkpoints_bound_replay_length(self):
+        ownership = self.own(self.holding, 1, owner_ubo=self.party)
+        for percentage in range(1, StructureSnapshot.CHECKPOINT_INTERVAL + 3):
+            ownership.ownership_percentage = percentage
+            ownership.save()
+            structure_snapshots.record(self.structure.id)
+
+        versions = StructureSnapshot.objects.filter(structure=self.structure, is_checkpoint=True)
+        self.assertEqual(list(versions.values_list('version', flat=True)),
+                         [1, StructureSnapshot.CHECKPOINT_INTERVAL + 1])
+        latest = structure_snapshots.latest_version(self.structure.id)
+        self.assertEqual(structure_snapshots.state_at(self.structure.id, version=latest),
+                         structure_snapshots.capture_state(self.structure.id))
+
+    def test_rows_without_owner_are_not_recorded(self):
+        self.own(self.holding, 100, owner_ubo=self.party)
+        self.own(self.operating, 30)
+        structure_snapshots.record(self.structure.id)
+
+        self.assertEqual(structure_snapshots.capture_state(self.structure.id), {
+            f'p{self.party.id}>e{self.holding.id}': '100.00',
+        })
+        self.assertEqual(structure_snapshots.party_ids(structure_snapshots.state_at(self.structure.id)), {
+            self.party.id
+        })
+
+    def test_timeline_keeps_structures_the_party_sold(self):
+        now = timezone.now()
+        ownership = self.own(self.holding, 60, owner_ubo=self.party)
+        structure_snapshots.record(self.structure.id)
+        ownership.delete()
+        structure_snapshots.record(self.structure.id)
+        StructureSnapshot.objects.filter(version=1).update(created_at=now - timedelta(days=100))
+
+        self.assertEqual(structure_snapshots.party_structure_ids(self.party.id), [self.structure.id])
+        timeline = generate_timeline_data(self.party)
+        self.assertIn(60.0, timeline['data'])
+        self.assertEqual(timeline['data'][-1], 0.0)
+
+    def test_migration_collects_parties_from_recorded_versions(self):
+        ownership = self.own(self.holding, 60, owner_ubo=self.party)
+        structure_snapshots.record(self.structure.id)
+        ownership.delete()
+        structure_snapshots.record(self.structure.id)
+        StructureSnapshotParty.objects.all().delete()
+
+        import_module('corporate.migrations.0012_structuresnapshotparty').collect_parties(apps, None)
+
+        self.assertEqual(
+            list(StructureSnapshotParty.objects.values_list('structure_id', 'party_id', 'first_version')),
+            [(self.structure.id, self.party.id, 1)]
+        )
+
+    def test_changes_in_one_transaction_record_one_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.own(self.holding, 100, owner_ubo=self.party)
+            self.own(self.operating, 50, owner_entity=self.holding)
+
+        self.assertEqual(self.structure.snapshots.count(), 1)
+        self.assertEqual(self.structure.snapshots.get().edge_count, 2)
+
+    def test_timeline_and_history_api_use_recorded_versions(self):
+        now = timezone.now()
+        ownership = self.own(self.holding, 40, owner_ubo=self.party)
+        structure_snapshots.record(self.structure.id)
+        ownership.ownership_percentage = 75
+        ownership.save()
+        structure_snapshots.record(self.structure.id)
+        StructureSnapshot.objects.filter(version=1).update(created_at=now - timedelta(days=100))
+
+        timeline = generate_timeline_data(self.party)
+        self.assertEqual(len(timeline['labels']), 12)
+        self.assertIsNone(timeline['data'][0])
+        self.assertIn(40.0, timeline['data'])
+        self.assertEqual(timeline['data'][-1], 75.0)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get(reverse('corporate:structure_history_api', args=[self.structure.id]))
+        data = response.json()
+        self.assertEqual([row['version'] for row in data['versions']], [2, 1])
+        self.assertEqual(data['diff']['changed'], {f'p{self.party.id}>e{self.holding.id}': ['40.00', '75.00']})
@@ -0,0 +1,68 @@
+import json
+from decimal import Decimal
+
+from django.test import RequestFactory, TestCase
+
+from corporate.models import Entity, EntityOwnership, Structure
+from corporate.views import save_ownership_relationships
+from parties.models import Party
+
+
+class SaveOwnershipRelationshipsTest(TestCase):
+    def setUp(self):
+        self.structure = Structure.objects.create(name='Group', description='Test')
+        self.party = Party.objects.create(name='Owner', person_type='NATURAL_PERSON')
+        self.holding = Entity.objects.create(name='Holding', total_shares=1000)
+        self.opco = Entity.objects.create(name='OpCo', total_shares=200)
+        self.spv = Entity.objects.create(name='SPV')
+
+    def save(self, ownerships):
+        request = RequestFactory().post('/')
+        response = save_ownership_relationships(request, {'ownerships': ownerships}, self.structure.id)
+        return json.loads(response.content)
+
+    def payload(self, opco_percentage=60):
+        return [
+            {'owner_ubo_id': self.party.id, 'owned_entity_id': self.holding.id, 'percentage': 100,
+             'corporate_name': 'Holding', 'share_value_usd': '2.50'},
+            {'owner_entity_id': self.holding.id, 'owned_entity_id': self.opco.id, 'percentage': opco_percentage,
+             'corporate_name': 'OpCo'},
+            {'owner_entity_id': self.holding.id, 'owned_entity_id': self.spv.id, 'percentage': '33.333',
+             'corporate_name': 'SPV'},
+        ]
+
+    def test_first_save_creates_rows_with_derived_fields(self):
+        with self.assertNumQueries(7):
+            result = self.save(self.payload())
+
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['summary'], {'created': 3, 'updated': 0, 'deleted': 0, 'unchanged': 0})
+        holding = EntityOwnership.objects.get(owned_entity=self.holding)
+        self.assertEqual(holding.owned_shares, 1000)
+        self.assertEqual(holding.total_value_usd, Decimal('2500.00'))
+        self.assertEqual(EntityOwnership.objects.get(owned_entity=self.opco).owned_shares, 120)
+
+    def test_resave_writes_only_differences(self):
+        self.save(self.payload())
+        unchanged = EntityOwnership.objects.get(owned_entity=self.holding)
+
+        ownerships = self.payload(opco_percentage=40)[:2]
+        result = self.save(ownerships)
+
+        self.assertEqual(result['summary'], {'created': 0, 'updated': 1, 'deleted': 1, 'unchanged': 1})
+        self.assertEqual(EntityOwnership.objects.get(owned_entity=self.holding).updated_at, unchanged.updated_at)
+        self.assertEqual(EntityOwnership.objects.get(owned_entity=self.opco).ownership_percentage, Decimal('40.00'))
+        self.assertFalse(EntityOwnership.objects.filter(owned_entity=self.spv).exists())
+
+        self.assertEqual(self.save(ownerships)['summary']['unchanged'], 2)
+
+    def test_unknown_reference_rolls_back(self):
+        self.save(self.payload())
+        ownerships = self.payload()
+        ownerships.append({'owner_ubo_id': 999999, 'owned_entity_id': self.opco.id, 'percentage': 10})
+
+        result = self.save(ownerships[1:])
+
+        self.assertFalse(result['success'])
+        self.assertIn('Party matching query does not exist', result['error'])
+        self.assertEqual(EntityOwnership.objects.count(), 3)
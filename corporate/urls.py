@@ -18,6 +18,9 @@ from .views_ownership_matrix import (
     update_ownership_api,
     delete_ownership_api,
     validate_ownership_matrix_api,
+    effective_ownership_api,
+    ownership_chain_api,
+    structure_history_api,
     export_ownership_matrix_api
 )
 from .views_party_dashboard import (
@@ -30,13 +33,17 @@ from .views_organogram_printing import (
     organogram_printing_view,
     generate_organogram_report,
     download_report,
-    preview_organogram
+    generate_batch_report,
+    preview_organogram,
+    report_job_status,
+    download_report_job
 )
 from .admin_navigation import sirius_main_dashboard
 from .views_organogram_builder import (
     organogram_builder_view,
     organogram_builder_structure,
     organogram_builder_api,
+    organogram_builder_batch_api,
     get_structure_data_api
 )
 
@@ -50,6 +57,7 @@ urlpatterns = [
     path('build-organogram/', organogram_builder_view, name='organogram_builder'),
     path('build-organogram/<int:structure_id>/', organogram_builder_structure, name='organogram_builder_structure'),
     path('organogram-builder-api/', organogram_builder_api, name='organogram_builder_api'),
+    path('organogram-builder-api/batch/', organogram_builder_batch_api, name='organogram_builder_batch_api'),
     path('api/structure-data/<int:structure_id>/', get_structure_data_api, name='get_structure_data_api'),
     
     # Original entity library
@@ -81,6 +89,9 @@ urlpatterns = [
     path('api/ownership/<int:ownership_id>/delete/', delete_ownership_api, name='delete_ownership_api'),
     path('api/validate-ownership-matrix/', validate_ownership_matrix_api, name='validate_ownership_matrix_api'),
     path('api/export-ownership-matrix/', export_ownership_matrix_api, name='export_ownership_matrix_api'),
+    path('api/effective-ownership/<int:structure_id>/', effective_ownership_api, name='effective_ownership_api'),
+    path('api/ownership-chain/<str:kind>/<int:object_id>/', ownership_chain_api, name='ownership_chain_api'),
+    path('api/structure-history/<int:structure_id>/', structure_history_api, name='structure_history_api'),
     
     # Party Ownership Dashboard (Fase 4)
     path('party-dashboard/', party_ownership_dashboard, name='party_ownership_dashboard'),
@@ -94,4 +105,7 @@ urlpatterns = [
     path('api/generate-organogram-report/', generate_organogram_report, name='generate_organogram_report'),
     path('api/preview-organogram/', preview_organogram, name='preview_organogram'),
     path('download-report/<str:filename>/', download_report, name='download_report'),
+    path('api/batch-report/', generate_batch_report, name='generate_batch_report'),
+    path('api/report-jobs/<int:job_id>/', report_job_status, name='report_job_status'),
+    path('report-jobs/<int:job_id>/download/', download_report_job, name='download_report_job'),
 ]
\ No newline at end of file
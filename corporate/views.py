@@ -10,9 +10,15 @@ from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.utils import timezone
+from collections import defaultdict
+from decimal import Decimal
 import json
 
 from .models import Structure, Entity, EntityOwnership, ValidationRule
+from .ownership_graph import ENTITY, ENTITY_OWNERSHIP_FIELDS, OwnershipGraph
+from .signals import invalidate_structure_caches
+from .structure_cloning import clone_structures
 from parties.models import Party
 
 
@@ -149,56 +155,135 @@ def save_entities_ubos(request, data, structure_id):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+# Fields the wizard writes; compared against the stored row to skip unchanged ownerships
+WIZARD_OWNERSHIP_FIELDS = (
+    'ownership_percentage', 'owned_shares', 'corporate_name', 'hash_number',
+    'share_value_usd', 'share_value_eur', 'total_value_usd', 'total_value_eur',
+)
+
+
+def _wizard_field_value(field_name, value):
+    """Coerce a submitted value the way the database will store it"""
+    field = EntityOwnership._meta.get_field(field_name)
+    value = field.to_python(value)
+    if isinstance(value, Decimal):
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
+
+
 def save_ownership_relationships(request, data, structure_id):
-    """Save ownership relationships"""
+    """
+    Save ownership relationships.
+    The submitted list replaces the structure's ownerships: rows are matched
+    to existing ones by (owner, owned entity) and only the differences are
+    written, with one bulk_create, one bulk_update and one delete.
+    """
     try:
         with transaction.atomic():
             structure = get_object_or_404(Structure, pk=structure_id)
+            ownerships = data.get('ownerships', [])
             
-            # Clear existing ownerships
-            structure.entity_ownerships.all().delete()
+            # Everything referenced, in two queries
+            entities = Entity.objects.in_bulk({
+                entity_id
+                for ownership_data in ownerships
+                for entity_id in (ownership_data.get('owned_entity_id'), ownership_data.get('owner_entity_id'))
+                if entity_id
+            })
+            parties = Party.objects.in_bulk({
+                ownership_data['owner_ubo_id'] for ownership_data in ownerships if ownership_data.get('owner_ubo_id')
+            })
             
-            ownerships = data.get('ownerships', [])
+            existing = defaultdict(list)
+            for ownership in structure.entity_ownerships.order_by('id'):
+                existing[ownership.owner_ubo_id, ownership.owner_entity_id, ownership.owned_entity_id].append(ownership)
+            
+            to_create = []
+            to_update = []
+            unchanged = 0
+            now = timezone.now()
             
             for ownership_data in ownerships:
-                ownership = EntityOwnership()
-                ownership.structure = structure
+                ownership = EntityOwnership(structure=structure)
                 
                 # Set owned entity
                 owned_entity_id = ownership_data.get('owned_entity_id')
-                if owned_entity_id:
-                    ownership.owned_entity = Entity.objects.get(pk=owned_entity_id)
+                ownership.owned_entity = _referenced(entities, Entity, owned_entity_id)
                 
                 # Set owner (UBO or Entity)
                 owner_ubo_id = ownership_data.get('owner_ubo_id')
                 owner_entity_id = ownership_data.get('owner_entity_id')
                 
                 if owner_ubo_id:
-                    ownership.owner_ubo = Party.objects.get(pk=owner_ubo_id)
+                    ownership.owner_ubo = _referenced(parties, Party, owner_ubo_id)
                 elif owner_entity_id:
-                    ownership.owner_entity = Entity.objects.get(pk=owner_entity_id)
+                    ownership.owner_entity = _referenced(entities, Entity, owner_entity_id)
                 
-                # Set ownership details
-                ownership.ownership_percentage = ownership_data.get('percentage', 0)
-                ownership.owned_shares = ownership_data.get('shares')
+                # Set ownership details and share values
+                ownership.ownership_percentage = _wizard_field_value('ownership_percentage', ownership_data.get('percentage', 0))
+                ownership.owned_shares = _wizard_field_value('owned_shares', ownership_data.get('shares'))
                 ownership.corporate_name = ownership_data.get('corporate_name', '')
                 ownership.hash_number = ownership_data.get('hash_number', '')
+                ownership.share_value_usd = _wizard_field_value('share_value_usd', ownership_data.get('share_value_usd'))
+                ownership.share_value_eur = _wizard_field_value('share_value_eur', ownership_data.get('share_value_eur'))
                 
-                # Set share values
-                ownership.share_value_usd = ownership_data.get('share_value_usd')
-                ownership.share_value_eur = ownership_data.get('share_value_eur')
+                ownership.apply_derived_fields()
+                for field_name in WIZARD_OWNERSHIP_FIELDS:
+                    setattr(ownership, field_name, _wizard_field_value(field_name, getattr(ownership, field_name)))
                 
-                ownership.save()
+                matches = existing.get((ownership.owner_ubo_id, ownership.owner_entity_id, ownership.owned_entity_id))
+                if not matches:
+                    ownership.created_at = ownership.updated_at = now
+                    to_create.append(ownership)
+                    continue
+                
+                current = matches.pop(0)
+                changed = [
+                    field_name for field_name in WIZARD_OWNERSHIP_FIELDS
+                    if getattr(current, field_name) != getattr(ownership, field_name)
+                ]
+                if not changed:
+                    unchanged += 1
+                    continue
+                for field_name in WIZARD_OWNERSHIP_FIELDS:
+                    setattr(current, field_name, getattr(ownership, field_name))
+                current.updated_at = now
+                to_update.append(current)
+            
+            to_delete = [ownership.pk for rows in existing.values() for ownership in rows]
+            if to_delete:
+                EntityOwnership.objects.filter(pk__in=to_delete).delete()
+            if to_update:
+                EntityOwnership.objects.bulk_update(to_update, WIZARD_OWNERSHIP_FIELDS + ('updated_at',))
+            if to_create:
+                EntityOwnership.objects.bulk_create(to_create)
+            
+            if to_delete or to_update or to_create:
+                invalidate_structure_caches(structure.id)
             
             return JsonResponse({
                 'success': True,
-                'message': f'Saved {len(ownerships)} ownership relationships'
+                'message': f'Saved {len(ownerships)} ownership relationships',
+                'summary': {
+                    'created': len(to_create),
+                    'updated': len(to_update),
+                    'deleted': len(to_delete),
+                    'unchanged': unchanged,
+                }
             })
             
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+def _referenced(instances, model, pk):
+    """Prefetched instance for a submitted id, raising DoesNotExist like objects.get()"""
+    try:
+        return instances[int(pk)]
+    except (KeyError, TypeError, ValueError):
+        raise model.DoesNotExist(f'{model.__name__} matching query does not exist.')
+
+
 def validate_and_preview(request, data, structure_id):
     """Validate structure and generate preview"""
     try:
@@ -297,53 +382,57 @@ def generate_structure_preview(structure):
         'summary': {}
     }
     
+    rows = list(structure.entity_ownerships.values(
+        *ENTITY_OWNERSHIP_FIELDS,
+        'owner_ubo__name', 'owner_entity__name',
+        'owned_entity__name', 'owned_entity__entity_type', 'owned_entity__jurisdiction',
+        'owned_shares', 'corporate_name', 'hash_number'
+    ))
+    graph = OwnershipGraph.from_rows(rows)
+    
     # Get entities
     entities = {}
-    for ownership in structure.entity_ownerships.select_related('owned_entity'):
-        entity = ownership.owned_entity
-        if entity.id not in entities:
-            entities[entity.id] = {
-                'id': entity.id,
-                'name': entity.name,
-                'type': entity.entity_type,
-                'jurisdiction': entity.jurisdiction,
-                'total_ownership': 0,
+    for row in rows:
+        entity_id = row['owned_entity_id']
+        if entity_id not in entities:
+            entities[entity_id] = {
+                'id': entity_id,
+                'name': row['owned_entity__name'],
+                'type': row['owned_entity__entity_type'],
+                'jurisdiction': row['owned_entity__jurisdiction'],
+                # Rows without an owner are not edges of the graph; total_owned() gives 0
+                'total_ownership': graph.total_owned((ENTITY, entity_id)),
                 'owners': []
             }
     
     # Get ownerships
-    for ownership in structure.entity_ownerships.select_related('owner_ubo', 'owner_entity', 'owned_entity'):
+    for row in rows:
         owner_name = ''
         owner_type = ''
         
-        if ownership.owner_ubo:
-            owner_name = ownership.owner_ubo.name
+        if row['owner_ubo_id']:
+            owner_name = row['owner_ubo__name']
             owner_type = 'UBO'
-        elif ownership.owner_entity:
-            owner_name = ownership.owner_entity.name
+        elif row['owner_entity_id']:
+            owner_name = row['owner_entity__name']
             owner_type = 'Entity'
         
         ownership_data = {
             'owner_name': owner_name,
             'owner_type': owner_type,
-            'owned_entity': ownership.owned_entity.name,
-            'percentage': ownership.ownership_percentage,
-            'shares': ownership.owned_shares,
-            'corporate_name': ownership.corporate_name,
-            'hash_number': ownership.hash_number
+            'owned_entity': row['owned_entity__name'],
+            'percentage': row['ownership_percentage'],
+            'shares': row['owned_shares'],
+            'corporate_name': row['corporate_name'],
+            'hash_number': row['hash_number']
         }
         
         preview['ownerships'].append(ownership_data)
-        
-        # Update entity ownership total
-        entity_id = ownership.owned_entity.id
-        if entity_id in entities:
-            entities[entity_id]['total_ownership'] += ownership.ownership_percentage or 0
-            entities[entity_id]['owners'].append({
-                'name': owner_name,
-                'type': owner_type,
-                'percentage': ownership.ownership_percentage
-            })
+        entities[row['owned_entity_id']]['owners'].append({
+            'name': owner_name,
+            'type': owner_type,
+            'percentage': row['ownership_percentage']
+        })
     
     preview['entities'] = list(entities.values())
     
@@ -353,7 +442,9 @@ def generate_structure_preview(structure):
         'total_ownerships': len(preview['ownerships']),
         'complete_entities': sum(1 for e in entities.values() if e['total_ownership'] == 100),
         'incomplete_entities': sum(1 for e in entities.values() if 0 < e['total_ownership'] < 100),
-        'over_allocated_entities': sum(1 for e in entities.values() if e['total_ownership'] > 100)
+        'over_allocated_entities': sum(1 for e in entities.values() if e['total_ownership'] > 100),
+        'hierarchy_depth': graph.max_depth(),
+        'circular_references': len(graph.cycles())
     }
     
     return preview
@@ -460,35 +551,15 @@ def get_structure_data(request, structure_id):
 def duplicate_structure(request, structure_id):
     """Duplicate an existing structure"""
     try:
-        with transaction.atomic():
-            original = get_object_or_404(Structure, pk=structure_id)
-            
-            # Create duplicate
-            duplicate = Structure.objects.create(
-                name=f"{original.name} (Copy)",
-                description=f"Copy of {original.description}",
-                status='drafting'
-            )
-            
-            # Copy ownerships
-            for ownership in original.entity_ownerships.all():
-                EntityOwnership.objects.create(
-                    structure=duplicate,
-                    owner_ubo=ownership.owner_ubo,
-                    owner_entity=ownership.owner_entity,
-                    owned_entity=ownership.owned_entity,
-                    ownership_percentage=ownership.ownership_percentage,
-                    owned_shares=ownership.owned_shares,
-                    corporate_name=ownership.corporate_name,
-                    hash_number=f"{ownership.hash_number}_copy" if ownership.hash_number else None,
-                    share_value_usd=ownership.share_value_usd,
-                    share_value_eur=ownership.share_value_eur
-                )
-            
-            messages.success(request, f'Structure "{original.name}" duplicated successfully')
-            
-            return redirect('admin:corporate_structure_change', duplicate.id)
-            
+        original = get_object_or_404(Structure, pk=structure_id)
+        
+        # Structure, ownerships, nodes and node ownerships in bulk
+        duplicate, = clone_structures([original], hash_suffix='_copy')
+        
+        messages.success(request, f'Structure "{original.name}" duplicated successfully')
+        
+        return redirect('admin:corporate_structure_change', duplicate.id)
+        
     except Exception as e:
         messages.error(request, f'Error duplicating structure: {str(e)}')
         return redirect('admin:corporate_structure_changelist')
@@ -11,6 +11,7 @@ from django.db import transaction
 import json
 
 from .models import Structure, Entity, StructureNode, NodeOwnership
+from .organogram_batch import BatchOperationError, apply_operations
 from parties.models import Party
 
 
@@ -74,7 +75,7 @@ def organogram_builder_structure(request, structure_id):
             'level': node.level,
             'total_shares': node.total_shares,
             'corporate_name': node.corporate_name,
-            'parent_node_id': node.parent_node.id if node.parent_node else None,
+            'parent_node_id': node.parent_node_id,
         })
     
     ownerships_data = []
@@ -139,6 +140,38 @@ def organogram_builder_api(request):
     return JsonResponse({'success': False, 'error': 'Método não permitido'})
 
 
+@csrf_exempt
+@staff_member_required
+def organogram_builder_batch_api(request):
+    """
+    API em lote do organogram builder: aplica uma lista ordenada de operações
+    (mesmas ações de organogram_builder_api) numa única transação.
+    Operações add_* podem declarar um temp_id, referenciado pelas operações
+    seguintes no lugar do ID; a resposta traz o mapeamento temp_id -> ID.
+    """
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'})
+    
+    try:
+        data = json.loads(request.body)
+        structure = Structure.objects.get(id=data['structure_id'])
+        operations = data.get('operations') or []
+        
+        id_map, summary = apply_operations(structure, operations)
+        
+        return JsonResponse({
+            'success': True,
+            'id_map': id_map,
+            'summary': summary,
+            'message': f'{len(operations)} operações aplicadas com sucesso'
+        })
+    except BatchOperationError as e:
+        return JsonResponse({'success': False, 'error': str(e), 'operation_index': e.index})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+
 def create_structure_api(data):
     """Criar nova estrutura"""
     try:
@@ -166,19 +199,13 @@ def add_node_api(data):
             structure = Structure.objects.get(id=data['structure_id'])
             entity_template = Entity.objects.get(id=data['entity_template_id'])
             
-            # Determinar nível
-            level = 1
-            if data.get('parent_node_id'):
-                parent_node = StructureNode.objects.get(id=data['parent_node_id'])
-                level = parent_node.level + 1
-            
+            # Nível e path são derivados do parent_node em StructureNode.save()
             node = StructureNode.objects.create(
                 entity_template=entity_template,
                 structure=structure,
                 custom_name=data['custom_name'],
                 total_shares=data.get('total_shares', 1000),
                 corporate_name=data.get('corporate_name', ''),
-                level=level,
                 parent_node_id=data.get('parent_node_id')
             )
             
@@ -318,7 +345,7 @@ def get_structure_data_api(request, structure_id):
                 'entity_template_name': node.entity_template.name,
                 'level': node.level,
                 'total_shares': node.total_shares,
-                'parent_node_id': node.parent_node.id if node.parent_node else None,
+                'parent_node_id': node.parent_node_id,
             })
         
         # Buscar ownerships
@@ -9,6 +9,8 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.template.loader import render_to_string
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.db import models
+from django.urls import reverse
 import json
 import os
 from datetime import datetime
@@ -28,7 +30,8 @@ try:
 except ImportError:
     REPORTLAB_AVAILABLE = False
 
-from .models import Entity, Structure, EntityOwnership
+from . import batch_reports, report_cache, report_files, report_jobs, xlsx_export
+from .models import Entity, Structure, EntityOwnership, ReportJob
 from parties.models import Party
 
 
@@ -50,11 +53,15 @@ def organogram_printing_view(request):
     return render(request, 'admin/corporate/organogram_printing.html', context)
 
 
+REPORT_FORMATS = ('pdf', 'html', 'excel', 'powerpoint')
+
+
 @staff_member_required
 @csrf_exempt
 def generate_organogram_report(request):
     """
-    Generate organogram report in various formats
+    Queue an organogram report; the file is rendered by the report worker
+    (manage.py process_report_jobs) and polled through the job status endpoint
     """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Method not allowed'})
@@ -69,36 +76,93 @@ def generate_organogram_report(request):
         template = data.get('template', 'professional')
         options = data.get('options', {})
         
-        # Generate report based on parameters
+        structure = party = None
         if structure_id:
             structure = get_object_or_404(Structure, id=structure_id)
-            report_data = generate_structure_report_data(structure, options)
-            filename = f"organogram_{structure.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         elif party_id:
             party = get_object_or_404(Party, id=party_id)
-            report_data = generate_party_report_data(party, options)
-            filename = f"party_organogram_{party.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         else:
             return JsonResponse({'success': False, 'error': 'Structure or Party ID required'})
         
-        # Generate report in requested format
-        if format_type == 'pdf':
-            file_path = generate_pdf_report(report_data, template, filename, options)
-        elif format_type == 'html':
-            file_path = generate_html_report(report_data, template, filename, options)
-        elif format_type == 'excel':
-            file_path = generate_excel_report(report_data, filename, options)
-        elif format_type == 'powerpoint':
-            file_path = generate_powerpoint_report(report_data, template, filename, options)
-        else:
+        if format_type not in REPORT_FORMATS:
             return JsonResponse({'success': False, 'error': 'Unsupported format'})
         
+        job = report_jobs.enqueue(
+            structure=structure,
+            party=party,
+            report_type=report_type,
+            format_type=format_type,
+            template=template,
+            options=options,
+            user=request.user,
+        )
+        
+        if job.status == 'DONE':
+            # Unchanged data and options: the cached file is served straight away
+            return JsonResponse({
+                'success': True,
+                'message': 'Report ready',
+                **report_jobs.job_payload(job),
+            })
+        
         return JsonResponse({
             'success': True,
-            'message': 'Report generated successfully',
-            'download_url': f'/admin/corporate/download-report/{os.path.basename(file_path)}/',
-            'filename': os.path.basename(file_path)
+            'message': 'Report queued for generation',
+            **report_jobs.job_payload(job),
+            'download_url': reverse('corporate:download_report_job', args=[job.id]),
+        }, status=202)
+        
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
         })
+
+
+@staff_member_required
+@csrf_exempt
+def generate_batch_report(request):
+    """
+    Queue structure PDFs for many structures as one job, bundled as a zip
+    archive or a single merged PDF
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'})
+    
+    try:
+        data = json.loads(request.body)
+        
+        structure_ids = data.get('structure_ids') or []
+        output = data.get('output', 'zip')
+        if not structure_ids:
+            return JsonResponse({'success': False, 'error': 'Structure IDs required'})
+        if output not in batch_reports.BATCH_OUTPUTS:
+            return JsonResponse({'success': False, 'error': 'Unsupported output'})
+        
+        structure_ids = [int(structure_id) for structure_id in structure_ids]
+        found = set(Structure.objects.filter(id__in=structure_ids).values_list('id', flat=True))
+        missing = [structure_id for structure_id in structure_ids if structure_id not in found]
+        if missing:
+            return JsonResponse({'success': False, 'error': f'Structures not found: {missing}'}, status=404)
+        
+        job = report_jobs.enqueue(
+            report_type=batch_reports.BATCH_REPORT_TYPE,
+            format_type='pdf',
+            template=data.get('template', 'professional'),
+            options={
+                'structure_ids': structure_ids,
+                'output': output,
+                'report_options': data.get('options', {}),
+            },
+            user=request.user,
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'message': 'Report ready' if job.status == 'DONE' else 'Batch report queued for generation',
+            **report_jobs.job_payload(job),
+            'download_url': reverse('corporate:download_report_job', args=[job.id]),
+        }, status=200 if job.status == 'DONE' else 202)
         
     except Exception as e:
         return JsonResponse({
@@ -107,32 +171,113 @@ def generate_organogram_report(request):
         })
 
 
+def build_report(structure_id=None, party_id=None, report_type='structure_overview', format_type='pdf',
+                 template='professional', options=None, progress=None):
+    """
+    Render a report file and return its path.
+    Runs inside the report worker; ``progress(percent, message)`` reports back to the job.
+    """
+    options = options or {}
+    progress = progress or (lambda percent, message='': None)
+    
+    if report_type == batch_reports.BATCH_REPORT_TYPE:
+        return batch_reports.render_batch(
+            options.get('structure_ids', []),
+            template=template,
+            options=options.get('report_options'),
+            output=options.get('output', 'zip'),
+            progress=progress,
+        )
+    
+    progress(5, 'Collecting report data')
+    if structure_id:
+        structure = Structure.objects.get(id=structure_id)
+        filename = report_cache.report_filename(
+            structure=structure, report_type=report_type, format_type=format_type,
+            template=template, options=options
+        )
+    elif party_id:
+        party = Party.objects.get(id=party_id)
+        filename = report_cache.report_filename(
+            party=party, report_type=report_type, format_type=format_type,
+            template=template, options=options
+        )
+    else:
+        raise ValueError('Structure or Party ID required')
+    
+    # Another job may already have rendered the same data with the same options
+    cached_path = report_cache.lookup(filename)
+    if cached_path:
+        progress(95, 'Reusing cached report')
+        return cached_path
+    
+    if structure_id:
+        report_data = generate_structure_report_data(structure, options)
+    else:
+        report_data = generate_party_report_data(party, options)
+    
+    progress(40, f'Rendering {format_type} report')
+    partial = report_cache.partial_name(filename)
+    try:
+        if format_type == 'pdf':
+            file_path = generate_pdf_report(report_data, template, partial, options)
+        elif format_type == 'html':
+            file_path = generate_html_report(report_data, template, partial, options)
+        elif format_type == 'excel':
+            file_path = generate_excel_report(report_data, partial, options)
+        else:
+            file_path = generate_powerpoint_report(report_data, template, partial, options)
+    except Exception:
+        partial_path = os.path.join(report_cache.reports_dir(), partial + os.path.splitext(filename)[1])
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    
+    progress(95, 'Saving report')
+    return report_cache.store(file_path, filename)
+
+
 @staff_member_required
 def download_report(request, filename):
     """
     Download generated report
     """
     try:
-        file_path = os.path.join(settings.MEDIA_ROOT, 'reports', filename)
-        
-        if not os.path.exists(file_path):
-            return JsonResponse({'error': 'File not found'}, status=404)
+        return report_files.serve_report(request, filename)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@staff_member_required
+def report_job_status(request, job_id):
+    """
+    Status and progress of a queued report
+    """
+    job = get_object_or_404(ReportJob, id=job_id)
+    return JsonResponse({'success': True, 'job': report_jobs.job_payload(job)})
+
+
+@staff_member_required
+def download_report_job(request, job_id):
+    """
+    Download a queued report once the worker has finished it
+    """
+    try:
+        job = get_object_or_404(ReportJob, id=job_id)
         
-        with open(file_path, 'rb') as f:
-            response = HttpResponse(f.read())
-            
-        # Set appropriate content type
-        if filename.endswith('.pdf'):
-            response['Content-Type'] = 'application/pdf'
-        elif filename.endswith('.html'):
-            response['Content-Type'] = 'text/html'
-        elif filename.endswith('.xlsx'):
-            response['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        elif filename.endswith('.pptx'):
-            response['Content-Type'] = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+        if job.status == 'FAILED':
+            return JsonResponse({'success': False, 'job': report_jobs.job_payload(job)}, status=500)
+        if job.status == 'DONE' and not report_cache.lookup(job.file_name):
+            # Evicted from the report cache since it was rendered: render it again
+            ReportJob.objects.filter(pk=job.pk, status='DONE').update(
+                status='PENDING', progress=0, message='Report expired from cache, regenerating'
+            )
+            job.refresh_from_db()
+        if job.status != 'DONE':
+            # Not ready yet: 202 tells the client to keep polling
+            return JsonResponse({'success': False, 'job': report_jobs.job_payload(job)}, status=202)
         
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return report_files.serve_report(request, job.file_name)
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -176,32 +321,57 @@ def generate_structure_report_data(structure, options):
     """
     Generate comprehensive data for structure report
     """
-    # Get all entities in the structure
-    ownerships = EntityOwnership.objects.filter(structure=structure).select_related(
-        'owner_entity', 'owner_ubo', 'owned_entity'
+    ownerships = list(
+        EntityOwnership.objects.filter(structure=structure).select_related(
+            'owner_entity', 'owner_ubo', 'owned_entity'
+        )
     )
-    
+    return build_structure_report_data(structure, ownerships, options)
+
+
+def build_structure_report_data(structure, ownerships, options=None):
+    """
+    Structure report data computed in memory from the structure's already
+    fetched ownerships (with owner_entity, owner_ubo and owned_entity loaded),
+    so batches can preload many structures in one query
+    """
     # Build hierarchy
     hierarchy = build_ownership_hierarchy(ownerships)
     
     # Calculate statistics
+    entities = {ownership.owned_entity_id: ownership.owned_entity for ownership in ownerships}
+    # NULL percentages are skipped, as the SQL Avg/Max this replaces did
+    percentages = [
+        ownership.ownership_percentage for ownership in ownerships
+        if ownership.ownership_percentage is not None
+    ]
     stats = {
-        'total_entities': Entity.objects.filter(
-            id__in=ownerships.values_list('owned_entity_id', flat=True)
-        ).count(),
-        'total_parties': Party.objects.filter(
-            id__in=ownerships.values_list('owner_ubo_id', flat=True)
-        ).count(),
-        'total_ownerships': ownerships.count(),
-        'avg_ownership': ownerships.aggregate(avg=models.Avg('ownership_percentage'))['avg'] or 0,
-        'max_ownership': ownerships.aggregate(max=models.Max('ownership_percentage'))['max'] or 0
+        'total_entities': len(entities),
+        'total_parties': len({ownership.owner_ubo_id for ownership in ownerships if ownership.owner_ubo_id}),
+        'total_ownerships': len(ownerships),
+        'avg_ownership': sum(percentages) / len(percentages) if percentages else 0,
+        'max_ownership': max(percentages) if percentages else 0
     }
     
-    # Get jurisdictions
-    entities = Entity.objects.filter(
-        id__in=ownerships.values_list('owned_entity_id', flat=True)
-    )
-    jurisdictions = list(set(
+    # Get jurisdictions, with entity and ownership counts per jurisdiction
+    entities = sorted(entities.values(), key=lambda entity: entity.name)
+    breakdown = {}
+    for ownership in ownerships:
+        jurisdiction = ownership.owned_entity.jurisdiction or 'Unknown'
+        entry = breakdown.setdefault(jurisdiction, {
+            'jurisdiction': jurisdiction,
+            'entities': set(),
+            'ownerships': 0,
+            'total_ownership': 0,
+        })
+        entry['entities'].add(ownership.owned_entity_id)
+        entry['ownerships'] += 1
+        entry['total_ownership'] += ownership.ownership_percentage or 0
+    jurisdiction_breakdown = [
+        dict(breakdown[jurisdiction], entities=len(breakdown[jurisdiction]['entities']))
+        for jurisdiction in sorted(breakdown)
+    ]
+    jurisdictions = sorted(set(
         getattr(entity, 'jurisdiction', 'Unknown')
         for entity in entities
     ))
@@ -217,6 +387,7 @@ def generate_structure_report_data(structure, options):
         'hierarchy': hierarchy,
         'statistics': stats,
         'jurisdictions': jurisdictions,
+        'jurisdiction_breakdown': jurisdiction_breakdown,
         'entities': [
             {
                 'id': entity.id,
@@ -228,8 +399,10 @@ def generate_structure_report_data(structure, options):
         ],
         'ownerships': [
             {
+                'owner_id': ownership.owner_ubo_id or ownership.owner_entity_id,
                 'owner_name': ownership.owner_ubo.name if ownership.owner_ubo else ownership.owner_entity.name,
                 'owner_type': 'Party' if ownership.owner_ubo else 'Entity',
+                'owned_entity_id': ownership.owned_entity_id,
                 'owned_entity': ownership.owned_entity.name,
                 'ownership_percentage': ownership.ownership_percentage,
                 'notes': getattr(ownership, 'notes', '')
@@ -244,23 +417,27 @@ def generate_party_report_data(party, options):
     Generate comprehensive data for party report
     """
     # Get all ownerships where this party is the owner
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party).select_related(
-        'owned_entity', 'structure'
+    queryset = EntityOwnership.objects.filter(owner_ubo=party)
+    ownerships = list(queryset.select_related('owned_entity', 'structure'))
+    
+    # Calculate statistics in one aggregate query
+    totals = queryset.aggregate(
+        total_structures=models.Count('structure', distinct=True),
+        total_entities=models.Count('owned_entity', distinct=True),
+        total_ownership=models.Sum('ownership_percentage'),
+        avg_ownership=models.Avg('ownership_percentage'),
+        max_ownership=models.Max('ownership_percentage'),
     )
+    stats = {key: value or 0 for key, value in totals.items()}
     
-    # Get structures
-    structures = Structure.objects.filter(
-        id__in=ownerships.values_list('structure_id', flat=True)
-    ).distinct()
-    
-    # Calculate statistics
-    stats = {
-        'total_structures': structures.count(),
-        'total_entities': ownerships.values('owned_entity').distinct().count(),
-        'total_ownership': ownerships.aggregate(total=models.Sum('ownership_percentage'))['total'] or 0,
-        'avg_ownership': ownerships.aggregate(avg=models.Avg('ownership_percentage'))['avg'] or 0,
-        'max_ownership': ownerships.aggregate(max=models.Max('ownership_percentage'))['max'] or 0
-    }
+    # Structures and the party's share in each come from the fetched rows
+    structures = {}
+    for ownership in ownerships:
+        entry = structures.setdefault(ownership.structure_id, {
+            'structure': ownership.structure,
+            'party_ownership': 0,
+        })
+        entry['party_ownership'] += ownership.ownership_percentage or 0
     
     return {
         'party': {
@@ -271,18 +448,31 @@ def generate_party_report_data(party, options):
         'statistics': stats,
         'structures': [
             {
-                'id': structure.id,
-                'name': structure.name,
-                'structure_type': getattr(structure, 'structure_type', 'Unknown'),
-                'party_ownership': ownerships.filter(structure=structure).aggregate(
-                    total=models.Sum('ownership_percentage')
-                )['total'] or 0
+                'id': entry['structure'].id,
+                'name': entry['structure'].name,
+                'structure_type': getattr(entry['structure'], 'structure_type', 'Unknown'),
+                'party_ownership': entry['party_ownership']
             }
-            for structure in structures
+            for entry in sorted(structures.values(), key=lambda entry: entry['structure'].created_at, reverse=True)
+        ],
+        'jurisdiction_breakdown': [
+            {
+                'jurisdiction': row['owned_entity__jurisdiction'] or 'Unknown',
+                'entities': row['entities'],
+                'ownerships': row['ownerships'],
+                'total_ownership': row['total_ownership'] or 0
+            }
+            for row in queryset.values('owned_entity__jurisdiction').annotate(
+                entities=models.Count('owned_entity', distinct=True),
+                ownerships=models.Count('id'),
+                total_ownership=models.Sum('ownership_percentage'),
+            ).order_by('owned_entity__jurisdiction')
         ],
         'ownerships': [
             {
+                'structure_id': ownership.structure_id,
                 'structure_name': ownership.structure.name,
+                'owned_entity_id': ownership.owned_entity_id,
                 'owned_entity': ownership.owned_entity.name,
                 'ownership_percentage': ownership.ownership_percentage,
                 'entity_type': ownership.owned_entity.entity_type,
@@ -341,9 +531,18 @@ def generate_pdf_report(report_data, template, filename, options):
         bottomMargin=18
     )
     
-    # Build story
+    # Build PDF
+    doc.build(build_pdf_story(report_data, template, getSampleStyleSheet()))
+    
+    return file_path
+
+
+def build_pdf_story(report_data, template, styles):
+    """
+    Flowables of one report (title and template content); batch reports
+    join several of these into a single document
+    """
     story = []
-    styles = getSampleStyleSheet()
     
     # Title
     title_style = ParagraphStyle(
@@ -371,10 +570,7 @@ def generate_pdf_report(report_data, template, filename, options):
     elif template == 'detailed':
         story.extend(build_detailed_pdf_content(report_data, styles))
     
-    # Build PDF
-    doc.build(story)
-    
-    return file_path
+    return story
 
 
 def build_professional_pdf_content(report_data, styles):
@@ -441,7 +637,7 @@ def build_professional_pdf_content(report_data, styles):
             ownership_data.append([
                 ownership['owner_name'],
                 ownership['owned_entity'],
-                f"{ownership['ownership_percentage']:.2f}%",
+                f"{ownership['ownership_percentage']:.2f}%" if ownership['ownership_percentage'] is not None else '-',
                 ownership.get('owner_type', 'Entity')
             ])
         
@@ -502,71 +698,15 @@ def generate_html_report(report_data, template, filename, options):
 
 def generate_excel_report(report_data, filename, options):
     """
-    Generate Excel report
+    Generate Excel report (streamed write-only workbook with an ownership matrix sheet)
     """
-    try:
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment
-    except ImportError:
-        raise Exception("openpyxl not available for Excel generation")
+    xlsx_export.require_openpyxl()
     
     reports_dir = os.path.join(settings.MEDIA_ROOT, 'reports')
     os.makedirs(reports_dir, exist_ok=True)
     
     file_path = os.path.join(reports_dir, f"{filename}.xlsx")
-    
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    
-    # Set title
-    if 'structure' in report_data:
-        ws.title = "Structure Report"
-        ws['A1'] = f"Structure: {report_data['structure']['name']}"
-    else:
-        ws.title = "Party Report"
-        ws['A1'] = f"Party: {report_data['party']['name']}"
-    
-    # Style title
-    ws['A1'].font = Font(size=16, bold=True, color='667eea')
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
-    # Add statistics
-    row = 3
-    ws[f'A{row}'] = "Statistics"
-    ws[f'A{row}'].font = Font(size=14, bold=True)
-    row += 1
-    
-    for key, value in report_data['statistics'].items():
-        ws[f'A{row}'] = key.replace('_', ' ').title()
-        ws[f'B{row}'] = value
-        row += 1
-    
-    # Add ownership data
-    row += 2
-    ws[f'A{row}'] = "Ownership Details"
-    ws[f'A{row}'].font = Font(size=14, bold=True)
-    row += 1
-    
-    # Headers
-    headers = ['Owner', 'Owned Entity', 'Ownership %', 'Type']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color='667eea', end_color='667eea', fill_type='solid')
-    
-    row += 1
-    
-    # Data
-    for ownership in report_data.get('ownerships', []):
-        ws.cell(row=row, column=1, value=ownership['owner_name'])
-        ws.cell(row=row, column=2, value=ownership['owned_entity'])
-        ws.cell(row=row, column=3, value=ownership['ownership_percentage'])
-        ws.cell(row=row, column=4, value=ownership.get('owner_type', 'Entity'))
-        row += 1
-    
-    # Save workbook
-    wb.save(file_path)
+    xlsx_export.write_report(report_data, file_path)
     
     return file_path
 
@@ -625,12 +765,14 @@ def generate_structure_preview_data(structure):
     """
     Generate preview data for structure
     """
-    ownerships = EntityOwnership.objects.filter(structure=structure)
+    counts = EntityOwnership.objects.filter(structure=structure).aggregate(
+        entity_count=models.Count('owned_entity', distinct=True),
+        ownership_count=models.Count('id'),
+    )
     return {
         'type': 'structure',
         'name': structure.name,
-        'entity_count': ownerships.values('owned_entity').distinct().count(),
-        'ownership_count': ownerships.count()
+        **counts
     }
 
 
@@ -638,12 +780,14 @@ def generate_party_preview_data(party):
     """
     Generate preview data for party
     """
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party)
+    counts = EntityOwnership.objects.filter(owner_ubo=party).aggregate(
+        structure_count=models.Count('structure', distinct=True),
+        ownership_count=models.Count('id'),
+    )
     return {
         'type': 'party',
         'name': party.name,
-        'structure_count': ownerships.values('structure').distinct().count(),
-        'ownership_count': ownerships.count()
+        **counts
     }
 
 
@@ -668,7 +812,7 @@ def get_export_formats():
         {'id': 'html', 'name': 'HTML Report', 'description': 'Web-based interactive report'}
     ]
     
-    if REPORTLAB_AVAILABLE:
+    if xlsx_export.OPENPYXL_AVAILABLE:
         formats.append({'id': 'excel', 'name': 'Excel Spreadsheet', 'description': 'Microsoft Excel format'})
     
     try:
@@ -4,18 +4,23 @@ Provides comprehensive ownership visualization and management
 """
 
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q, Sum, Count
 from django.core.serializers import serialize
+from django.core.serializers.json import DjangoJSONEncoder
 import json
 import csv
 import io
+import tempfile
 from collections import defaultdict
 
+from . import ownership_chains, pdf_matrix, structure_snapshots, xlsx_export
 from .models import Entity, Structure, EntityOwnership
+from .effective_ownership import effective_ownership
+from .ownership_graph import ENTITY, ENTITY_OWNERSHIP_FIELDS, OwnershipGraph
 from parties.models import Party
 
 
@@ -286,87 +291,71 @@ def validate_ownership_matrix_api(request):
         if structure_id:
             ownerships_qs = ownerships_qs.filter(structure_id=structure_id)
         
+        # Preload the whole matrix as an adjacency list; names come with the rows,
+        # so only entities that appear in the results are ever named
+        rows = list(ownerships_qs.order_by().values(
+            *ENTITY_OWNERSHIP_FIELDS, 'owner_entity__name', 'owned_entity__name'
+        ))
+        graph = OwnershipGraph.from_rows(rows)
+        entity_names = {}
+        for row in rows:
+            entity_names[row['owned_entity_id']] = row['owned_entity__name']
+            if row['owner_entity_id']:
+                entity_names[row['owner_entity_id']] = row['owner_entity__name']
+        
         validation_results = []
         
         # Check 1: Total ownership per entity should not exceed 100%
-        entity_ownerships = defaultdict(float)
-        for ownership in ownerships_qs:
-            entity_ownerships[ownership.owned_entity.id] += ownership.ownership_percentage
-        
-        for entity_id, total_percentage in entity_ownerships.items():
-            entity = Entity.objects.get(id=entity_id)
+        totals = graph.totals()
+        for idx in graph.nodes_of_kind(ENTITY):
+            if not graph.in_edges[idx]:
+                continue
+            entity_name = entity_names.get(graph.keys[idx][1])
+            total_percentage = float(totals[idx])
             if total_percentage > 100:
                 validation_results.append({
                     'type': 'error',
-                    'title': f'Over-ownership detected: {entity.name}',
+                    'title': f'Over-ownership detected: {entity_name}',
                     'message': f'Total ownership is {total_percentage:.2f}%, which exceeds 100%'
                 })
             elif total_percentage == 100:
                 validation_results.append({
                     'type': 'success',
-                    'title': f'Complete ownership: {entity.name}',
+                    'title': f'Complete ownership: {entity_name}',
                     'message': f'Total ownership is exactly 100%'
                 })
             elif total_percentage < 100 and total_percentage > 0:
                 validation_results.append({
                     'type': 'warning',
-                    'title': f'Partial ownership: {entity.name}',
+                    'title': f'Partial ownership: {entity_name}',
                     'message': f'Total ownership is {total_percentage:.2f}%, {100 - total_percentage:.2f}% unaccounted'
                 })
         
-        # Check 2: Circular ownership detection
-        def has_circular_ownership(entity_id, visited=None, path=None):
-            if visited is None:
-                visited = set()
-            if path is None:
-                path = []
-            
-            if entity_id in path:
-                return True, path + [entity_id]
-            
-            if entity_id in visited:
-                return False, []
-            
-            visited.add(entity_id)
-            path.append(entity_id)
-            
-            # Check all entities that this entity owns
-            owned_entities = ownerships_qs.filter(
-                Q(owner_entity_id=entity_id)
-            ).values_list('owned_entity_id', flat=True)
-            
-            for owned_entity_id in owned_entities:
-                has_circular, circular_path = has_circular_ownership(owned_entity_id, visited.copy(), path.copy())
-                if has_circular:
-                    return True, circular_path
-            
-            return False, []
-        
-        checked_entities = set()
-        for entity in Entity.objects.all():
-            if entity.id not in checked_entities:
-                has_circular, circular_path = has_circular_ownership(entity.id)
-                if has_circular:
-                    entity_names = [Entity.objects.get(id=eid).name for eid in circular_path]
-                    validation_results.append({
-                        'type': 'error',
-                        'title': 'Circular ownership detected',
-                        'message': f'Circular ownership path: {" → ".join(entity_names)}'
-                    })
-                    checked_entities.update(circular_path)
-                else:
-                    checked_entities.add(entity.id)
-        
-        # Check 3: Orphaned entities (no ownership)
-        owned_entity_ids = set(ownerships_qs.values_list('owned_entity_id', flat=True))
-        all_entity_ids = set(Entity.objects.values_list('id', flat=True))
-        orphaned_entity_ids = all_entity_ids - owned_entity_ids
-        
-        for entity_id in orphaned_entity_ids:
-            entity = Entity.objects.get(id=entity_id)
+        # Check 2: Circular ownership detection (strongly connected components, O(V+E)).
+        # Each cyclic component is reported once with one closed path through it
+        # and, when the component is larger than that path, all of its members.
+        for members in graph.cyclic_components():
+            cycle = graph.shortest_cycle(members)
+            names = [entity_names.get(entity_id) for entity_id in graph.ids_of(cycle)]
+            message = f'Circular ownership path: {" → ".join(names)}'
+            if len(members) > len(cycle) - 1:
+                member_names = sorted(entity_names.get(entity_id) for entity_id in graph.ids_of(members))
+                message += f' (entities in this ownership loop: {", ".join(member_names)})'
+            validation_results.append({
+                'type': 'error',
+                'title': 'Circular ownership detected',
+                'message': message
+            })
+        
+        # Check 3: Orphaned entities (not owned by any row of the matrix)
+        orphaned_entities = Entity.objects.exclude(
+            id__in=ownerships_qs.order_by().values('owned_entity_id')
+        ).order_by('id').values_list('name', flat=True)
+        
+        for entity_name in orphaned_entities:
             validation_results.append({
                 'type': 'warning',
-                'title': f'Orphaned entity: {entity.name}',
+                'title': f'Orphaned entity: {entity_name}',
                 'message': 'This entity has no ownership relationships'
             })
         
@@ -393,6 +382,125 @@ def validate_ownership_matrix_api(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@staff_member_required
+@require_http_methods(["GET"])
+def effective_ownership_api(request, structure_id):
+    """
+    API endpoint returning the UBO × entity effective (look-through) ownership
+    table of a structure
+    """
+    structure = get_object_or_404(Structure, id=structure_id)
+    try:
+        table = effective_ownership(structure)
+        
+        party_names = dict(
+            Party.objects.filter(id__in=table.party_ids).values_list('id', 'name')
+        )
+        entity_names = dict(
+            Entity.objects.filter(
+                id__in={entity_id for row in table.entities.values() for entity_id in row}
+            ).values_list('id', 'name')
+        )
+        node_names = dict(structure.nodes.values_list('id', 'custom_name'))
+        
+        rows = table.rows()
+        for row in rows:
+            row['party_name'] = party_names.get(row['party_id'])
+            names = entity_names if row['target_type'] == ENTITY else node_names
+            row['target_name'] = names.get(row['target_id'])
+        
+        return JsonResponse({
+            'structure_id': structure.id,
+            'structure_name': structure.name,
+            'rows': rows,
+            'total_count': len(rows),
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+CHAIN_LOOKUPS = {
+    ('entity', 'descendants'): ownership_chains.entity_descendants,
+    ('entity', 'ancestors'): ownership_chains.entity_ancestors,
+    ('node', 'descendants'): ownership_chains.node_descendants,
+    ('node', 'ancestors'): ownership_chains.node_ancestors,
+}
+
+
+@staff_member_required
+def ownership_chain_api(request, kind, object_id):
+    """
+    API endpoint returning every owner (direction=ancestors) or owned
+    entity/node (direction=descendants) reachable from an entity or structure
+    node, with the path and cumulative percentage of each chain
+    """
+    try:
+        direction = request.GET.get('direction', 'descendants')
+        lookup = CHAIN_LOOKUPS.get((kind, direction))
+        if lookup is None:
+            return JsonResponse({'error': 'Unsupported kind or direction'}, status=400)
+        
+        max_depth = min(int(request.GET.get('max_depth', ownership_chains.MAX_DEPTH)), ownership_chains.MAX_DEPTH)
+        if kind == 'entity':
+            links = lookup(object_id, structure=request.GET.get('structure_id') or None, max_depth=max_depth)
+        else:
+            links = lookup(object_id, max_depth=max_depth)
+        
+        return JsonResponse({
+            'kind': kind,
+            'id': object_id,
+            'direction': direction,
+            'chain': [
+                {
+                    'type': link.kind,
+                    'id': link.id,
+                    'name': link.name,
+                    'depth': link.depth,
+                    'path': link.path,
+                    'cumulative_percentage': float(link.percentage),
+                }
+                for link in links
+            ],
+            'total_count': len(links),
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def structure_history_api(request, structure_id):
+    """
+    API endpoint listing a structure's recorded ownership versions and the
+    edges added, removed and changed between two of them
+    (?from=<version>&to=<version>, defaulting to the last two versions)
+    """
+    try:
+        structure = get_object_or_404(Structure, id=structure_id)
+        versions = list(structure.snapshots.order_by('-version').values(
+            'version', 'is_checkpoint', 'edge_count', 'reason', 'created_at'
+        ))
+        
+        delta = None
+        if versions:
+            to_version = int(request.GET.get('to', versions[0]['version']))
+            from_version = int(request.GET.get('from', max(to_version - 1, 0)))
+            delta = structure_snapshots.diff_versions(structure.id, from_version, to_version)
+            delta.update({'from_version': from_version, 'to_version': to_version})
+        
+        return JsonResponse({
+            'structure_id': structure.id,
+            'structure_name': structure.name,
+            'versions': versions,
+            'diff': delta,
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 @staff_member_required
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -426,6 +534,8 @@ def export_ownership_matrix_api(request):
             return export_csv(ownerships_qs, include_metadata)
         elif format_type == 'json':
             return export_json(ownerships_qs, include_metadata)
+        elif format_type == 'ndjson':
+            return export_ndjson(ownerships_qs, include_metadata)
         elif format_type == 'excel':
             return export_excel(ownerships_qs, include_metadata)
         elif format_type == 'pdf':
@@ -437,87 +547,149 @@ def export_ownership_matrix_api(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
-def export_csv(ownerships_qs, include_metadata):
-    """Export ownership matrix as CSV"""
-    output = io.StringIO()
-    writer = csv.writer(output)
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = (
+    'id', 'owner_entity_id', 'owner_entity__name', 'owner_ubo_id', 'owner_ubo__name',
+    'owned_entity_id', 'owned_entity__name', 'owned_entity__entity_type',
+    'ownership_percentage', 'structure_id', 'structure__name', 'created_at',
+)
+
+
+class Echo:
+    """File-like object whose write() hands the encoded line back to the caller"""
+    
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(ownerships_qs):
+    """Stream ownership rows as plain dicts, one chunk of rows in memory at a time"""
+    return ownerships_qs.order_by('id').values(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_item(row, include_metadata):
+    """JSON representation of one exported ownership row"""
+    is_entity_owner = row['owner_entity_id'] is not None
+    percentage = row['ownership_percentage']
+    item = {
+        'owner': {
+            'name': row['owner_entity__name'] if is_entity_owner else row['owner_ubo__name'],
+            'type': 'entity' if is_entity_owner else 'party',
+            'id': row['owner_entity_id'] if is_entity_owner else row['owner_ubo_id']
+        },
+        'owned_entity': {
+            'name': row['owned_entity__name'],
+            'id': row['owned_entity_id'],
+            'type': row['owned_entity__entity_type']
+        },
+        'ownership_percentage': float(percentage) if percentage is not None else None,
+        'structure': {
+            'name': row['structure__name'],
+            'id': row['structure_id']
+        }
+    }
+    
+    if include_metadata:
+        item['metadata'] = {
+            'notes': '',
+            'created_at': row['created_at'].isoformat() if row['created_at'] else None
+        }
+    
+    return item
+
+
+def iter_csv(ownerships_qs, include_metadata):
+    writer = csv.writer(Echo())
     
     # Write header
     headers = ['Owner', 'Owner Type', 'Owned Entity', 'Ownership %', 'Structure']
     if include_metadata:
         headers.extend(['Notes', 'Created At'])
-    writer.writerow(headers)
+    yield writer.writerow(headers)
     
     # Write data
-    for ownership in ownerships_qs:
-        owner_name = ownership.owner_entity.name if ownership.owner_entity else ownership.owner_ubo.name
-        owner_type = 'Entity' if ownership.owner_entity else 'Party'
-        
-        row = [
-            owner_name,
-            owner_type,
-            ownership.owned_entity.name,
-            ownership.ownership_percentage,
-            ownership.structure.name if ownership.structure else ''
+    for row in iter_export_rows(ownerships_qs):
+        is_entity_owner = row['owner_entity_id'] is not None
+        values = [
+            row['owner_entity__name'] if is_entity_owner else row['owner_ubo__name'],
+            'Entity' if is_entity_owner else 'Party',
+            row['owned_entity__name'],
+            row['ownership_percentage'],
+            row['structure__name'] or ''
         ]
         
         if include_metadata:
-            row.extend([
-                ownership.notes or '',
-                ownership.created_at.isoformat() if hasattr(ownership, 'created_at') else ''
+            values.extend([
+                '',
+                row['created_at'].isoformat() if row['created_at'] else ''
             ])
         
-        writer.writerow(row)
-    
-    response = HttpResponse(output.getvalue(), content_type='text/csv')
+        yield writer.writerow(values)
+
+
+def iter_json_array(ownerships_qs, include_metadata):
+    """Encode the export as a JSON array, one item at a time"""
+    yield '['
+    separator = ''
+    for row in iter_export_rows(ownerships_qs):
+        yield separator + json.dumps(export_item(row, include_metadata), cls=DjangoJSONEncoder)
+        separator = ','
+    yield ']'
+
+
+def iter_ndjson(ownerships_qs, include_metadata):
+    """Encode the export as newline-delimited JSON"""
+    for row in iter_export_rows(ownerships_qs):
+        yield json.dumps(export_item(row, include_metadata), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_csv(ownerships_qs, include_metadata):
+    """Export ownership matrix as CSV, streamed row by row"""
+    response = StreamingHttpResponse(iter_csv(ownerships_qs, include_metadata), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="ownership_matrix.csv"'
     return response
 
 
 def export_json(ownerships_qs, include_metadata):
-    """Export ownership matrix as JSON"""
-    data = []
-    
-    for ownership in ownerships_qs:
-        item = {
-            'owner': {
-                'name': ownership.owner_entity.name if ownership.owner_entity else ownership.owner_ubo.name,
-                'type': 'entity' if ownership.owner_entity else 'party',
-                'id': ownership.owner_entity.id if ownership.owner_entity else ownership.owner_ubo.id
-            },
-            'owned_entity': {
-                'name': ownership.owned_entity.name,
-                'id': ownership.owned_entity.id,
-                'type': ownership.owned_entity.entity_type
-            },
-            'ownership_percentage': float(ownership.ownership_percentage),
-            'structure': {
-                'name': ownership.structure.name if ownership.structure else None,
-                'id': ownership.structure.id if ownership.structure else None
-            }
-        }
-        
-        if include_metadata:
-            item['metadata'] = {
-                'notes': ownership.notes or '',
-                'created_at': ownership.created_at.isoformat() if hasattr(ownership, 'created_at') else None
-            }
-        
-        data.append(item)
-    
-    response = JsonResponse(data, safe=False)
+    """Export ownership matrix as a JSON array, streamed item by item"""
+    response = StreamingHttpResponse(
+        iter_json_array(ownerships_qs, include_metadata), content_type='application/json'
+    )
     response['Content-Disposition'] = 'attachment; filename="ownership_matrix.json"'
     return response
 
 
+def export_ndjson(ownerships_qs, include_metadata):
+    """Export ownership matrix as newline-delimited JSON (one ownership per line)"""
+    response = StreamingHttpResponse(
+        iter_ndjson(ownerships_qs, include_metadata), content_type='application/x-ndjson'
+    )
+    response['Content-Disposition'] = 'attachment; filename="ownership_matrix.ndjson"'
+    return response
+
+
 def export_excel(ownerships_qs, include_metadata):
-    """Export ownership matrix as Excel (placeholder - would need openpyxl)"""
-    # For now, return CSV with Excel content type
-    return export_csv(ownerships_qs, include_metadata)
+    """Export ownership matrix as a native XLSX workbook (flat list + owner × entity sheet)"""
+    output = tempfile.TemporaryFile()
+    xlsx_export.write_ownership_matrix(iter_export_rows(ownerships_qs), output, include_metadata)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename='ownership_matrix.xlsx',
+        content_type=xlsx_export.XLSX_CONTENT_TYPE
+    )
 
 
 def export_pdf(ownerships_qs, include_metadata):
-    """Export ownership matrix as PDF (placeholder - would need reportlab)"""
-    # For now, return JSON
-    return export_json(ownerships_qs, include_metadata)
-
+    """Export ownership matrix as a PDF owner × entity matrix, tiled across pages"""
+    output = tempfile.TemporaryFile()
+    pdf_matrix.write_ownership_matrix(iter_export_rows(ownerships_qs), output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename='ownership_matrix.pdf',
+        content_type='application/pdf'
+    )
@@ -12,12 +12,53 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
 from collections import defaultdict
 import json
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-from .models import Entity, Structure, EntityOwnership
+from . import structure_snapshots
+from .exposure_index import party_exposure
+from .models import Entity, Structure, EntityOwnership, PartyExposure
 from parties.models import Party
 
 
+class PartySnapshot:
+    """
+    Direct holdings of a party summarised once for every dashboard metric:
+    one aggregate query (Sum/Avg/Max/Count-distinct in SQL) and one
+    per-jurisdiction breakdown via values()
+    """
+    
+    def __init__(self, party):
+        self.party = party
+        self.ownerships = EntityOwnership.objects.filter(owner_ubo=party)
+        
+        totals = self.ownerships.aggregate(
+            total_ownership=Sum('ownership_percentage'),
+            avg_ownership=Avg('ownership_percentage'),
+            max_ownership=Max('ownership_percentage'),
+            total_ownerships=Count('id'),
+            structures_count=Count('structure', distinct=True),
+            entities_count=Count('owned_entity', distinct=True),
+        )
+        self.total_ownership = totals['total_ownership'] or 0
+        self.avg_ownership = totals['avg_ownership'] or 0
+        self.max_ownership = totals['max_ownership'] or 0
+        self.total_ownerships = totals['total_ownerships']
+        self.structures_count = totals['structures_count']
+        self.entities_count = totals['entities_count']
+        
+        # Number of distinct owned entities per jurisdiction
+        self.jurisdictions = {
+            row['owned_entity__jurisdiction']: row['entities']
+            for row in self.ownerships.order_by().values('owned_entity__jurisdiction').annotate(
+                entities=Count('owned_entity', distinct=True)
+            )
+        }
+    
+    @property
+    def jurisdictions_count(self):
+        return len([jurisdiction for jurisdiction in self.jurisdictions if jurisdiction])
+
+
 @staff_member_required
 def party_ownership_dashboard(request, party_id=None):
     """
@@ -37,11 +78,12 @@ def party_ownership_dashboard(request, party_id=None):
     if party_id:
         try:
             selected_party = get_object_or_404(Party, id=party_id)
+            snapshot = PartySnapshot(selected_party)
             context.update({
                 'selected_party': selected_party,
-                'party_stats': get_party_statistics(selected_party),
+                'party_stats': get_party_statistics(selected_party, snapshot),
                 'party_structures': get_party_structures(selected_party),
-                'analytics': get_party_analytics(selected_party)
+                'analytics': get_party_analytics(selected_party, snapshot)
             })
         except Party.DoesNotExist:
             pass
@@ -56,17 +98,19 @@ def party_dashboard_data(request, party_id):
     """
     try:
         party = get_object_or_404(Party, id=party_id)
+        snapshot = PartySnapshot(party)
         
         # Get comprehensive party data
         data = {
             'party_name': party.name,
             'party_type': party.party_type if hasattr(party, 'party_type') else 'Individual',
-            'stats': get_party_statistics(party),
+            'stats': get_party_statistics(party, snapshot),
             'structures': get_party_structures_data(party),
-            'charts': get_party_chart_data(party),
+            'charts': get_party_chart_data(party, snapshot),
             'timeline': get_party_timeline_data(party),
-            'analytics': get_party_analytics(party),
-            'recent_activity': get_party_recent_activity(party)
+            'analytics': get_party_analytics(party, snapshot),
+            'recent_activity': get_party_recent_activity(party),
+            'exposure': party_exposure(party)
         }
         
         return JsonResponse({
@@ -86,151 +130,114 @@ def party_dashboard_data(request, party_id):
         })
 
 
-def get_party_statistics(party):
+def get_party_statistics(party, snapshot=None):
     """
     Calculate comprehensive statistics for a party
     """
-    # Get all ownerships where this party is the owner
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party)
-    
-    # Get all structures this party is involved in
-    structures = Structure.objects.filter(
-        id__in=ownerships.values_list('structure_id', flat=True)
-    ).distinct()
-    
-    # Get all entities owned by this party
-    owned_entities = Entity.objects.filter(
-        id__in=ownerships.values_list('owned_entity_id', flat=True)
-    ).distinct()
-    
-    # Calculate statistics
-    total_ownership = ownerships.aggregate(
-        total=Sum('ownership_percentage')
-    )['total'] or 0
-    
-    avg_ownership = ownerships.aggregate(
-        avg=Avg('ownership_percentage')
-    )['avg'] or 0
-    
-    max_ownership = ownerships.aggregate(
-        max=Max('ownership_percentage')
-    )['max'] or 0
-    
-    # Get unique jurisdictions
-    jurisdictions = set()
-    for entity in owned_entities:
-        if hasattr(entity, 'jurisdiction') and entity.jurisdiction:
-            jurisdictions.add(entity.jurisdiction)
+    snapshot = snapshot or PartySnapshot(party)
     
     return {
-        'total_structures': structures.count(),
-        'total_ownership': round(total_ownership, 2),
-        'active_entities': owned_entities.count(),
-        'jurisdictions_count': len(jurisdictions),
-        'avg_ownership': round(avg_ownership, 2),
-        'max_ownership': round(max_ownership, 2),
-        'total_ownerships': ownerships.count(),
-        'diversification_index': calculate_diversification_index(ownerships),
-        'complexity_score': calculate_complexity_score(party)
+        'total_structures': snapshot.structures_count,
+        'total_ownership': round(snapshot.total_ownership, 2),
+        'active_entities': snapshot.entities_count,
+        'jurisdictions_count': snapshot.jurisdictions_count,
+        'avg_ownership': round(snapshot.avg_ownership, 2),
+        'max_ownership': round(snapshot.max_ownership, 2),
+        'total_ownerships': snapshot.total_ownerships,
+        'diversification_index': calculate_diversification_index(snapshot),
+        'complexity_score': calculate_complexity_score(snapshot)
     }
 
 
 def get_party_structures(party):
     """
-    Get structures associated with a party for template display
+    Get structures associated with a party for template display.
+    Read from the party exposure index, so structures held only
+    indirectly (through other entities) are listed as well.
     """
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party)
-    structure_ids = ownerships.values_list('structure_id', flat=True).distinct()
-    structures = Structure.objects.filter(id__in=structure_ids)
-    
-    result = []
-    for structure in structures:
-        # Calculate party's total ownership in this structure
-        party_ownerships = ownerships.filter(structure=structure)
-        total_ownership = party_ownerships.aggregate(
-            total=Sum('ownership_percentage')
-        )['total'] or 0
-        
-        # Count entities in this structure
-        entities_count = Entity.objects.filter(
-            id__in=party_ownerships.values_list('owned_entity_id', flat=True)
-        ).count()
-        
-        result.append({
-            'id': structure.id,
-            'name': structure.name,
-            'structure_type': structure.structure_type if hasattr(structure, 'structure_type') else 'Unknown',
+    structures = {}
+    for exposure in party_exposure(party):
+        structure = structures.setdefault(exposure['structure_id'], {
+            'id': exposure['structure_id'],
+            'name': exposure['structure_name'],
+            'structure_type': 'Unknown',
             'status': 'Active',  # Default status
-            'entities_count': entities_count,
-            'party_ownership_percentage': round(total_ownership, 2)
+            'entities_count': 0,
+            'indirect_entities_count': 0,
+            'party_ownership_percentage': 0,
         })
+        if exposure['indirect']:
+            structure['indirect_entities_count'] += 1
+        else:
+            structure['entities_count'] += 1
+            structure['party_ownership_percentage'] += exposure['direct_percentage']
+    
+    result = list(structures.values())
+    for structure in result:
+        structure['party_ownership_percentage'] = round(structure['party_ownership_percentage'], 2)
     
     return result
 
 
 def get_party_structures_data(party):
     """
-    Get detailed structures data for API response
-    """
-    structures = get_party_structures(party)
+    Get detailed structures data for API response.
+    Same shape as before the exposure index: only structures the party owns
+    directly, built from one select_related fetch of its ownerships.
+    """
+    structures = {}
+    entity_ids = defaultdict(set)
+    ownerships = EntityOwnership.objects.filter(owner_ubo=party).select_related(
+        'owned_entity', 'structure'
+    ).order_by('-structure__created_at', 'structure_id', 'id')
+    for ownership in ownerships:
+        structure = structures.setdefault(ownership.structure_id, {
+            'id': ownership.structure_id,
+            'name': ownership.structure.name,
+            'structure_type': 'Unknown',
+            'status': 'Active',  # Default status
+            'entities_count': 0,
+            'party_ownership_percentage': 0,
+            'entities': [],
+        })
+        entity_ids[ownership.structure_id].add(ownership.owned_entity_id)
+        structure['party_ownership_percentage'] += ownership.ownership_percentage or 0
+        structure['entities'].append({
+            'id': ownership.owned_entity.id,
+            'name': ownership.owned_entity.name,
+            'entity_type': ownership.owned_entity.entity_type,
+            'ownership_percentage': ownership.ownership_percentage,
+            'jurisdiction': getattr(ownership.owned_entity, 'jurisdiction', 'Unknown')
+        })
     
-    # Add additional data for each structure
-    for structure in structures:
-        structure_obj = Structure.objects.get(id=structure['id'])
-        
-        # Get entities in this structure
-        ownerships = EntityOwnership.objects.filter(
-            owner_ubo=party,
-            structure=structure_obj
-        )
-        
-        entities = []
-        for ownership in ownerships:
-            entities.append({
-                'id': ownership.owned_entity.id,
-                'name': ownership.owned_entity.name,
-                'entity_type': ownership.owned_entity.entity_type,
-                'ownership_percentage': ownership.ownership_percentage,
-                'jurisdiction': getattr(ownership.owned_entity, 'jurisdiction', 'Unknown')
-            })
-        
-        structure['entities'] = entities
+    for structure in structures.values():
+        structure['entities_count'] = len(entity_ids[structure['id']])
+        structure['party_ownership_percentage'] = round(structure['party_ownership_percentage'], 2)
     
-    return structures
+    return list(structures.values())
 
 
-def get_party_chart_data(party):
+def get_party_chart_data(party, snapshot=None):
     """
     Generate chart data for party dashboard
     """
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party)
+    snapshot = snapshot or PartySnapshot(party)
     
     # Ownership distribution by entity
     ownership_data = []
     ownership_labels = []
-    for ownership in ownerships[:8]:  # Limit to top 8 for readability
-        ownership_labels.append(ownership.owned_entity.name)
-        ownership_data.append(float(ownership.ownership_percentage))
-    
-    # Structure types distribution
-    structures = Structure.objects.filter(
-        id__in=ownerships.values_list('structure_id', flat=True)
-    ).distinct()
+    top_ownerships = snapshot.ownerships.values_list(
+        'owned_entity__name', 'ownership_percentage'
+    )[:8]  # Limit to top 8 for readability
+    for entity_name, percentage in top_ownerships:
+        ownership_labels.append(entity_name)
+        ownership_data.append(float(percentage or 0))
     
-    structure_types = defaultdict(int)
-    for structure in structures:
-        structure_type = getattr(structure, 'structure_type', 'Unknown')
-        structure_types[structure_type] += 1
+    # Structure types distribution (structures carry no type yet)
+    structure_types = {'Unknown': snapshot.structures_count} if snapshot.structures_count else {}
     
     # Jurisdiction distribution
-    entities = Entity.objects.filter(
-        id__in=ownerships.values_list('owned_entity_id', flat=True)
-    )
-    
-    jurisdictions = defaultdict(int)
-    for entity in entities:
-        jurisdiction = getattr(entity, 'jurisdiction', 'Unknown')
-        jurisdictions[jurisdiction] += 1
+    jurisdictions = snapshot.jurisdictions
     
     return {
         'ownership': {
@@ -249,28 +256,18 @@ def get_party_chart_data(party):
     }
 
 
-def generate_timeline_data(party):
+def generate_timeline_data(party, months=12):
     """
-    Generate timeline data for party ownership over time
+    Total direct ownership of the party at the end of each of the last
+    months, read from the recorded versions of every structure it ever
+    held part of (None before a structure's first version)
     """
-    # Generate sample timeline data (in real implementation, this would use actual dates)
-    labels = []
-    data = []
-    
-    # Generate last 12 months
-    current_date = datetime.now()
-    for i in range(11, -1, -1):
-        date = current_date - timedelta(days=i * 30)
-        labels.append(date.strftime('%b %Y'))
-        
-        # Calculate ownership at that time (simplified)
-        # In real implementation, this would query historical data
-        base_ownership = 50 + (i * 2)  # Sample increasing ownership
-        data.append(min(100, base_ownership))
+    points = structure_snapshots.month_ends(months)
+    totals = structure_snapshots.party_timeline(party.id, points)
     
     return {
-        'labels': labels,
-        'data': data
+        'labels': [(point - timedelta(seconds=1)).strftime('%b %Y') for point in points],
+        'data': [float(total) if total is not None else None for total in totals]
     }
 
 
@@ -281,19 +278,19 @@ def get_party_timeline_data(party):
     return generate_timeline_data(party)
 
 
-def get_party_analytics(party):
+def get_party_analytics(party, snapshot=None):
     """
     Generate analytics and recommendations for party
     """
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party)
+    snapshot = snapshot or PartySnapshot(party)
     
     # Calculate risk metrics
-    concentration_risk = calculate_concentration_risk(ownerships)
-    jurisdiction_risk = calculate_jurisdiction_risk(party)
-    complexity_risk = calculate_complexity_risk(party)
+    concentration_risk = calculate_concentration_risk(snapshot)
+    jurisdiction_risk = calculate_jurisdiction_risk(snapshot)
+    complexity_risk = calculate_complexity_risk(snapshot)
     
     # Generate recommendations
-    recommendations = generate_recommendations(party, ownerships)
+    recommendations = generate_recommendations(snapshot)
     
     # Compliance status
     compliance = {
@@ -336,40 +333,28 @@ def get_party_recent_activity(party):
     ]
 
 
-def calculate_diversification_index(ownerships):
+def calculate_diversification_index(snapshot):
     """
     Calculate diversification index based on ownership distribution
     """
-    if not ownerships.exists():
-        return 0
-    
     # Simple diversification calculation
-    total_ownerships = ownerships.count()
-    if total_ownerships <= 1:
+    if snapshot.total_ownerships <= 1:
         return 0
     
     # Calculate based on number of different entities and ownership distribution
-    unique_entities = ownerships.values('owned_entity').distinct().count()
-    diversification = min(100, (unique_entities / total_ownerships) * 100)
+    diversification = min(100, (snapshot.entities_count / snapshot.total_ownerships) * 100)
     
     return round(diversification, 1)
 
 
-def calculate_complexity_score(party):
+def calculate_complexity_score(snapshot):
     """
     Calculate complexity score based on structure complexity
     """
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party)
-    
     # Factors contributing to complexity
-    num_structures = ownerships.values('structure').distinct().count()
-    num_entities = ownerships.values('owned_entity').distinct().count()
-    num_jurisdictions = len(set(
-        getattr(entity, 'jurisdiction', 'Unknown')
-        for entity in Entity.objects.filter(
-            id__in=ownerships.values_list('owned_entity_id', flat=True)
-        )
-    ))
+    num_structures = snapshot.structures_count
+    num_entities = snapshot.entities_count
+    num_jurisdictions = len(snapshot.jurisdictions)
     
     # Simple complexity calculation
     complexity = min(100, (num_structures * 10) + (num_entities * 5) + (num_jurisdictions * 15))
@@ -377,56 +362,42 @@ def calculate_complexity_score(party):
     return round(complexity, 1)
 
 
-def calculate_concentration_risk(ownerships):
+def calculate_concentration_risk(snapshot):
     """
     Calculate concentration risk based on ownership distribution
     """
-    if not ownerships.exists():
+    if not snapshot.total_ownerships:
         return 0
     
     # Calculate concentration based on largest ownership percentage
-    max_ownership = ownerships.aggregate(max=Max('ownership_percentage'))['max'] or 0
+    max_ownership = snapshot.max_ownership
     
     # High concentration if single ownership > 50%
     if max_ownership > 50:
         return min(100, max_ownership)
     else:
         return max_ownership / 2
-    
-    return round(max_ownership, 1)
 
 
-def calculate_jurisdiction_risk(party):
+def calculate_jurisdiction_risk(snapshot):
     """
     Calculate jurisdiction risk based on jurisdiction diversity
     """
-    ownerships = EntityOwnership.objects.filter(owner_ubo=party)
-    entities = Entity.objects.filter(
-        id__in=ownerships.values_list('owned_entity_id', flat=True)
-    )
-    
-    jurisdictions = set()
-    for entity in entities:
-        jurisdiction = getattr(entity, 'jurisdiction', 'Unknown')
-        jurisdictions.add(jurisdiction)
-    
     # Risk decreases with jurisdiction diversity
-    num_jurisdictions = len(jurisdictions)
+    num_jurisdictions = len(snapshot.jurisdictions)
     if num_jurisdictions <= 1:
         return 80  # High risk for single jurisdiction
     elif num_jurisdictions <= 3:
         return 50  # Medium risk
     else:
         return 20  # Low risk for diverse jurisdictions
-    
-    return 50  # Default medium risk
 
 
-def calculate_complexity_risk(party):
+def calculate_complexity_risk(snapshot):
     """
     Calculate complexity risk based on structure complexity
     """
-    complexity_score = calculate_complexity_score(party)
+    complexity_score = calculate_complexity_score(snapshot)
     
     # Convert complexity score to risk percentage
     if complexity_score > 70:
@@ -437,15 +408,14 @@ def calculate_complexity_risk(party):
         return 20  # Low risk
 
 
-def generate_recommendations(party, ownerships):
+def generate_recommendations(snapshot):
     """
     Generate recommendations based on party's ownership profile
     """
     recommendations = []
     
     # Check concentration risk
-    max_ownership = ownerships.aggregate(max=Max('ownership_percentage'))['max'] or 0
-    if max_ownership > 75:
+    if snapshot.max_ownership > 75:
         recommendations.append({
             'type': 'Risk Management',
             'text': 'Consider diversifying ownership to reduce concentration risk.',
@@ -453,15 +423,7 @@ def generate_recommendations(party, ownerships):
         })
     
     # Check jurisdiction diversity
-    entities = Entity.objects.filter(
-        id__in=ownerships.values_list('owned_entity_id', flat=True)
-    )
-    jurisdictions = set(
-        getattr(entity, 'jurisdiction', 'Unknown')
-        for entity in entities
-    )
-    
-    if len(jurisdictions) <= 2:
+    if len(snapshot.jurisdictions) <= 2:
         recommendations.append({
             'type': 'Diversification',
             'text': 'Consider expanding to additional jurisdictions for better risk distribution.',
@@ -469,8 +431,7 @@ def generate_recommendations(party, ownerships):
         })
     
     # Check structure complexity
-    num_structures = ownerships.values('structure').distinct().count()
-    if num_structures > 5:
+    if snapshot.structures_count > 5:
         recommendations.append({
             'type': 'Simplification',
             'text': 'Review structure complexity and consider consolidation opportunities.',
@@ -520,31 +481,28 @@ def validate_party_ownership(request, party_id):
     """
     try:
         party = get_object_or_404(Party, id=party_id)
-        ownerships = EntityOwnership.objects.filter(owner_ubo=party)
-        
         validation_results = {
             'valid': True,
             'warnings': [],
             'errors': []
         }
         
-        # Validate ownership percentages
-        for structure in Structure.objects.filter(
-            id__in=ownerships.values_list('structure_id', flat=True)
-        ).distinct():
-            structure_ownerships = ownerships.filter(structure=structure)
-            total_ownership = structure_ownerships.aggregate(
-                total=Sum('ownership_percentage')
-            )['total'] or 0
-            
-            if total_ownership > 100:
+        # Validate ownership percentages (one grouped query on the exposure index)
+        structure_totals = PartyExposure.objects.filter(
+            party=party, direct_percentage__gt=0
+        ).values('structure_id', 'structure__name').annotate(
+            total=Sum('direct_percentage')
+        ).order_by('structure__name', 'structure_id')
+        
+        for row in structure_totals:
+            if row['total'] > 100:
                 validation_results['errors'].append(
-                    f'Total ownership in {structure.name} exceeds 100%'
+                    f'Total ownership in {row["structure__name"]} exceeds 100%'
                 )
                 validation_results['valid'] = False
-            elif total_ownership < 100:
+            elif row['total'] < 100:
                 validation_results['warnings'].append(
-                    f'Total ownership in {structure.name} is less than 100%'
+                    f'Total ownership in {row["structure__name"]} is less than 100%'
                 )
         
         return JsonResponse({
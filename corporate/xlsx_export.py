@@ -0,0 +1,230 @@
+"""
+XLSX Export
+Native Excel workbooks for the ownership matrix and organogram reports,
+written with openpyxl's write-only mode so rows stream to disk one at a time
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+HEADER_COLOR = '667eea'
+PERCENTAGE_FORMAT = '0.00'
+
+
+def require_openpyxl():
+    if not OPENPYXL_AVAILABLE:
+        raise Exception("openpyxl not available for Excel generation")
+
+
+def new_workbook():
+    require_openpyxl()
+    return Workbook(write_only=True)
+
+
+def styled(ws, value, bold=False, size=None, color=None, fill=None, number_format=None):
+    """Write-only cells carry their own style"""
+    cell = WriteOnlyCell(ws, value=value)
+    if bold or size or color:
+        cell.font = Font(bold=bold, size=size, color=color)
+    if fill:
+        cell.fill = PatternFill(start_color=fill, end_color=fill, fill_type='solid')
+        cell.font = Font(bold=True, color='FFFFFF')
+    if number_format:
+        cell.number_format = number_format
+    return cell
+
+
+def header_row(ws, headers):
+    return [styled(ws, header, fill=HEADER_COLOR) for header in headers]
+
+
+def percentage(value):
+    return float(value) if value is not None else None
+
+
+def plain(value):
+    """Excel has no decimal type"""
+    return float(value) if isinstance(value, Decimal) else value
+
+
+class PivotAccumulator:
+    """
+    Sparse owner × entity table collected while the flat sheet is streamed,
+    so the source rows are only read once. Rows and columns are keyed by
+    identity, e.g. ('party', 3) or ('entity', 7), so owners or entities that
+    share a name stay apart; names are only used as labels.
+    """
+
+    def __init__(self):
+        self.values = defaultdict(dict)
+        self.columns = set()
+        self.labels = {}
+
+    def add(self, row_key, column_key, value, row_label=None, column_label=None):
+        if row_label is not None:
+            self.labels[row_key] = row_label
+        if column_label is not None:
+            self.labels[column_key] = column_label
+        if value is None:
+            return
+        row = self.values[row_key]
+        row[column_key] = row.get(column_key, 0) + float(value)
+        self.columns.add(column_key)
+
+    def label(self, key):
+        return str(self.labels.get(key, key))
+
+    def _ordered(self, keys):
+        # Label first, then the key, so same-named rows keep a stable order
+        return sorted(keys, key=lambda key: (self.label(key), str(key)))
+
+    def ordered_rows(self):
+        return self._ordered(self.values)
+
+    def ordered_columns(self):
+        return self._ordered(self.columns)
+
+    def write(self, ws, corner='Owner \\ Entity'):
+        """Write the pivot with a header row, one row per owner and a totals row"""
+        columns = self.ordered_columns()
+        ws.freeze_panes = 'B2'
+        ws.append(header_row(ws, [corner] + [self.label(column) for column in columns] + ['Total']))
+
+        column_totals = defaultdict(float)
+        for row_key in self.ordered_rows():
+            row = self.values[row_key]
+            cells = [styled(ws, self.label(row_key), bold=True)]
+            for column in columns:
+                value = row.get(column)
+                if value is not None:
+                    column_totals[column] += value
+                cells.append(styled(ws, value, number_format=PERCENTAGE_FORMAT))
+            cells.append(styled(ws, sum(row.values()), bold=True, number_format=PERCENTAGE_FORMAT))
+            ws.append(cells)
+
+        ws.append(
+            [styled(ws, 'Total', bold=True)]
+            + [styled(ws, column_totals[column], bold=True, number_format=PERCENTAGE_FORMAT) for column in columns]
+            + [styled(ws, sum(column_totals.values()), bold=True, number_format=PERCENTAGE_FORMAT)]
+        )
+
+
+def write_ownership_matrix(rows, target, include_metadata=True):
+    """
+    Write EntityOwnership export rows (see views_ownership_matrix.EXPORT_FIELDS)
+    to ``target`` (path or binary file): a flat "Ownerships" sheet and a pivoted
+    owner × entity "Matrix" sheet
+    """
+    wb = new_workbook()
+    flat = wb.create_sheet('Ownerships')
+    flat.freeze_panes = 'A2'
+
+    headers = ['Owner', 'Owner Type', 'Owned Entity', 'Ownership %', 'Structure']
+    if include_metadata:
+        headers.append('Created At')
+    flat.append(header_row(flat, headers))
+
+    pivot = PivotAccumulator()
+    for row in rows:
+        is_entity_owner = row['owner_entity_id'] is not None
+        owner_name = row['owner_entity__name'] if is_entity_owner else row['owner_ubo__name']
+        value = percentage(row['ownership_percentage'])
+        cells = [
+            owner_name,
+            'Entity' if is_entity_owner else 'Party',
+            row['owned_entity__name'],
+            value,
+            row['structure__name'] or '',
+        ]
+        if include_metadata:
+            cells.append(row['created_at'].replace(tzinfo=None) if row['created_at'] else None)
+        flat.append(cells)
+        pivot.add(
+            ('entity', row['owner_entity_id']) if is_entity_owner else ('party', row['owner_ubo_id']),
+            ('entity', row['owned_entity_id']),
+            value,
+            row_label=owner_name,
+            column_label=row['owned_entity__name'],
+        )
+
+    pivot.write(wb.create_sheet('Matrix'))
+    wb.save(target)
+
+
+def write_report(report_data, target):
+    """Write an organogram report (structure or party report data) as XLSX"""
+    wb = new_workbook()
+
+    if 'structure' in report_data:
+        ws = wb.create_sheet('Structure Report')
+        title = f"Structure: {report_data['structure']['name']}"
+    else:
+        ws = wb.create_sheet('Party Report')
+        title = f"Party: {report_data['party']['name']}"
+
+    title_cell = styled(ws, title, bold=True, size=16, color=HEADER_COLOR)
+    title_cell.alignment = Alignment(horizontal='center')
+    ws.append([title_cell])
+    ws.append([])
+
+    # Statistics
+    ws.append([styled(ws, 'Statistics', bold=True, size=14)])
+    for key, value in report_data['statistics'].items():
+        ws.append([key.replace('_', ' ').title(), plain(value)])
+
+    # Ownership details
+    ws.append([])
+    ws.append([])
+    ws.append([styled(ws, 'Ownership Details', bold=True, size=14)])
+
+    pivot = PivotAccumulator()
+    if 'structure' in report_data:
+        ws.append(header_row(ws, ['Owner', 'Owned Entity', 'Ownership %', 'Type']))
+        for ownership in report_data.get('ownerships', []):
+            value = percentage(ownership['ownership_percentage'])
+            ws.append([
+                ownership['owner_name'],
+                ownership['owned_entity'],
+                value,
+                ownership.get('owner_type', 'Entity'),
+            ])
+            pivot.add(
+                (ownership['owner_type'], ownership['owner_id']),
+                ('entity', ownership['owned_entity_id']),
+                value,
+                row_label=ownership['owner_name'],
+                column_label=ownership['owned_entity'],
+            )
+        pivot.write(wb.create_sheet('Matrix'))
+    else:
+        ws.append(header_row(ws, ['Structure', 'Owned Entity', 'Ownership %', 'Entity Type', 'Jurisdiction']))
+        for ownership in report_data.get('ownerships', []):
+            value = percentage(ownership['ownership_percentage'])
+            ws.append([
+                ownership['structure_name'],
+                ownership['owned_entity'],
+                value,
+                ownership.get('entity_type'),
+                ownership.get('jurisdiction'),
+            ])
+            pivot.add(
+                ('structure', ownership['structure_id']),
+                ('entity', ownership['owned_entity_id']),
+                value,
+                row_label=ownership['structure_name'],
+                column_label=ownership['owned_entity'],
+            )
+        pivot.write(wb.create_sheet('Matrix'), corner='Structure \\ Entity')
+
+    wb.save(target)
@@ -6,3 +6,7 @@ class PartiesConfig(AppConfig):
     name = 'parties'
     verbose_name = 'Parties'
 
+    def ready(self):
+        from parties.deferred_checks import register_checks
+        register_checks()
+
@@ -0,0 +1,50 @@
+"""
+Deferred Checks
+Grouped total check of BeneficiaryRelation rows (active percentage per
+giver) queued inside deferred_validation(), registered by PartiesConfig.ready()
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from sirius_project.deferred_validation import RowError, pending_pks, register
+
+from .models import BeneficiaryRelation
+
+
+PERCENTAGE_LIMIT = Decimal(100)
+
+
+def check_beneficiary_relations(rows):
+    """Active benefits given by the same party or entity must not exceed 100%"""
+    if not rows:
+        return []
+
+    def giver(row):
+        return ('party', row.giver_party_id) if row.giver_party_id else ('entity', row.giver_entity_id)
+
+    given = defaultdict(Decimal)
+    for total in BeneficiaryRelation.objects.filter(
+        Q(giver_party_id__in={row.giver_party_id for _index, row in rows if row.giver_party_id}) |
+        Q(giver_entity_id__in={row.giver_entity_id for _index, row in rows if row.giver_entity_id}),
+        active=True,
+    ).exclude(pk__in=pending_pks(rows)).order_by().values(
+        'giver_party_id', 'giver_entity_id'
+    ).annotate(total=Sum('percentage')):
+        key = ('party', total['giver_party_id']) if total['giver_party_id'] else ('entity', total['giver_entity_id'])
+        given[key] += total['total'] or 0
+
+    errors = []
+    for index, row in rows:
+        key = giver(row)
+        if given[key] + row.percentage > PERCENTAGE_LIMIT:
+            errors.append(RowError(index, row, "Total benefits cannot exceed 100%"))
+        elif row.active:
+            given[key] += row.percentage
+    return errors
+
+
+def register_checks():
+    register('parties.BeneficiaryRelation', check_beneficiary_relations)
@@ -4,6 +4,8 @@ from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 
+from sirius_project import deferred_validation
+
 
 class Party(models.Model):
     """
@@ -281,12 +283,13 @@ class BeneficiaryRelation(models.Model):
 
     def clean(self):
         # Validate exactly one giver type
-        giver_count = sum([bool(self.giver_party), bool(self.giver_entity)])
+        giver_count = sum([self.giver_party_id is not None, self.giver_entity_id is not None])
         if giver_count != 1:
             raise ValidationError("Must specify exactly one giver (Party or Entity)")
 
-        # Validate total percentages don't exceed 100%
-        self.validate_percentage_total()
+        # Validate total percentages don't exceed 100% (batched inside deferred_validation())
+        if not deferred_validation.defer(self):
+            self.validate_percentage_total()
 
     def validate_percentage_total(self):
         """Ensure total benefits from same giver don't exceed 100%"""
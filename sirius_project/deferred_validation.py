@@ -0,0 +1,109 @@
+"""
+Deferred Validation
+Batch mode for bulk imports: inside ``deferred_validation()`` the per-row
+total checks of models are queued by clean() instead of each running its own
+query. On exit every queued row is checked with one grouped query per table,
+replaying the rows in the order they were cleaned so each row gets the
+verdict it would have had when validated one by one.
+
+Shared by the apps, which register the check of each of their models from
+AppConfig.ready() (see corporate.deferred_checks, parties.deferred_checks).
+"""
+
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+
+
+_state = threading.local()
+
+# model label -> check(rows) returning RowErrors, rows being (index, instance) pairs
+_checks = {}
+
+# index: position of the row among all deferred rows, in clean() order
+RowError = namedtuple('RowError', 'index instance message')
+
+
+class BatchValidationError(ValidationError):
+    """Raised on leaving deferred_validation() when rows failed the deferred checks"""
+
+    def __init__(self, row_errors):
+        self.row_errors = row_errors
+        super().__init__([f'Row {error.index}: {error.message}' for error in row_errors])
+
+
+class DeferredValidation:
+    """Rows queued by clean() while a deferred_validation() block is active"""
+
+    def __init__(self):
+        self.rows = []
+        self.seen = set()
+        self.errors = []
+
+    def add(self, instance):
+        """Queue a row; cleaning the same object again keeps its first position"""
+        if id(instance) in self.seen:
+            return
+        self.seen.add(id(instance))
+        self.rows.append(instance)
+
+    def rows_of(self, model_label):
+        return [(index, row) for index, row in enumerate(self.rows) if row._meta.label == model_label]
+
+    def validate(self):
+        """Run the queued checks; returns the RowErrors in row order"""
+        errors = []
+        for model_label, check in _checks.items():
+            errors.extend(check(self.rows_of(model_label)))
+        self.errors = sorted(errors, key=lambda error: error.index)
+        self.rows = []
+        self.seen = set()
+        return self.errors
+
+
+def register(model_label, check):
+    """Run ``check`` over the deferred rows of a model ('app_label.ModelName')"""
+    _checks[model_label] = check
+
+
+def current():
+    """The active DeferredValidation of this thread, if any"""
+    return getattr(_state, 'batch', None)
+
+
+def defer(instance):
+    """Queue a row's total check if a deferred block is active; True when queued"""
+    batch = current()
+    if batch is None or instance._meta.label not in _checks:
+        return False
+    batch.add(instance)
+    return True
+
+
+@contextmanager
+def deferred_validation(raise_errors=True):
+    """
+    Defer total checks of rows cleaned inside the block to its exit.
+    Use it inside the import's transaction so a BatchValidationError rolls
+    the import back; with raise_errors=False the errors are only collected
+    on the yielded batch. Nested blocks join the outermost one.
+    """
+    if current() is not None:
+        yield current()
+        return
+
+    batch = _state.batch = DeferredValidation()
+    try:
+        yield batch
+    finally:
+        _state.batch = None
+
+    if batch.validate() and raise_errors:
+        raise BatchValidationError(batch.errors)
+
+
+def pending_pks(rows):
+    """Primary keys of the saved rows, to exclude their stored values from totals"""
+    return [row.pk for _index, row in rows if row.pk is not None]
@@ -137,6 +137,10 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Generated reports are written under MEDIA_ROOT/reports
+MEDIA_URL = 'media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -151,3 +155,17 @@ RELATIONSHIP_WEBHOOK_URL = config('RELATIONSHIP_WEBHOOK_URL', default='http://lo
 WEBHOOK_TIMEOUT = config('WEBHOOK_TIMEOUT', default=10, cast=int)
 WEBHOOK_RETRIES = config('WEBHOOK_RETRIES', default=3, cast=int)
 
+
+# Organogram report worker (manage.py process_report_jobs)
+REPORT_JOB_WORKERS = config('REPORT_JOB_WORKERS', default=2, cast=int)
+REPORT_JOB_TIMEOUT = config('REPORT_JOB_TIMEOUT', default=3600, cast=int)
+
+# Generated reports are reused while their data is unchanged; the least
+# recently used files are evicted beyond these bounds
+REPORT_CACHE_MAX_BYTES = config('REPORT_CACHE_MAX_BYTES', default=512 * 1024 * 1024, cast=int)
+REPORT_CACHE_MAX_FILES = config('REPORT_CACHE_MAX_FILES', default=500, cast=int)
+
+# Let the web server send report files: '' (serve from Django), 'X-Sendfile'
+# (Apache/lighttpd) or 'X-Accel-Redirect' (nginx internal location below)
+REPORT_SENDFILE_HEADER = config('REPORT_SENDFILE_HEADER', default='')
+REPORT_SENDFILE_URL = config('REPORT_SENDFILE_URL', default='/protected/reports/')
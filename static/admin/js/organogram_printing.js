@@ -205,8 +205,10 @@ class OrganogramPrinting {
             const result = await response.json();
             
             if (result.success) {
-                this.currentDownloadUrl = result.download_url;
-                this.showSuccessModal(result.message, result.filename);
+                // Reports are rendered by a background worker: poll until the job is done
+                const job = result.status === 'DONE' ? result : await this.waitForReport(result.status_url);
+                this.currentDownloadUrl = job.download_url;
+                this.showSuccessModal(job.message, job.filename);
                 this.loadRecentReports(); // Refresh recent reports
             } else {
                 throw new Error(result.error || 'Failed to generate report');
@@ -218,6 +220,23 @@ class OrganogramPrinting {
         }
     }
     
+    async waitForReport(statusUrl, interval = 1000) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, interval));
+            
+            const response = await fetch(statusUrl);
+            const result = await response.json();
+            const job = result.job;
+            
+            if (job.status === 'DONE') {
+                return job;
+            }
+            if (job.status === 'FAILED') {
+                throw new Error(job.error || job.message || 'Failed to generate report');
+            }
+        }
+    }
+    
     showPreviewLoading() {
         const previewContent = document.getElementById('preview-content');
         const previewActions = document.getElementById('preview-actions');